@@ -0,0 +1,214 @@
+"""
+音訊緩衝區工具：上傳內容只解碼一次成 int16 numpy 陣列，
+之後的切片都是 view（不複製），直接交給音量檢查與 Whisper。
+"""
+import json
+import os
+import struct
+import wave
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# 音訊處理（需 ffmpeg 或 avlib）：pip install pydub
+from pydub import AudioSegment
+
+
+def _read_canonical_wav(contents: bytes, sample_rate: int, channels: int) -> Optional[np.ndarray]:
+    """若上傳內容已是目標格式的 PCM WAV，直接解析，省下 ffmpeg 解碼"""
+    try:
+        with wave.open(BytesIO(contents), "rb") as wf:
+            if (wf.getframerate() != sample_rate or wf.getnchannels() != channels
+                    or wf.getsampwidth() != 2 or wf.getcomptype() != "NONE"):
+                return None
+            frames = wf.readframes(wf.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    return np.frombuffer(frames, dtype=np.int16)
+
+
+def decode_to_pcm16(contents: bytes, src_ext: str, sample_rate: int, channels: int = 1) -> np.ndarray:
+    """
+    將上傳 bytes（依副檔名推格式）解碼成 sample_rate / 單聲道 / 16bit 的 int16 陣列。
+    不在磁碟上留下任何檔案。
+    """
+    ext = (src_ext or "").lstrip(".").lower() or None
+    if ext in (None, "wav"):
+        pcm = _read_canonical_wav(contents, sample_rate, channels)
+        if pcm is not None:
+            return pcm
+
+    audio = AudioSegment.from_file(BytesIO(contents), format=ext)
+    audio = audio.set_frame_rate(sample_rate).set_channels(channels).set_sample_width(2)
+    return np.frombuffer(audio.raw_data, dtype=np.int16)
+
+
+def write_wav(path: Path, pcm: np.ndarray, sample_rate: int, channels: int = 1) -> Path:
+    """把 int16 陣列寫成 PCM WAV"""
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(np.ascontiguousarray(pcm, dtype=np.int16).tobytes())
+    return path
+
+
+def pcm16_to_float32(pcm: np.ndarray) -> np.ndarray:
+    """int16 -> [-1, 1) 的 float32（Whisper 與音量檢查使用的格式）"""
+    return pcm.astype(np.float32) / 32768.0
+
+
+class PcmWindower:
+    """
+    把連續到達的 int16 PCM bytes 切成固定長度、彼此重疊的視窗（第 i 個視窗從 (i-1)*step 開始）。
+    bytes 可以任意切割（包含切在 sample 中間），只保留下一個視窗起點之後的資料。
+    """
+
+    def __init__(self, window_samples: int, step_samples: int):
+        assert 0 < step_samples <= window_samples
+        self.window_bytes = window_samples * 2
+        self.step_bytes = step_samples * 2
+        self.overlap_bytes = self.window_bytes - self.step_bytes
+        self.emitted = 0  # 已切出的視窗數
+        self._buf = bytearray()  # 從下一個視窗起點開始的資料
+
+    def feed(self, data: bytes) -> List[Tuple[int, np.ndarray]]:
+        """加入資料，回傳這次湊滿的 (視窗編號（1-based）, int16 陣列)"""
+        self._buf += data
+        windows = []
+        while len(self._buf) >= self.window_bytes:
+            windows.append(self._emit(self.window_bytes))
+            del self._buf[:self.step_bytes]
+        return windows
+
+    def flush(self) -> List[Tuple[int, np.ndarray]]:
+        """串流結束：剩餘資料若含上一個視窗之外的新音訊，輸出為最後一個（較短的）視窗"""
+        size = len(self._buf) - len(self._buf) % 2
+        has_new_audio = size > (self.overlap_bytes if self.emitted else 0)
+        windows = [self._emit(size)] if has_new_audio else []
+        self._buf.clear()
+        return windows
+
+    def _emit(self, size: int) -> Tuple[int, np.ndarray]:
+        self.emitted += 1
+        return self.emitted, np.frombuffer(bytes(self._buf[:size]), dtype=np.int16)
+
+
+WAV_HEADER_BYTES = 44  # 標準 PCM WAV 標頭長度（RIFF + fmt + data chunk 標頭）
+
+
+def _wav_header(sample_rate: int, channels: int, data_bytes: int) -> bytes:
+    block_align = channels * 2
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_bytes, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, 16,
+        b"data", data_bytes,
+    )
+
+
+class WavStitcher:
+    """
+    把依序編號、彼此重疊 overlap_samples 的分段（第 i 段從 (i-1)*step 開始）直接接到 base.wav 後面。
+    - 每段只寫入與前一段不重疊的部分，輸出長度與實際錄音一致
+    - 每次追加後就地改寫 RIFF / data 標頭的長度：錄音進行中 base.wav 隨時都是合法的 WAV，前端可邊錄邊播
+    - 寫入進度記在旁邊的 <path>.json（下一段編號、已寫入的 frame 數），服務重啟後可接續追加
+    - 提早到達的分段先暫存，等前面的分段到齊再寫；結束時缺少的分段以靜音補齊，時間軸不偏移
+    """
+
+    def __init__(self, path: Path, sample_rate: int, step_samples: int, overlap_samples: int, channels: int = 1,
+                 next_index: int = 1, frames: int = 0):
+        self.path = path
+        self.index_path = path.with_name(path.name + ".json")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.step_samples = step_samples
+        self.overlap_samples = overlap_samples
+        self.next_index = next_index
+        self.frames = frames
+        self._pending: Dict[int, np.ndarray] = {}
+        if next_index == 1:
+            path.write_bytes(_wav_header(sample_rate, channels, 0))
+            self._save_index()
+
+    @classmethod
+    def resume(cls, path: Path) -> Optional["WavStitcher"]:
+        """依 <path>.json 接續尚未完成的 base.wav；沒有進度檔（或已完成）時回傳 None"""
+        index_path = path.with_name(path.name + ".json")
+        if not index_path.exists() or not path.exists():
+            return None
+        info = json.loads(index_path.read_text(encoding="utf-8"))
+        stitcher = cls(path, info["sample_rate"], info["step_samples"], info["overlap_samples"],
+                       info.get("channels", 1), next_index=info["next_index"], frames=info["frames"])
+        # 進度檔在資料寫入之後才更新：多出來的是寫到一半的分段，截掉後重寫
+        data_end = WAV_HEADER_BYTES + stitcher.frames * stitcher.channels * 2
+        if path.stat().st_size != data_end:
+            with open(path, "r+b") as f:
+                f.truncate(data_end)
+                f.seek(0)
+                f.write(_wav_header(stitcher.sample_rate, stitcher.channels, data_end - WAV_HEADER_BYTES))
+        return stitcher
+
+    def append(self, index: int, pcm: np.ndarray):
+        """加入第 index 段（1-based）的完整 int16 音訊"""
+        if index < self.next_index:
+            return  # 重送的分段：已寫入過
+        self._pending[index] = pcm
+        while self.next_index in self._pending:
+            self._write(self._pending.pop(self.next_index))
+
+    def _write(self, pcm: np.ndarray):
+        if self.next_index > 1:
+            pcm = pcm[self.overlap_samples:]
+        data = np.ascontiguousarray(pcm, dtype=np.int16).tobytes()
+        data_bytes = (self.frames * self.channels + len(pcm)) * 2
+        with open(self.path, "r+b") as f:
+            f.seek(WAV_HEADER_BYTES + self.frames * self.channels * 2)
+            f.write(data)
+            # 資料寫完才更新長度，讀取端不會讀到尚未寫入的範圍
+            f.seek(0)
+            f.write(_wav_header(self.sample_rate, self.channels, data_bytes))
+        self.frames += len(pcm) // self.channels
+        self.next_index += 1
+        self._save_index()
+
+    def _save_index(self):
+        info = {
+            "next_index": self.next_index, "frames": self.frames, "sample_rate": self.sample_rate,
+            "channels": self.channels, "step_samples": self.step_samples, "overlap_samples": self.overlap_samples,
+        }
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(info), encoding="utf-8")
+        os.replace(tmp_path, self.index_path)
+
+    def close(self) -> Path:
+        """寫完剩餘分段（中間缺段補靜音）；標頭一直是最新的，只需移除進度檔"""
+        for index in sorted(self._pending):
+            while self.next_index < index:
+                self._write(np.zeros(self.step_samples + self.overlap_samples, dtype=np.int16))
+            self._write(self._pending.pop(index))
+        self.index_path.unlink(missing_ok=True)
+        return self.path
+
+    def abort(self):
+        self._pending.clear()
+        self.index_path.unlink(missing_ok=True)
+
+
+def stitch_wav_files(files: Iterable[Tuple[int, Path]], path: Path, sample_rate: int,
+                     step_samples: int, overlap_samples: int, stitcher: Optional[WavStitcher] = None) -> Path:
+    """
+    把磁碟上的分段 WAV（(編號, 路徑)）逐一讀入、去除重疊後追加到 path。
+    提供 stitcher（例如重啟後接續的）時只補上它尚未寫入的分段。
+    """
+    if stitcher is None:
+        stitcher = WavStitcher(path, sample_rate, step_samples, overlap_samples)
+    for index, file in files:
+        if index < stitcher.next_index:
+            continue
+        with wave.open(str(file), "rb") as wf:
+            pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        stitcher.append(index, pcm)
+    return stitcher.close()
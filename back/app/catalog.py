@@ -0,0 +1,261 @@
+"""
+會議目錄（SQLite，經 aiosqlite 非同步存取），取代 routes.py 中只存在記憶體的 conference_records：
+- meetings：每場會議一筆（base_name 唯一），依日期索引，/records 分頁查詢
+- segments：逐段文字（start/end 索引，可查時間範圍）
+- summaries：批次摘要（BatchRecord）；整體摘要存在 meetings.summary
+- search_docs / search_fts：全文搜尋索引（由 search.py 維護）
+/record 上傳的紀錄與轉錄流程（串流 finalize、背景工作、重新摘要）完成時都會寫入，重啟後仍保留。
+連線在第一次使用時建立；所有寫入都在單一連線上，經 transaction() 逐一執行，彼此不會交錯。
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+# ===== 資料庫參數 =====
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite+aiosqlite:///./speech.db")
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meetings (
+    id              TEXT PRIMARY KEY,
+    base_name       TEXT NOT NULL UNIQUE,
+    title           TEXT NOT NULL,
+    date            TEXT NOT NULL,            -- ISO 8601，可直接字串排序
+    duration        REAL NOT NULL DEFAULT 0,
+    file_path       TEXT NOT NULL DEFAULT '',
+    summary         TEXT NOT NULL DEFAULT '',
+    is_transcribed  INTEGER NOT NULL DEFAULT 0,
+    summary_url     TEXT,
+    transcript_url  TEXT,
+    updated_at      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_meetings_date ON meetings(date DESC, id);
+
+CREATE TABLE IF NOT EXISTS segments (
+    base_name  TEXT NOT NULL,
+    idx        INTEGER NOT NULL,
+    start      REAL NOT NULL,
+    end        REAL NOT NULL,
+    text       TEXT NOT NULL DEFAULT '',
+    speaker    TEXT NOT NULL DEFAULT '',
+    summary    TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (base_name, idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_segments_time ON segments(base_name, start, end);
+
+CREATE TABLE IF NOT EXISTS summaries (
+    base_name    TEXT NOT NULL,
+    batch_id     INTEGER NOT NULL,
+    start_index  INTEGER NOT NULL,
+    end_index    INTEGER NOT NULL,
+    status       TEXT NOT NULL,
+    summary      TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (base_name, batch_id)
+) WITHOUT ROWID;
+
+-- 全文搜尋（見 search.py）：search_docs 存原文與時間，search_fts 的 rowid 對應 search_docs.id
+CREATE TABLE IF NOT EXISTS search_docs (
+    id         INTEGER PRIMARY KEY,
+    base_name  TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    idx        INTEGER NOT NULL,
+    start      REAL NOT NULL,
+    end        REAL NOT NULL,
+    text       TEXT NOT NULL,
+    UNIQUE (base_name, kind, idx)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(tokens, tokenize = 'unicode61');
+"""
+
+_MEETING_COLUMNS = ("id", "base_name", "title", "date", "duration", "file_path", "summary",
+                    "is_transcribed", "summary_url", "transcript_url")
+
+
+def _database_path(url: str) -> Path:
+    """sqlite+aiosqlite:///./speech.db -> ./speech.db"""
+    _, sep, path = url.partition(":///")
+    if not sep or not url.startswith("sqlite"):
+        raise ValueError(f"只支援 SQLite 的 DATABASE_URL：{url}")
+    return Path(path)
+
+
+class RecordIdConflict(Exception):
+    """/record 的 id 已屬於另一場會議（base_name 不同）"""
+
+    def __init__(self, record_id: str, base_name: str):
+        super().__init__(f"紀錄 id {record_id} 已屬於會議 {base_name}")
+        self.record_id = record_id
+        self.base_name = base_name
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class Catalog:
+    def __init__(self, url: str = DATABASE_URL):
+        self.path = _database_path(url)
+        self._db: Optional[aiosqlite.Connection] = None
+        self._open_lock: Optional[asyncio.Lock] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+
+    async def connection(self) -> aiosqlite.Connection:
+        """共用的資料庫連線（第一次呼叫時開啟並建立資料表）"""
+        if self._db is not None:
+            return self._db
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+        async with self._open_lock:
+            if self._db is None:
+                db = await aiosqlite.connect(str(self.path))
+                db.row_factory = aiosqlite.Row
+                await db.execute("PRAGMA journal_mode=WAL")
+                await db.execute("PRAGMA synchronous=NORMAL")
+                await db.executescript(_SCHEMA)
+                await db.commit()
+                self._db = db
+        return self._db
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """獨占寫入：區塊結束時 commit，發生例外則 rollback（目錄與搜尋索引共用連線）"""
+        db = await self.connection()
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        async with self._write_lock:
+            try:
+                yield db
+            except BaseException:
+                await db.rollback()
+                raise
+            await db.commit()
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    # ---------- 寫入 ----------
+    async def upsert_record(self, meeting: Dict[str, Any], segments: List[Dict[str, Any]]):
+        """
+        /record 上傳的完整紀錄：以上傳內容為準（覆寫同一 base_name 的欄位與段落）。
+        id 已被另一場會議使用時拋出 RecordIdConflict，不覆寫任何資料。
+        """
+        row = {k: meeting.get(k) for k in _MEETING_COLUMNS}
+        row["is_transcribed"] = int(bool(row["is_transcribed"]))
+        row["updated_at"] = _now()
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{k}" for k in row)
+        updates = ", ".join(f"{k} = excluded.{k}" for k in row if k not in ("id", "base_name"))
+        async with self.transaction() as db:
+            async with db.execute("SELECT base_name FROM meetings WHERE id = ?", (row["id"],)) as cur:
+                owner = await cur.fetchone()
+            if owner is not None and owner["base_name"] != row["base_name"]:
+                raise RecordIdConflict(row["id"], owner["base_name"])
+            await db.execute(
+                f"INSERT INTO meetings ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT(base_name) DO UPDATE SET {updates}",
+                row,
+            )
+            await self._replace_segments(db, meeting["base_name"], segments)
+
+    async def index_meeting(self, base_name: str, segments: List[Dict[str, Any]], batches: List[Dict[str, Any]],
+                            overall_summary: str, file_path: str, summary_url: str, transcript_url: str):
+        """轉錄流程完成時寫入；已有 /record 紀錄時保留其標題與日期，只更新轉錄結果"""
+        now = _now()
+        duration = max((float(s.get("end", 0.0)) for s in segments), default=0.0)
+        async with self.transaction() as db:
+            await db.execute(
+                "INSERT INTO meetings (id, base_name, title, date, duration, file_path, summary, is_transcribed,"
+                " summary_url, transcript_url, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?, ?) "
+                "ON CONFLICT(base_name) DO UPDATE SET duration = excluded.duration, summary = excluded.summary,"
+                " is_transcribed = 1, updated_at = excluded.updated_at",
+                (base_name, base_name, base_name, now, duration, file_path, overall_summary,
+                 summary_url, transcript_url, now),
+            )
+            await self._replace_segments(db, base_name, segments)
+            await db.execute("DELETE FROM summaries WHERE base_name = ?", (base_name,))
+            await db.executemany(
+                "INSERT INTO summaries (base_name, batch_id, start_index, end_index, status, summary)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(base_name, b["batch_id"], b["start_index"], b["end_index"], b.get("status", ""), b.get("summary", ""))
+                 for b in batches],
+            )
+
+    async def _replace_segments(self, db: aiosqlite.Connection, base_name: str, segments: List[Dict[str, Any]]):
+        await db.execute("DELETE FROM segments WHERE base_name = ?", (base_name,))
+        await db.executemany(
+            "INSERT OR REPLACE INTO segments (base_name, idx, start, end, text, speaker, summary)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(base_name, s["index"], float(s["start"]), float(s["end"]), s.get("text", ""),
+              s.get("speaker", ""), s.get("summary", "")) for s in segments],
+        )
+
+    # ---------- 查詢 ----------
+    async def list_meetings(self, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0,
+                            date_from: Optional[str] = None, date_to: Optional[str] = None
+                            ) -> Tuple[List[Dict[str, Any]], int]:
+        """依日期新到舊分頁列出會議，回傳 (本頁會議, 符合條件的總數)"""
+        db = await self.connection()
+        where, params = [], []
+        if date_from:
+            where.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("date < ?")
+            params.append(date_to)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        async with db.execute(f"SELECT COUNT(*) FROM meetings {clause}", params) as cur:
+            total = (await cur.fetchone())[0]
+        async with db.execute(
+            f"SELECT * FROM meetings {clause} ORDER BY date DESC, id LIMIT ? OFFSET ?",
+            [*params, min(max(1, limit), MAX_PAGE_SIZE), max(0, offset)],
+        ) as cur:
+            meetings = [dict(row) for row in await cur.fetchall()]
+        return meetings, total
+
+    async def get_meeting(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """以 id 或 base_name 查詢單一會議"""
+        db = await self.connection()
+        async with db.execute("SELECT * FROM meetings WHERE id = ? OR base_name = ? LIMIT 1",
+                              (record_id, record_id)) as cur:
+            row = await cur.fetchone()
+        return dict(row) if row is not None else None
+
+    async def segments_for(self, base_names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """多場會議的段落（一次查詢），依 base_name 分組"""
+        if not base_names:
+            return {}
+        db = await self.connection()
+        placeholders = ", ".join("?" * len(base_names))
+        grouped: Dict[str, List[Dict[str, Any]]] = {name: [] for name in base_names}
+        async with db.execute(
+            f"SELECT * FROM segments WHERE base_name IN ({placeholders}) ORDER BY base_name, idx", base_names
+        ) as cur:
+            async for row in cur:
+                grouped[row["base_name"]].append(dict(row))
+        return grouped
+
+    async def segments_between(self, base_name: str, start: float, end: float) -> List[Dict[str, Any]]:
+        """與 [start, end) 有交集的段落（走 (base_name, start, end) 索引）"""
+        db = await self.connection()
+        async with db.execute(
+            "SELECT * FROM segments WHERE base_name = ? AND start < ? AND end > ? ORDER BY start, idx",
+            (base_name, end, start),
+        ) as cur:
+            return [dict(row) for row in await cur.fetchall()]
+
+    async def summaries_for(self, base_name: str) -> List[Dict[str, Any]]:
+        db = await self.connection()
+        async with db.execute("SELECT * FROM summaries WHERE base_name = ? ORDER BY batch_id", (base_name,)) as cur:
+            return [dict(row) for row in await cur.fetchall()]
+
+
+# 全域會議目錄
+catalog = Catalog()
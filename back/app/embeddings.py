@@ -0,0 +1,67 @@
+"""
+文字向量模型：qai_hub_models 內附的 nomic_embed_text（v1.5，512 維，輸出已 L2 正規化）。
+- 文件與查詢分別加上 nomic 要求的 "search_document: " / "search_query: " 前綴
+- 超過 sequence_length 的文字切成多個視窗（每個視窗都帶前綴）分別編碼再平均，不會截掉後半段
+- 多段文字的視窗合併成批次（每批最多 EMBED_BATCH_SIZE 個視窗，長度補齊到批次內最長者）一次跑模型
+推論不修改模型狀態：semantic.py 以一個執行緒批次編碼文件、另一個執行緒編碼查詢，查詢不必排在文件後面。
+"""
+import os
+from typing import List
+
+import numpy as np
+import torch
+
+from qai_hub_models.models.nomic_embed_text.app import NomicEmbedTextApp
+from qai_hub_models.models.nomic_embed_text.model import DEFAULT_MODEL_VERSION, MATRYOSHIKA_DIM, NomicEmbedText
+
+# ===== 向量模型參數 =====
+EMBED_SEQUENCE_LENGTH = int(os.environ.get("EMBED_SEQUENCE_LENGTH", "128"))  # 每個視窗的 token 數（含 [CLS]/[SEP]）
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "16"))             # 每次送進模型的視窗數
+DOCUMENT_PREFIX = "search_document: "
+QUERY_PREFIX = "search_query: "
+
+
+class NomicEmbedder:
+    def __init__(self, sequence_length: int = EMBED_SEQUENCE_LENGTH, batch_size: int = EMBED_BATCH_SIZE):
+        self.model = NomicEmbedText.from_pretrained(DEFAULT_MODEL_VERSION, sequence_length=sequence_length)
+        # 沿用官方 app 的 tokenizer 設定（bert-base-uncased）
+        self.tokenizer = NomicEmbedTextApp(self.model, sequence_length).tokenizer
+        self.sequence_length = sequence_length
+        self.batch_size = max(1, batch_size)
+        self.dim = MATRYOSHIKA_DIM
+        self.model_name = f"nomic-embed-text-v{DEFAULT_MODEL_VERSION}"
+
+    def _windows(self, text: str, prefix: str) -> List[List[int]]:
+        """[CLS] 前綴 片段 [SEP]，每個視窗最長 sequence_length 個 token"""
+        prefix_ids = self.tokenizer(prefix, add_special_tokens=False)["input_ids"]
+        ids = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+        body = max(1, self.sequence_length - 2 - len(prefix_ids))
+        cls_id, sep_id = self.tokenizer.cls_token_id, self.tokenizer.sep_token_id
+        return [[cls_id, *prefix_ids, *ids[i:i + body], sep_id] for i in range(0, max(1, len(ids)), body)]
+
+    def _run(self, windows: List[List[int]]) -> np.ndarray:
+        width = max(len(w) for w in windows)
+        input_ids = torch.full((len(windows), width), self.tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(windows), width), dtype=torch.long)
+        for row, window in enumerate(windows):
+            input_ids[row, :len(window)] = torch.tensor(window, dtype=torch.long)
+            attention_mask[row, :len(window)] = 1
+        with torch.no_grad():
+            return self.model(input_ids, attention_mask).float().cpu().numpy()
+
+    def embed(self, texts: List[str], prefix: str = DOCUMENT_PREFIX) -> np.ndarray:
+        """len(texts) x dim 的 float32 單位向量"""
+        windows: List[List[int]] = []
+        owners: List[int] = []
+        for n, text in enumerate(texts):
+            for window in self._windows(text, prefix):
+                windows.append(window)
+                owners.append(n)
+
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for b in range(0, len(windows), self.batch_size):
+            np.add.at(vectors, owners[b:b + self.batch_size], self._run(windows[b:b + self.batch_size]))
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self.embed([query], QUERY_PREFIX)[0]
@@ -0,0 +1,119 @@
+"""
+行程內的 pub/sub：依 base_name 推送段落、批次摘要、整體摘要與工作狀態等事件，
+供 SSE（/events）取代前端輪詢 /status、/segment_at、/summary。
+- 事件在發佈時就序列化成 SSE 字串，所有訂閱者共用，不重複做 JSON 編碼
+- 每個會議保留最近 EVENT_HISTORY 筆事件，斷線重連（Last-Event-ID）時補送
+- 訂閱者佇列有上限，跟不上的訂閱者會收到 resync 事件（請重新取得完整狀態）
+所有 publish / subscribe 都必須在 event loop 執行緒呼叫。
+"""
+import asyncio
+import json
+import os
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+# ===== 事件參數 =====
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", "256"))  # 每個訂閱者最多累積的事件數
+EVENT_HISTORY = int(os.environ.get("EVENT_HISTORY", "100"))        # 每個會議保留的事件數（重連補送）
+EVENT_MEETINGS = int(os.environ.get("EVENT_MEETINGS", "64"))       # 保留事件歷史的會議數
+SSE_HEARTBEAT_SECONDS = 15.0                                       # 無事件時送出註解行保持連線
+
+# ===== 事件類型 =====
+EVENT_SNAPSHOT = "snapshot"
+EVENT_SEGMENT = "segment"
+EVENT_BATCH_SUMMARY = "batch_summary"
+EVENT_OVERALL_SUMMARY = "overall_summary"
+EVENT_JOB = "job"
+EVENT_FINALIZED = "finalized"
+EVENT_RESYNC = "resync"
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    type: str
+    payload: str  # 已序列化的 JSON
+
+    def to_sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {self.payload}\n\n"
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._history: "OrderedDict[str, Deque[Event]]" = OrderedDict()
+        self._dropped: Dict[str, int] = {}  # base_name -> 已被擠出歷史的最新事件 id
+        self._last_id = 0
+
+    def _make_event(self, event_type: str, data: Dict[str, Any], new_id: bool = True) -> Event:
+        if new_id:
+            self._last_id += 1
+        return Event(self._last_id, event_type, json.dumps(data, ensure_ascii=False))
+
+    def publish(self, base_name: str, event_type: str, data: Dict[str, Any]):
+        """發佈事件（不阻塞；沒有訂閱者時只記入歷史）"""
+        event = self._make_event(event_type, data)
+        history = self._history.get(base_name)
+        if history is None:
+            history = self._history[base_name] = deque(maxlen=EVENT_HISTORY)
+            while len(self._history) > EVENT_MEETINGS:
+                dropped, _ = self._history.popitem(last=False)
+                self._dropped.pop(dropped, None)
+        else:
+            self._history.move_to_end(base_name)
+        if len(history) == history.maxlen:
+            self._dropped[base_name] = history[0].id
+        history.append(event)
+
+        for queue in self._subscribers.get(base_name, ()):
+            self._offer(queue, event)
+
+    def _offer(self, queue: asyncio.Queue, event: Event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # 跟不上：丟掉累積的事件，改送 resync，由用戶端重新取得完整狀態
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(self._make_event(EVENT_RESYNC, {}, new_id=False))
+
+    def subscribe(self, base_name: str, last_event_id: Optional[int] = None) -> Tuple[asyncio.Queue, bool]:
+        """
+        訂閱會議事件。提供 last_event_id 時補送之後的歷史事件。
+        回傳 (佇列, 是否已完整補送)；False 代表用戶端需要一份完整快照。
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self._subscribers.setdefault(base_name, set()).add(queue)
+
+        if last_event_id is None:
+            return queue, False
+        history = self._history.get(base_name)
+        if history is None:
+            # 沒有這個會議的歷史：只有在之後完全沒有新事件時才算完整
+            return queue, last_event_id >= self._last_id
+        if last_event_id < self._dropped.get(base_name, 0):
+            return queue, False  # 中間有事件已被擠出歷史
+        for event in history:
+            if event.id > last_event_id:
+                self._offer(queue, event)
+        return queue, True
+
+    def unsubscribe(self, base_name: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(base_name)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[base_name]
+
+    def snapshot(self, data: Dict[str, Any]) -> Event:
+        """完整狀態事件；id 沿用目前最新的事件 id，重連時從這之後補送"""
+        return self._make_event(EVENT_SNAPSHOT, data, new_id=False)
+
+    def subscriber_count(self, base_name: str) -> int:
+        return len(self._subscribers.get(base_name, ()))
+
+
+# 全域事件匯流排
+event_bus = EventBus()
@@ -0,0 +1,139 @@
+"""
+/uploads 的檔案回應：條件式 GET 與位元組範圍（播放器拖曳時只抓需要的片段）。
+- 強 ETag 由檔案大小與 mtime（奈秒）組成，檔案有任何寫入就會改變；另附 Last-Modified
+- If-None-Match（或沒有時的 If-Modified-Since）符合 -> 304，不送內容
+- 單一 Range -> 206 + Content-Range，只讀取該範圍；If-Range 與目前版本不符時改回整檔 200；
+  超出檔案大小 -> 416。多段範圍交給 FileResponse 處理
+- Cache-Control 由呼叫端依檔案是否已定稿決定
+- 由其他檔案即時轉出的內容（例如封存檔轉出的 transcript.json）以來源檔的 ETag 加上 variant 做條件式 GET，不支援 Range
+"""
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+# ===== 檔案回應參數 =====
+FILE_CHUNK_BYTES = 256 * 1024  # 範圍回應每次讀取的大小
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def file_etag(st: os.stat_result, variant: str = "") -> str:
+    suffix = f"-{variant}" if variant else ""
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}{suffix}"'
+
+
+def _etag_matches(header: str, etag: str, weak: bool) -> bool:
+    """If-None-Match 用弱比較（忽略 W/），If-Range 用強比較"""
+    for candidate in (tag.strip() for tag in header.split(",")):
+        if candidate == "*":
+            return True
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, st: os.stat_result) -> bool:
+    try:
+        return int(st.st_mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """單一 bytes 範圍 -> [start, end]（含 end）；多段或無法處理的格式回傳 None"""
+    units, _, spec = header.partition("=")
+    if units.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    if size == 0:
+        raise RangeNotSatisfiable()
+    try:
+        if first == "":
+            # bytes=-N：最後 N 個位元組
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start > end:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def _read_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(FILE_CHUNK_BYTES, remaining))
+            if not chunk:
+                break  # 檔案在傳送途中被截短
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _validators(st: os.stat_result, etag: str, cache_control: str) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+    }
+
+
+def _not_modified(request: Request, etag: str, st: os.stat_result) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag, weak=True)
+    since = request.headers.get("if-modified-since")
+    return bool(since) and _not_modified_since(since, st)
+
+
+def serve_file(request: Request, path: str, media_type: str, filename: str, cache_control: str) -> Response:
+    st = os.stat(path)
+    etag = file_etag(st)
+    headers = {**_validators(st, etag, cache_control), "Accept-Ranges": "bytes"}
+    if _not_modified(request, etag, st):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == headers["Last-Modified"]
+                         or _etag_matches(if_range, etag, weak=False)):
+        try:
+            byte_range = parse_range(range_header, st.st_size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{st.st_size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            return StreamingResponse(
+                _read_range(path, start, end), status_code=206, media_type=media_type,
+                headers={**headers, "Content-Range": f"bytes {start}-{end}/{st.st_size}",
+                         "Content-Length": str(end - start + 1)},
+            )
+
+    return FileResponse(path, media_type=media_type, filename=filename, headers=headers, stat_result=st)
+
+
+def serve_generated(request: Request, source_path: str, variant: str, body: Callable[[], Iterator[str]],
+                    media_type: str, cache_control: str) -> Response:
+    """由 source_path 即時轉出的內容；來源沒變時回 304，不必轉出"""
+    st = os.stat(source_path)
+    etag = file_etag(st, variant)
+    headers = {**_validators(st, etag, cache_control), "Accept-Ranges": "none"}
+    if _not_modified(request, etag, st):
+        return Response(status_code=304, headers=headers)
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
@@ -0,0 +1,153 @@
+"""
+推論 executor：Whisper 模型副本池 + 執行緒池。
+所有 ASR 與音量檢查都在這裡執行並以 await 取得結果，
+避免同步推論卡住 FastAPI 的 event loop。
+ASR 請求先進入批次佇列，在 ASR_MAX_BATCH 段或 ASR_MAX_WAIT_MS 內湊成一批，
+由同一個副本一次跑完 feature extractor + encoder。
+"""
+import asyncio
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+# ===== 推論參數 =====
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", str(os.cpu_count() or 1)))  # 輕量 CPU 工作（音量、解碼）
+WHISPER_REPLICAS = int(os.environ.get("WHISPER_REPLICAS", "1"))              # Whisper 模型副本數
+ASR_MAX_BATCH = int(os.environ.get("ASR_MAX_BATCH", "4"))                     # 每批最多幾段
+ASR_MAX_WAIT_MS = float(os.environ.get("ASR_MAX_WAIT_MS", "50"))              # 湊批最多等待毫秒
+
+
+class InferenceExecutor:
+    """
+    以執行緒池執行推論（torch 運算期間會釋放 GIL）。
+    每個 Whisper 副本同一時間只給一個執行緒使用，副本數即 ASR 並行上限。
+    所有副本都在忙時，新的請求會在佇列中累積成更大的批次。
+    """
+
+    def __init__(self, cpu_workers: int = CPU_WORKERS,
+                 max_batch: int = ASR_MAX_BATCH, max_wait_ms: float = ASR_MAX_WAIT_MS):
+        self._cpu_executor = ThreadPoolExecutor(max_workers=max(1, cpu_workers), thread_name_prefix="cpu")
+        self._asr_executor: Optional[ThreadPoolExecutor] = None
+        self._replicas: "queue.Queue[Any]" = queue.Queue()
+        self.num_replicas = 0
+        self.primary = None
+
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._pending: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batch_task: Optional[asyncio.Task] = None
+        self._inflight = set()  # 執行中的批次（保留參照避免被回收）
+        self.batches_run = 0
+        self.chunks_run = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.num_replicas > 0
+
+    def load(self, factory: Callable[[], Any], replicas: int = WHISPER_REPLICAS):
+        """建立 replicas 個模型副本，並依副本數分配 torch 執行緒"""
+        replicas = max(1, replicas)
+        try:
+            import torch  # 每個副本平分 CPU 核心，避免互相搶執行緒
+
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // replicas))
+        except ImportError:
+            pass
+
+        for i in range(replicas):
+            print(f"正在載入 Whisper 副本 {i + 1}/{replicas}...")
+            app = factory()
+            app.max_batch_size = self.max_batch
+            if self.primary is None:
+                self.primary = app
+            self._replicas.put(app)
+        self.num_replicas = replicas
+        self._asr_executor = ThreadPoolExecutor(max_workers=replicas, thread_name_prefix="asr")
+
+    async def run_cpu(self, func: Callable[..., Any], *args: Any) -> Any:
+        """在 CPU 執行緒池中執行阻塞函式"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._cpu_executor, func, *args)
+
+    def _transcribe_blocking(self, audios: List[Any], sample_rate: int) -> List[str]:
+        app = self._replicas.get()
+        try:
+            return app.transcribe_batch(audios, sample_rate)
+        finally:
+            self._replicas.put(app)
+
+    async def transcribe(self, audio: Any, sample_rate: int) -> str:
+        """把一段音訊送進批次佇列，等待所屬批次完成後回傳文字"""
+        if not self.ready:
+            raise RuntimeError("Whisper model is not loaded")
+        loop = asyncio.get_running_loop()
+        if self._batch_task is None or self._batch_task.done():
+            self._pending = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.num_replicas)
+            self._batch_task = loop.create_task(self._batch_loop())
+        future = loop.create_future()
+        self._pending.put_nowait((audio, sample_rate, future))
+        return await future
+
+    async def _collect_batch(self) -> List[Tuple[Any, int, asyncio.Future]]:
+        """取得第一筆後，在 max_wait 內盡量湊滿 max_batch 筆"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._pending.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._pending.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _batch_loop(self):
+        while True:
+            # 先取得空閒副本的名額再湊批：副本都在忙時請求會持續累積
+            await self._slots.acquire()
+            try:
+                batch = await self._collect_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run_batch(self, batch: List[Tuple[Any, int, asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        try:
+            # 依取樣率分組（實務上都是 16k，只會有一組）
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[1], []).append(item)
+            for sample_rate, items in groups.items():
+                try:
+                    texts = await loop.run_in_executor(
+                        self._asr_executor, self._transcribe_blocking,
+                        [audio for audio, _, _ in items], sample_rate
+                    )
+                except Exception as e:
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, _, future), text in zip(items, texts):
+                    if not future.done():
+                        future.set_result(text)
+            self.batches_run += 1
+            self.chunks_run += len(batch)
+        finally:
+            self._slots.release()
+
+
+# 全域推論 executor
+inference_executor = InferenceExecutor()
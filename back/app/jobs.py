@@ -0,0 +1,146 @@
+"""
+背景工作佇列：/transcribe 上傳後立即回傳 job id，
+實際的轉錄與摘要交由有上限的 asyncio worker 執行，
+阻塞性的解碼/推論則交給 inference executor，避免卡住 event loop。
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .events import EVENT_JOB, event_bus
+
+# ===== 工作佇列參數 =====
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))           # 同時執行的工作數
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "64"))    # 佇列上限（滿了回 503）
+JOB_HISTORY = int(os.environ.get("JOB_HISTORY", "200"))         # 保留的已完成工作數
+
+# ===== 工作狀態 =====
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+@dataclass
+class Job:
+    job_id: str
+    base_name: str
+    status: str = JOB_QUEUED
+    stage: str = ""
+    total_segments: int = 0
+    completed_transcripts: int = 0
+    completed_summaries: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        progress = 0.0
+        if self.total_segments:
+            progress = min(1.0, self.completed_transcripts / self.total_segments)
+        if self.status == JOB_DONE:
+            progress = 1.0
+        return {
+            "job_id": self.job_id,
+            "base_name": self.base_name,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(progress, 4),
+            "total_segments": self.total_segments,
+            "completed_transcripts": self.completed_transcripts,
+            "completed_summaries": self.completed_summaries,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "result": self.result,
+        }
+
+
+JobRunner = Callable[[Job], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class JobQueue:
+    """有上限的背景工作佇列 + 工作表（job_id -> Job）"""
+
+    def __init__(self, workers: int = JOB_WORKERS, maxsize: int = JOB_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._latest: Dict[str, str] = {}  # base_name -> 最新 job_id
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    def _ensure_workers(self):
+        # worker 必須在 event loop 內建立，因此延遲到第一次 submit
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [t for t in self._tasks if not t.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    def submit(self, base_name: str, runner: JobRunner) -> Job:
+        """加入一個工作；佇列已滿時拋出 asyncio.QueueFull"""
+        self._ensure_workers()
+        job = Job(job_id=uuid.uuid4().hex, base_name=base_name)
+        self._queue.put_nowait((job, runner))
+        self.jobs[job.job_id] = job
+        self._latest[base_name] = job.job_id
+        self._trim_history()
+        self._publish(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def latest_for(self, base_name: str) -> Optional[Job]:
+        job_id = self._latest.get(base_name)
+        return self.jobs.get(job_id) if job_id else None
+
+    @staticmethod
+    def _publish(job: Job):
+        event_bus.publish(job.base_name, EVENT_JOB, job.to_dict())
+
+    def pending_count(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def _trim_history(self):
+        finished = [jid for jid, j in self.jobs.items() if j.finished]
+        for jid in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            job = self.jobs.pop(jid)
+            if self._latest.get(job.base_name) == jid:
+                del self._latest[job.base_name]
+
+    async def _worker(self):
+        while True:
+            job, runner = await self._queue.get()
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            self._publish(job)
+            try:
+                job.result = await runner(job)
+                job.status = JOB_DONE
+                job.stage = "done"
+                print(f"🎉 工作 {job.job_id}（{job.base_name}）完成")
+            except Exception as e:
+                job.status = JOB_FAILED
+                job.error = str(e)
+                print(f"❌ 工作 {job.job_id}（{job.base_name}）失敗: {e}")
+            finally:
+                job.finished_at = time.time()
+                self._publish(job)
+                self._queue.task_done()
+
+
+# 全域工作佇列
+job_queue = JobQueue()
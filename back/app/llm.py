@@ -0,0 +1,164 @@
+"""
+LLM（Kuwa / TAIDE）呼叫層：所有摘要請求都經過同一個有上限的請求池，避免多場會議同時打爆本地 LLM 服務。
+- 同時進行的請求數上限 LLM_CONCURRENCY；超過的請求依優先序排隊
+  （即時：串流 / 上傳工作的批次摘要與 finalize；背景：/regenerate_summaries）
+- 每次嘗試有逾時（LLM_TIMEOUT_SECONDS），失敗以指數退避 + 隨機抖動重試；退避期間釋放名額
+- 串流回傳的片段收集到 list 最後再 join
+- 依優先序統計排隊數、進行中、延遲與失敗次數，供 /model_status 顯示
+所有呼叫都必須在 event loop 執行緒進行。
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# ===== LLM 請求池參數 =====
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "2"))               # 同時送往 LLM 的請求數
+LLM_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", "120"))   # 單次嘗試（含串流讀完）的逾時
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))               # 失敗後最多重試幾次
+LLM_RETRY_BASE_SECONDS = float(os.environ.get("LLM_RETRY_BASE_SECONDS", "1.0"))  # 第一次重試前的基本等待
+LLM_LATENCY_WINDOW = 200                                                    # 延遲統計保留的最近請求數
+
+# ===== 優先序（數字小者先） =====
+LLM_PRIORITY_LIVE = 0        # 串流 / 上傳工作：使用者正在等
+LLM_PRIORITY_BACKGROUND = 1  # 重新生成摘要等背景工作
+_PRIORITY_NAMES = {LLM_PRIORITY_LIVE: "live", LLM_PRIORITY_BACKGROUND: "background"}
+
+
+class _PrioritySlots:
+    """依優先序喚醒等待者的計數號誌（同優先序先到先服務）"""
+
+    def __init__(self, slots: int):
+        self._free = slots
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    async def acquire(self, priority: int):
+        if self._free > 0 and not self._waiters:
+            self._free -= 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # 已被分配名額但在喚醒前取消：把名額交給下一位
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():  # 跳過已取消的等待者
+                fut.set_result(None)
+                return
+        self._free += 1
+
+
+class _LaneStats:
+    def __init__(self):
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.latencies: Deque[float] = deque(maxlen=LLM_LATENCY_WINDOW)
+        self.queue_waits: Deque[float] = deque(maxlen=LLM_LATENCY_WINDOW)
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "avg_latency_s": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "p95_latency_s": round(latencies[int(0.95 * (len(latencies) - 1))], 3) if latencies else None,
+            "avg_queue_wait_s": round(sum(self.queue_waits) / len(self.queue_waits), 3) if self.queue_waits else None,
+        }
+
+
+class LlmPool:
+    def __init__(self, concurrency: int = LLM_CONCURRENCY, timeout: float = LLM_TIMEOUT_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.client = None
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self._slots: Optional[_PrioritySlots] = None
+        self._stats: Dict[int, _LaneStats] = {p: _LaneStats() for p in _PRIORITY_NAMES}
+
+    def set_client(self, client, concurrency: Optional[int] = None):
+        self.client = client
+        if concurrency is not None and self._slots is None:
+            self.concurrency = max(1, concurrency)
+
+    @property
+    def ready(self) -> bool:
+        return self.client is not None
+
+    async def complete(self, messages: List[Dict[str, str]], priority: int = LLM_PRIORITY_LIVE) -> str:
+        """送出一次 chat completion 並回傳完整文字；重試用盡仍失敗時拋出最後的例外"""
+        if self.client is None:
+            raise RuntimeError("LLM client 尚未初始化")
+        if self._slots is None:
+            self._slots = _PrioritySlots(self.concurrency)
+        stats = self._stats.setdefault(priority, _LaneStats())
+
+        attempt = 0
+        while True:
+            queued_at = time.monotonic()
+            stats.waiting += 1
+            try:
+                await self._slots.acquire(priority)
+            finally:
+                stats.waiting -= 1
+            started_at = time.monotonic()
+            stats.queue_waits.append(started_at - queued_at)
+            stats.in_flight += 1
+            try:
+                result = await asyncio.wait_for(self._stream(messages), timeout=self.timeout)
+                stats.completed += 1
+                stats.latencies.append(time.monotonic() - started_at)
+                return result
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    stats.timeouts += 1
+                if attempt >= self.max_retries:
+                    stats.failed += 1
+                    raise
+                error = e
+            finally:
+                stats.in_flight -= 1
+                self._slots.release()
+
+            # 退避期間不佔名額，讓其他請求先跑
+            attempt += 1
+            stats.retries += 1
+            delay = LLM_RETRY_BASE_SECONDS * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            print(f"⚠️ LLM 請求失敗（{error!r}），{delay:.1f}s 後第 {attempt} 次重試")
+            await asyncio.sleep(delay)
+
+    async def _stream(self, messages: List[Dict[str, str]]) -> str:
+        parts: List[str] = []
+        async for chunk in self.client.chat_complete(messages=messages, streaming=True):
+            parts.append(chunk)
+        return "".join(parts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "lanes": {_PRIORITY_NAMES.get(p, str(p)): s.to_dict() for p, s in self._stats.items()},
+        }
+
+
+# 全域 LLM 請求池
+llm_pool = LlmPool()
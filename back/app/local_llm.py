@@ -0,0 +1,161 @@
+"""
+行程內的摘要 LLM：直接用 qai_hub_models 內附的 Llama3 TAIDE 與 LLM_Generator 生成，不經過 Kuwa HTTP 服務。
+- 模型只載入一次；prompt processor（一次處理 LOCAL_LLM_SEQUENCE_LENGTH 個 token）與
+  token generator（一次 1 個 token）共用同一份權重，由 LLM_Generator 依輸入長度自動切換
+- 保留上一次請求的 KV cache；下一個 prompt 與之共同的前綴（system prompt、摘要模板開頭）不再重算
+- 生成在專用的單一執行緒進行，token 解碼成文字後即時送回 event loop（streaming）
+介面與 KuwaClient.chat_complete 相同，可直接交給 llm_pool 使用。
+"""
+import asyncio
+import copy
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional
+
+import torch
+from transformers import GenerationConfig, StoppingCriteria, StoppingCriteriaList, TextStreamer
+from transformers.cache_utils import DynamicCache
+
+from qai_hub_models.models._shared.llama3.model import END_TOKENS, RopeEmbedding, get_input_prompt_with_tags
+from qai_hub_models.models._shared.llm.generator import LLM_Generator
+from qai_hub_models.models.llama_v3_taide_8b_chat.model import HF_REPO_NAME, Llama3_TAIDE
+
+# ===== 本機 LLM 參數 =====
+LOCAL_LLM_CHECKPOINT = os.environ.get("LOCAL_LLM_CHECKPOINT", HF_REPO_NAME)
+LOCAL_LLM_CONTEXT_LENGTH = int(os.environ.get("LOCAL_LLM_CONTEXT_LENGTH", "4096"))
+LOCAL_LLM_SEQUENCE_LENGTH = int(os.environ.get("LOCAL_LLM_SEQUENCE_LENGTH", "128"))  # prompt processor 一次處理的 token 數
+LOCAL_LLM_MAX_NEW_TOKENS = int(os.environ.get("LOCAL_LLM_MAX_NEW_TOKENS", "384"))
+LOCAL_LLM_SYSTEM_PROMPT = "你是一個來自台灣的AI助理，你的名字是 TAIDE，樂於以台灣人的立場幫助使用者，會用繁體中文回答問題。"
+
+
+class _AsyncTextStreamer(TextStreamer):
+    """把解碼好的文字片段從生成執行緒轉送到 event loop 的佇列（None 代表結束）"""
+
+    def __init__(self, tokenizer, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.loop = loop
+        self.queue = queue
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+        if stream_end:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+
+class _StopOnEvent(StoppingCriteria):
+    """呼叫端取消（逾時 / 斷線）時中止生成，釋放生成執行緒"""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.event.is_set()
+
+
+class LocalTaideClient:
+    def __init__(self, checkpoint: str = LOCAL_LLM_CHECKPOINT, context_length: int = LOCAL_LLM_CONTEXT_LENGTH,
+                 sequence_length: int = LOCAL_LLM_SEQUENCE_LENGTH, max_new_tokens: int = LOCAL_LLM_MAX_NEW_TOKENS):
+        host_device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        prompt_processor = Llama3_TAIDE.from_pretrained(
+            checkpoint=checkpoint,
+            sequence_length=sequence_length,
+            context_length=context_length,
+            host_device=host_device,
+        )
+        # token generator 只是 sequence_length=1 的淺層複本，與 prompt processor 共用同一份權重
+        token_generator = copy.copy(prompt_processor)
+        token_generator.sequence_length = 1
+
+        self.model_name = f"local:{checkpoint}"
+        self.tokenizer = prompt_processor.tokenizer
+        self.device = host_device
+        self.max_new_tokens = max_new_tokens
+        self.kv_capacity = context_length - sequence_length  # 超過這個長度 LLM_Generator 會截掉最舊的 KV
+        self.generator = LLM_Generator(
+            [token_generator, prompt_processor],
+            self.tokenizer,
+            RopeEmbedding(max_length=context_length, config=prompt_processor.llm_config),
+        )
+        end_token_ids = [self.tokenizer.convert_tokens_to_ids(t) for t in END_TOKENS]
+        self.generation_config = GenerationConfig(
+            max_new_tokens=max_new_tokens,
+            eos_token_id=sorted(set(end_token_ids)),
+            pad_token_id=self.tokenizer.pad_token_id or self.tokenizer.eos_token_id,
+            do_sample=False,  # 摘要用 greedy，結果可重現（也讓摘要快取有意義）
+        )
+        # 上一次生成後留下的 KV cache 與其對應的 token
+        self._cached_ids: Optional[torch.Tensor] = None
+        self._cached_kv: Optional[List[torch.Tensor]] = None
+        # 模型不可同時被多個請求使用：所有生成都排進同一個執行緒
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-llm")
+
+    def _build_prompt(self, messages: List[Dict[str, str]]) -> str:
+        system = next((m["content"] for m in messages if m.get("role") == "system"), LOCAL_LLM_SYSTEM_PROMPT)
+        user = "\n".join(m["content"] for m in messages if m.get("role") == "user")
+        return get_input_prompt_with_tags(user_input_prompt=user, system_context_prompt=system)
+
+    def _reusable_cache(self, input_ids: torch.Tensor) -> Optional[DynamicCache]:
+        """取出與 input_ids 共同前綴的 KV cache（至少留最後一個 token 給模型算 logits）"""
+        if self._cached_ids is None:
+            return None
+        limit = min(len(self._cached_ids), input_ids.shape[-1] - 1)
+        same = (self._cached_ids[:limit] == input_ids[0, :limit]).int()
+        prefix = int(same.cumprod(0).sum()) if limit > 0 else 0
+        if prefix == 0:
+            return None
+        # 與 LLM_Generator 相同的 KV 排列：key 的長度在最後一維，value 在倒數第二維
+        cache = DynamicCache()
+        cache.key_cache = [k[..., :prefix] for k in self._cached_kv[::2]]
+        cache.value_cache = [v[..., :prefix, :] for v in self._cached_kv[1::2]]
+        return cache
+
+    def _remember(self, sequences: torch.Tensor, past_key_values: Optional[DynamicCache]):
+        if past_key_values is None or not past_key_values.value_cache:
+            self._cached_ids = self._cached_kv = None
+            return
+        cached_len = past_key_values.value_cache[0].shape[-2]
+        # KV 被截斷過（超過 context）就無法與 token 對應，不保留
+        if cached_len >= self.kv_capacity:
+            self._cached_ids = self._cached_kv = None
+            return
+        self._cached_ids = sequences[0, :cached_len].cpu()
+        self._cached_kv = [t for pair in zip(past_key_values.key_cache, past_key_values.value_cache) for t in pair]
+
+    def _generate(self, prompt: str, streamer: _AsyncTextStreamer, stop: threading.Event):
+        input_ids = self.tokenizer(prompt, return_tensors="pt")["input_ids"].to(self.device)
+        past_key_values = self._reusable_cache(input_ids)
+        try:
+            with torch.no_grad():
+                output = self.generator.generate(
+                    inputs=input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    past_key_values=past_key_values,
+                    generation_config=self.generation_config,
+                    stopping_criteria=StoppingCriteriaList([_StopOnEvent(stop)]),
+                    streamer=streamer,
+                    return_dict_in_generate=True,
+                )
+            self._remember(output.sequences, output.past_key_values)
+        except Exception:
+            self._cached_ids = self._cached_kv = None
+            raise
+
+    async def chat_complete(self, messages: List[Dict[str, str]], streaming: bool = True) -> AsyncIterator[str]:
+        """與 KuwaClient.chat_complete 相同的介面：逐段 yield 生成的文字"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        streamer = _AsyncTextStreamer(self.tokenizer, loop, queue)
+        future = loop.run_in_executor(self._executor, self._generate, self._build_prompt(messages), streamer, stop)
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(queue.put_nowait, None))
+        try:
+            while True:
+                text = await queue.get()
+                if text is None:
+                    break
+                yield text
+            await future  # 生成失敗時把例外交給呼叫端（llm_pool 會重試）
+        finally:
+            stop.set()
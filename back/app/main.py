@@ -1,7 +1,18 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from app import routes
+from app.catalog import catalog
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # 關閉時釋放會議目錄的資料庫連線
+    await catalog.close()
+
 
-app = FastAPI(title="Conference Assistant API")
+app = FastAPI(title="Conference Assistant API", lifespan=lifespan)
 
 # 掛載路由
 app.include_router(routes.router)
@@ -1,15 +1,44 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+from typing import Any, Dict, List, Optional
 import os
+from .catalog import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, RecordIdConflict, catalog
+from .file_serving import serve_file, serve_generated
 from .schemas import ConferenceRecord
-from .transcribe import router as transcribe_router
+from .search import DOC_OVERALL, DOC_SEGMENT, SEARCH_MAX_RESULTS, match_expression, search, search_indexer
+from .semantic import PARTITION_AUTO, PARTITION_FLAT, PARTITION_IVF, SEMANTIC_MAX_K, semantic_index
+from .transcribe import SUMMARY_JSON, TRANSCRIPT_JSON, router as transcribe_router
+from .transcript_archive import TRANSCRIPT_ARCHIVE, TranscriptArchive
 
 router = APIRouter()
 UPLOAD_DIR = os.path.abspath("./uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+# 同名會議重新上傳 / 重新錄音、重新摘要都會就地改寫檔案（網址不變），一律每次重新驗證：
+# 內容沒變時強 ETag 回 304，不會重送；也不依賴重啟後就消失的記憶體狀態判斷是否定稿
+UPLOAD_CACHE_CONTROL = "no-cache"
 
-# 模擬記憶體資料庫
-conference_records = []
+
+def _folder_of(file_path: str) -> str:
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def _to_record(meeting: Dict[str, Any], segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """目錄中的會議 -> ConferenceRecord 格式（與先前 /records 的回應相同）"""
+    folder = meeting["base_name"]
+    return {
+        "id": meeting["id"],
+        "title": meeting["title"],
+        "date": meeting["date"],
+        "duration": meeting["duration"],
+        "file_path": meeting["file_path"],
+        "summary": meeting["summary"],
+        "is_transcribed": bool(meeting["is_transcribed"]),
+        "transcript_segments": [
+            {"timestamp": int(s["start"]), "text": s["text"], "speaker": s["speaker"]} for s in segments
+        ],
+        "summary_url": meeting["summary_url"] or f"/uploads/{folder}/summary.txt",
+        "transcript_url": meeting["transcript_url"] or f"/uploads/{folder}/transcript.txt",
+    }
 
 
 @router.get("/")
@@ -17,10 +46,25 @@ async def health_check():
     return {"status": "ok"}
 
 
+def _archive_json(archive_path: str, filename: str):
+    """從封存檔逐區塊轉出 transcript.json / summary.json（檔案在傳送期間保持開啟）"""
+    with TranscriptArchive(archive_path) as archive:
+        if filename == TRANSCRIPT_JSON:
+            yield from archive.iter_transcript_json()
+        else:
+            yield from archive.iter_summary_json()
+
+
 @router.get("/uploads/{folder}/{filename}")
-async def get_uploaded_file(folder: str, filename: str):
+async def get_uploaded_file(folder: str, filename: str, request: Request):
     file_path = os.path.join(UPLOAD_DIR, folder, filename)
     if not os.path.isfile(file_path):
+        # 已封存的會議：JSON 依需要由封存檔轉出
+        archive_path = os.path.join(UPLOAD_DIR, folder, TRANSCRIPT_ARCHIVE)
+        if filename in (TRANSCRIPT_JSON, SUMMARY_JSON) and os.path.isfile(archive_path):
+            return serve_generated(request, archive_path, os.path.splitext(filename)[0],
+                                   lambda: _archive_json(archive_path, filename),
+                                   "application/json", UPLOAD_CACHE_CONTROL)
         raise HTTPException(status_code=404, detail="File not found")
 
     media_type = "application/octet-stream"
@@ -28,19 +72,43 @@ async def get_uploaded_file(folder: str, filename: str):
         media_type = "audio/wav"
     elif filename.endswith(".txt"):
         media_type = "text/plain"
+    elif filename.endswith(".json"):
+        media_type = "application/json"
 
-    return FileResponse(file_path, media_type=media_type, filename=filename)
+    return serve_file(request, file_path, media_type, filename, UPLOAD_CACHE_CONTROL)
 
 
 @router.post("/record")
 async def receive_conference_record(record: ConferenceRecord):
-    filename = os.path.basename(record.file_path)
-    folder = os.path.splitext(filename)[0]
+    folder = _folder_of(record.file_path)
 
     record.summary_url = f"/uploads/{folder}/summary.txt"
     record.transcript_url = f"/uploads/{folder}/transcript.txt"
 
-    conference_records.append(record)
+    # 逐段時間：本段 timestamp 到下一段 timestamp（最後一段到會議結尾）
+    timestamps = [seg.timestamp for seg in record.transcript_segments]
+    segments = [
+        {
+            "index": i + 1,
+            "start": float(seg.timestamp),
+            "end": float(max(timestamps[i + 1] if i + 1 < len(timestamps) else record.duration, seg.timestamp)),
+            "text": seg.text,
+            "speaker": seg.speaker,
+        }
+        for i, seg in enumerate(record.transcript_segments)
+    ]
+    try:
+        await catalog.upsert_record({**record.model_dump(mode="json"), "base_name": folder}, segments)
+    except RecordIdConflict as e:
+        raise HTTPException(status_code=409, detail=f"Record id {e.record_id} already belongs to {e.base_name}")
+
+    # 搜尋索引也以上傳內容為準
+    docs = [(DOC_SEGMENT, seg["index"], seg["start"], seg["end"], seg["text"]) for seg in segments]
+    docs.append((DOC_OVERALL, 0, 0.0, float(record.duration), record.summary))
+    for indexer in (search_indexer, semantic_index):
+        indexer.clear(folder)
+        for doc in docs:
+            indexer.add(folder, *doc)
 
     return {
         "message": "Record received",
@@ -52,14 +120,78 @@ async def receive_conference_record(record: ConferenceRecord):
 
 
 @router.get("/records")
-async def list_conference_records():
-    for record in conference_records:
-        if not record.summary_url or not record.transcript_url:
-            filename = os.path.basename(record.file_path)
-            folder = os.path.splitext(filename)[0]
-            record.summary_url = f"/uploads/{folder}/summary.txt"
-            record.transcript_url = f"/uploads/{folder}/transcript.txt"
-    return conference_records
+async def list_conference_records(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    date_from: Optional[str] = Query(None, description="ISO 日期（含）"),
+    date_to: Optional[str] = Query(None, description="ISO 日期（不含）"),
+    include_segments: bool = Query(True),
+):
+    """依日期新到舊分頁列出會議（回應仍是紀錄陣列；總數放在 X-Total-Count）"""
+    meetings, total = await catalog.list_meetings(limit, offset, date_from, date_to)
+    segments = await catalog.segments_for([m["base_name"] for m in meetings]) if include_segments else {}
+    records = [_to_record(m, segments.get(m["base_name"], [])) for m in meetings]
+    return JSONResponse(records, headers={"X-Total-Count": str(total)})
+
+
+@router.get("/records/{record_id}")
+async def get_conference_record(record_id: str):
+    """以紀錄 id 或 base_name 取得單一會議"""
+    meeting = await catalog.get_meeting(record_id)
+    if meeting is None:
+        raise HTTPException(status_code=404, detail="Record not found")
+    segments = await catalog.segments_for([meeting["base_name"]])
+    return {
+        **_to_record(meeting, segments[meeting["base_name"]]),
+        "batches": await catalog.summaries_for(meeting["base_name"]),
+    }
+
+
+@router.get("/records/{record_id}/segments")
+async def get_conference_record_segments(
+    record_id: str,
+    start: float = Query(0.0, ge=0.0),
+    end: float = Query(float("inf"), gt=0.0),
+):
+    """會議中與 [start, end) 有交集的段落（已歸檔的會議不必載入 transcript.json）"""
+    meeting = await catalog.get_meeting(record_id)
+    if meeting is None:
+        raise HTTPException(status_code=404, detail="Record not found")
+    return {
+        "id": meeting["id"],
+        "base_name": meeting["base_name"],
+        "segments": await catalog.segments_between(meeting["base_name"], start, end),
+    }
+
+
+@router.get("/search")
+async def search_transcripts(
+    q: str = Query(..., min_length=1),
+    base_name: Optional[str] = Query(None, description="只搜尋這場會議"),
+    kind: Optional[List[str]] = Query(None, description="segment / summary / overall"),
+    limit: int = Query(50, ge=1, le=SEARCH_MAX_RESULTS),
+    offset: int = Query(0, ge=0),
+):
+    """全文搜尋逐段轉錄、批次摘要與整體摘要（依相關度排序，附時間與標示位置）"""
+    if match_expression(q) is None:
+        raise HTTPException(status_code=400, detail="Query has no searchable terms")
+    results = await search(q, base_name, kind, limit, offset)
+    return {"query": q, "results": results}
+
+
+@router.get("/semantic_search")
+async def semantic_search(
+    q: str = Query(..., min_length=1),
+    k: int = Query(10, ge=1, le=SEMANTIC_MAX_K),
+    base_name: Optional[str] = Query(None, description="只搜尋這場會議"),
+    kind: Optional[List[str]] = Query(None, description="segment / summary / overall"),
+    partition: str = Query(PARTITION_AUTO, pattern=f"^({PARTITION_AUTO}|{PARTITION_FLAT}|{PARTITION_IVF})$"),
+):
+    """語意搜尋（cosine 相似度 top-k），跨所有會議或限定單一會議"""
+    if not semantic_index.ready:
+        raise HTTPException(status_code=503, detail="Embedding model is not loaded")
+    results = await semantic_index.search(q, k, base_name, kind, partition)
+    return {"query": q, "results": results}
 
 
 # 轉錄 router
@@ -1,9 +1,10 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
+from enum import Enum
 
 class TranscriptSegment(BaseModel):
-    timestamp: int  # ƾ
+    timestamp: int  # 秒數整數
     text: str
     speaker: str
 
@@ -11,7 +12,7 @@ class ConferenceRecord(BaseModel):
     id: str
     title: str
     date: datetime
-    duration: float  # 
+    duration: float  # 秒數
     file_path: str
     summary: str
     is_transcribed: bool
@@ -19,3 +20,38 @@ class ConferenceRecord(BaseModel):
 
     summary_url: Optional[str] = None
     transcript_url: Optional[str] = None
+
+
+# ===============================
+# 轉錄段落 / 批次摘要（transcript.json 的結構）
+# ===============================
+class SegmentStatus(str, Enum):
+    PENDING = "pending"          # 佔位，尚未轉錄
+    TRANSCRIBED = "transcribed"  # 已轉錄，等待批次摘要
+    SUMMARIZED = "summarized"    # 所屬批次的摘要已完成
+    FAILED = "failed"            # 轉錄失敗
+
+class BatchStatus(str, Enum):
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+class SegmentRecord(BaseModel):
+    index: int
+    start: float
+    end: float
+    text: str = ""
+    summary: str = ""  # 顯示用：處理中(x/3) 或所屬批次的摘要
+    volume: float = 0.0
+    speech_ratio: Optional[float] = None
+    status: SegmentStatus = SegmentStatus.PENDING
+    batch_id: int
+    batch_range: Tuple[int, int]  # 所屬批次的 [第一段, 最後一段] index
+    summary_ref: Optional[int] = None  # 摘要完成後指向 batches 中的 batch_id
+
+class BatchRecord(BaseModel):
+    batch_id: int
+    start_index: int
+    end_index: int
+    status: BatchStatus = BatchStatus.PENDING
+    summary: str = ""
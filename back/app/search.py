@@ -0,0 +1,190 @@
+"""
+伺服端全文搜尋（SQLite FTS5，與會議目錄同一個資料庫）：
+- FTS5 內建的 tokenizer 不會切中文，這裡先自行斷詞：CJK 連續字串切成相鄰二字（bigram），
+  每段最後一個字再單獨收一次（單字查詢用前綴比對）；英數字詞轉小寫保留整個詞
+- 查詢時用同樣的方式切詞：多字中文查詢變成 bigram 片語（必須相鄰），所以不會誤中分散的字
+- 段落轉錄完成、批次摘要完成、整體摘要完成時就送進索引佇列，由背景 worker 批次寫入
+搜尋結果附上原文中每個關鍵字的 [start, end) 字元位置，前端可直接標示。
+"""
+import asyncio
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from .catalog import catalog
+
+# ===== 索引參數 =====
+SEARCH_INDEX_BATCH = 64  # 背景 worker 一次交易最多寫入的文件數
+SEARCH_MAX_RESULTS = 200
+
+# 文件類型
+DOC_SEGMENT = "segment"   # 逐段轉錄（idx = 段落 index）
+DOC_SUMMARY = "summary"   # 批次摘要（idx = batch_id）
+DOC_OVERALL = "overall"   # 整體摘要（idx = 0）
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"  # 假名、中日韓漢字、韓文
+_RUN_RE = re.compile(f"[{_CJK}]+|[0-9A-Za-z\u00c0-\u024f]+")
+
+
+def _is_cjk(run: str) -> bool:
+    return bool(re.match(f"[{_CJK}]", run))
+
+
+def index_tokens(text: str) -> str:
+    """要寫進 FTS5 的 token 字串（以空白分隔，交給 unicode61 tokenizer）"""
+    tokens: List[str] = []
+    for m in _RUN_RE.finditer(text or ""):
+        run = m.group()
+        if _is_cjk(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.append(run[-1])
+        else:
+            tokens.append(run.lower())
+    return " ".join(tokens)
+
+
+def _query_runs(query: str) -> List[str]:
+    return [m.group() for m in _RUN_RE.finditer(query or "")]
+
+
+def match_expression(query: str) -> Optional[str]:
+    """
+    使用者查詢 -> FTS5 MATCH 運算式（各詞之間 AND）。
+    多字中文 -> bigram 片語；單一中文字與英數字詞 -> 前綴比對（邊打字邊搜尋也能命中）。
+    """
+    parts = []
+    for run in _query_runs(query):
+        if _is_cjk(run) and len(run) > 1:
+            parts.append('"' + " ".join(run[i:i + 2] for i in range(len(run) - 1)) + '"')
+        else:
+            parts.append(f'"{run.lower()}"*')
+    return " AND ".join(parts) if parts else None
+
+
+def highlight_offsets(text: str, query: str) -> List[Tuple[int, int]]:
+    """查詢詞在原文中的 [start, end) 字元位置（不分大小寫，重疊的範圍會合併）"""
+    lowered = (text or "").lower()
+    spans = []
+    for run in _query_runs(query):
+        needle = run.lower()
+        pos = lowered.find(needle)
+        while pos >= 0:
+            spans.append((pos, pos + len(needle)))
+            pos = lowered.find(needle, pos + 1)
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class SearchIndexer:
+    """把要索引的文件排進佇列，由單一 worker 依序批次寫入（不阻塞轉錄與摘要流程）"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _put(self, op: Tuple[str, Any]):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._queue.put_nowait(op)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    def add(self, base_name: str, kind: str, idx: int, start: float, end: float, text: str):
+        """新增或覆寫一份文件（同一 base_name/kind/idx 只保留最新內容）"""
+        self._put(("upsert", {"base_name": base_name, "kind": kind, "idx": idx,
+                              "start": float(start), "end": float(end), "text": text or ""}))
+
+    def clear(self, base_name: str):
+        """會議重新開始（串流第 1 段 / 重新轉錄）：移除舊文件"""
+        self._put(("clear", base_name))
+
+    async def drain(self):
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _run(self):
+        queue = self._queue
+        while True:
+            ops = [await queue.get()]
+            while len(ops) < SEARCH_INDEX_BATCH and not queue.empty():
+                ops.append(queue.get_nowait())
+            try:
+                await self._apply(ops)
+            except Exception as e:
+                print(f"❌ 搜尋索引寫入失敗（{len(ops)} 筆）: {e}")
+            finally:
+                for _ in ops:
+                    queue.task_done()
+            if queue.empty():
+                return
+
+    async def _apply(self, ops: List[Tuple[str, Any]]):
+        async with catalog.transaction() as db:
+            for op, arg in ops:
+                if op == "clear":
+                    await db.execute("DELETE FROM search_fts WHERE rowid IN "
+                                     "(SELECT id FROM search_docs WHERE base_name = ?)", (arg,))
+                    await db.execute("DELETE FROM search_docs WHERE base_name = ?", (arg,))
+                else:
+                    await self._upsert(db, arg)
+
+    @staticmethod
+    async def _upsert(db: aiosqlite.Connection, doc: Dict[str, Any]):
+        async with db.execute(
+            "INSERT INTO search_docs (base_name, kind, idx, start, end, text) VALUES (:base_name, :kind, :idx, :start, :end, :text) "
+            "ON CONFLICT(base_name, kind, idx) DO UPDATE SET start = excluded.start, end = excluded.end, text = excluded.text "
+            "RETURNING id",
+            doc,
+        ) as cur:
+            doc_id = (await cur.fetchone())[0]
+        await db.execute("DELETE FROM search_fts WHERE rowid = ?", (doc_id,))
+        tokens = index_tokens(doc["text"])
+        if tokens:
+            await db.execute("INSERT INTO search_fts (rowid, tokens) VALUES (?, ?)", (doc_id, tokens))
+
+
+async def search(query: str, base_name: Optional[str] = None, kinds: Optional[List[str]] = None,
+                 limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+    """依 bm25 相關度排序的搜尋結果（含時間與標示位置）"""
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    where = ["search_fts MATCH ?"]
+    params: List[Any] = [expression]
+    if base_name:
+        where.append("d.base_name = ?")
+        params.append(base_name)
+    if kinds:
+        where.append(f"d.kind IN ({', '.join('?' * len(kinds))})")
+        params.extend(kinds)
+    db = await catalog.connection()
+    async with db.execute(
+        "SELECT d.base_name, d.kind, d.idx, d.start, d.end, d.text, bm25(search_fts) AS score "
+        "FROM search_fts JOIN search_docs d ON d.id = search_fts.rowid "
+        f"WHERE {' AND '.join(where)} ORDER BY score LIMIT ? OFFSET ?",
+        [*params, min(max(1, limit), SEARCH_MAX_RESULTS), max(0, offset)],
+    ) as cur:
+        rows = await cur.fetchall()
+    return [
+        {
+            "base_name": row["base_name"],
+            "kind": row["kind"],
+            "index": row["idx"],
+            "start": row["start"],
+            "end": row["end"],
+            "text": row["text"],
+            "highlights": highlight_offsets(row["text"], query),
+            "score": round(-row["score"], 4),  # bm25 越小越相關，轉成越大越相關
+        }
+        for row in rows
+    ]
+
+
+# 全域索引佇列
+search_indexer = SearchIndexer()
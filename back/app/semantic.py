@@ -0,0 +1,471 @@
+"""
+語意搜尋（例如「上次對 X 的決議是什麼」）：段落、批次摘要與整體摘要經 embeddings.py 編碼成單位向量，
+每場會議存成一個 float16 矩陣檔，查詢時與查詢向量做 NumPy 矩陣乘法取 top-k（單位向量的內積即 cosine）。
+- uploads/<base_name>/embeddings.f16：n x dim 的 little-endian float16，以 np.memmap 唯讀開啟，不整檔載入
+- uploads/<base_name>/embeddings.json：每一列對應的文件（kind/index/start/end/text）；同一文件重新編碼時覆寫原列
+- 全部會議合計達 SEMANTIC_IVF_MIN_ROWS 列時改用 IVF 分區（球面 k-means）：只掃最接近查詢的
+  SEMANTIC_IVF_PROBES 個分區；分區建好後新增的列以 flat 補掃，累積超過 SEMANTIC_IVF_REBUILD_RATIO 再於背景重建
+- 文件送進佇列後由背景 worker 批次編碼，不阻塞轉錄與摘要；查詢向量在另一個執行緒編碼，不排在文件後面
+向量模型未載入時不收文件，search() 拋出 RuntimeError（/semantic_search 回 503）。
+"""
+import asyncio
+import heapq
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# ===== 語意搜尋參數 =====
+SEMANTIC_INDEX_BATCH = int(os.environ.get("SEMANTIC_INDEX_BATCH", "32"))       # worker 一次編碼的文件數
+SEMANTIC_IVF_MIN_ROWS = int(os.environ.get("SEMANTIC_IVF_MIN_ROWS", "50000"))  # auto 模式下改用 IVF 的總列數
+SEMANTIC_IVF_PROBES = int(os.environ.get("SEMANTIC_IVF_PROBES", "8"))          # 每次查詢掃描的分區數
+SEMANTIC_IVF_REBUILD_RATIO = 0.2  # 分區外（新增 / 已清除）的列數超過此比例就重建
+SEMANTIC_IVF_TRAIN_ROWS = 32768   # k-means 訓練取樣上限
+SEMANTIC_IVF_TRAIN_PER_LIST = 64  # 每個分區取樣的訓練列數
+SEMANTIC_IVF_ITERATIONS = 10
+SEMANTIC_BLOCK_ROWS = 16384       # 掃描時一次轉成 float32 的列數
+SEMANTIC_MAX_K = 100
+
+# 分區模式
+PARTITION_AUTO = "auto"
+PARTITION_FLAT = "flat"
+PARTITION_IVF = "ivf"
+
+UPLOAD_DIR = Path("./uploads").resolve()
+VECTORS_FILE = "embeddings.f16"
+VECTORS_META = "embeddings.json"
+_DTYPE = np.dtype("<f2")
+
+
+class MeetingVectors:
+    """一場會議的向量檔與對應文件（紀錄只在 event loop 執行緒修改，檔案 I/O 在文件執行緒）"""
+
+    def __init__(self, folder: Path, dim: int, model: str):
+        self.folder = folder
+        self.base_name = folder.name
+        self.dim = dim
+        self.model = model
+        self.docs: List[Dict[str, Any]] = []
+        self._rows: Dict[Tuple[str, int], int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._kinds: Optional[np.ndarray] = None
+        self.writes = 0                      # 覆寫次數
+        self.rewritten: Dict[int, int] = {}  # 覆寫過的列 -> 第幾次覆寫（IVF 分區據此補掃）
+
+    @property
+    def path(self) -> Path:
+        return self.folder / VECTORS_FILE
+
+    @property
+    def meta_path(self) -> Path:
+        return self.folder / VECTORS_META
+
+    @classmethod
+    def load(cls, folder: Path) -> Optional["MeetingVectors"]:
+        try:
+            meta = json.loads((folder / VECTORS_META).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        vectors = cls(folder, int(meta["dim"]), meta["model"])
+        # 向量檔比紀錄短（寫入中斷）時只採用完整寫入的列
+        rows = vectors.path.stat().st_size // (vectors.dim * _DTYPE.itemsize) if vectors.path.exists() else 0
+        vectors.docs = meta["docs"][:rows]
+        vectors._rows = {(d["kind"], d["index"]): i for i, d in enumerate(vectors.docs)}
+        return vectors
+
+    def assign_rows(self, docs: List[Dict[str, Any]]) -> List[int]:
+        """每份文件要寫入的列：同一 kind/index 沿用原列，其餘依序接在後面（不修改狀態）"""
+        rows: List[int] = []
+        added: Dict[Tuple[str, int], int] = {}
+        for doc in docs:
+            key = (doc["kind"], doc["index"])
+            row = self._rows.get(key, added.get(key))
+            if row is None:
+                row = added[key] = len(self.docs) + len(added)
+            rows.append(row)
+        return rows
+
+    def write_rows(self, rows: List[int], vectors: np.ndarray):
+        """把向量寫進檔案的指定列（在文件執行緒執行；commit 之前查詢看不到這些列）"""
+        if not self.docs:
+            # 新檔：先放掉 memmap 再移除舊檔（Windows 無法刪除仍被映射的檔案），不在原檔上截斷
+            self._drop_matrix()
+            self.path.unlink(missing_ok=True)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        row_bytes = self.dim * _DTYPE.itemsize
+        with open(self.path, "r+b" if self.path.exists() else "wb") as f:
+            for row, vec in zip(rows, vectors):
+                f.seek(row * row_bytes)
+                f.write(vec.astype(_DTYPE).tobytes())
+
+    def commit(self, docs: List[Dict[str, Any]], rows: List[int]):
+        """向量寫入後更新文件紀錄（event loop 執行緒）"""
+        for doc, row in zip(docs, rows):
+            if row < len(self.docs):
+                self.docs[row] = doc
+                self.writes += 1
+                self.rewritten[row] = self.writes
+            else:
+                self.docs.append(doc)
+            self._rows[(doc["kind"], doc["index"])] = row
+
+    def write_meta(self, docs: List[Dict[str, Any]]):
+        """寫入文件紀錄檔（在文件執行緒執行；docs 為 commit 後的快照）"""
+        tmp = self.meta_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps({"model": self.model, "dim": self.dim, "docs": docs}, ensure_ascii=False),
+                       encoding="utf-8")
+        os.replace(tmp, self.meta_path)
+
+    def remove(self):
+        """移除向量檔（在文件執行緒執行；呼叫前已從索引中移除這場會議）"""
+        self.docs, self._rows = [], {}
+        self._drop_matrix()
+        self.rewritten = {}
+        self.path.unlink(missing_ok=True)
+        self.meta_path.unlink(missing_ok=True)
+
+    def _drop_matrix(self):
+        # 只放掉自己的參照：查詢中的快照可能仍在讀同一個 memmap，由它們結束後釋放
+        self._matrix = self._kinds = None
+
+    def matrix(self) -> Optional[np.ndarray]:
+        n = len(self.docs)
+        if n == 0:
+            return None
+        if self._matrix is None or self._matrix.shape[0] != n:
+            self._matrix = np.memmap(self.path, dtype=_DTYPE, mode="r", shape=(n, self.dim))
+        return self._matrix
+
+    def kinds(self) -> np.ndarray:
+        if self._kinds is None or len(self._kinds) != len(self.docs):
+            self._kinds = np.array([d["kind"] for d in self.docs], dtype=object)
+        return self._kinds
+
+
+class _Entry(NamedTuple):
+    """查詢當下某場會議的快照（之後新增的列不在 matrix 範圍內）"""
+    vectors: MeetingVectors
+    matrix: np.ndarray
+    docs: List[Dict[str, Any]]
+    kinds: np.ndarray
+
+
+class _IvfPartition:
+    """IVF 分區：centroids 與每個分區的列（以建立時各會議的全域列號表示）"""
+
+    def __init__(self, entries: List[_Entry], centroids: np.ndarray, lists: List[np.ndarray]):
+        self.centroids = centroids
+        self.lists = lists
+        self.owners = [e.vectors for e in entries]
+        self.sizes = [e.matrix.shape[0] for e in entries]
+        self.offsets = np.cumsum([0, *self.sizes])
+        self.total = int(self.offsets[-1])
+        self._sizes_by_owner = {id(owner): size for owner, size in zip(self.owners, self.sizes)}
+        self._writes_by_owner = {id(owner): owner.writes for owner in self.owners}
+
+    def covered_rows(self, vectors: MeetingVectors) -> int:
+        """這場會議有多少列在分區內（會議被清除重建過則為新物件，回傳 0）"""
+        return min(self._sizes_by_owner.get(id(vectors), 0), len(vectors.docs))
+
+    def rewritten_rows(self, vectors: MeetingVectors) -> np.ndarray:
+        """分區建立後被覆寫的列（分區位置依舊向量決定，需另外掃描）"""
+        built = self._writes_by_owner.get(id(vectors))
+        if built is None or vectors.writes == built:
+            return np.zeros(0, dtype=np.int64)
+        covered = self.covered_rows(vectors)
+        return np.array(sorted(row for row, w in vectors.rewritten.items() if w > built and row < covered),
+                        dtype=np.int64)
+
+    def stale_fraction(self, entries: List[_Entry]) -> float:
+        outside = sum(e.matrix.shape[0] - self.covered_rows(e.vectors) for e in entries)
+        covered = sum(self.covered_rows(e.vectors) for e in entries)
+        rewritten = sum(len(self.rewritten_rows(e.vectors)) for e in entries)
+        return (outside + self.total - covered + rewritten) / max(1, self.total)
+
+
+def _scores(block: np.ndarray, query: np.ndarray) -> np.ndarray:
+    return block.astype(np.float32) @ query
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    if len(scores) <= k:
+        return np.arange(len(scores))
+    return np.argpartition(-scores, k - 1)[:k]
+
+
+def _scan(entry: _Entry, rows: np.ndarray, query: np.ndarray, k: int, allowed: Optional[set],
+          hits: List[Tuple[float, int, int]], entry_no: int):
+    """對指定列（遞增）逐塊計分，保留每塊的 top-k"""
+    for b in range(0, len(rows), SEMANTIC_BLOCK_ROWS):
+        block_rows = rows[b:b + SEMANTIC_BLOCK_ROWS]
+        if len(block_rows) and block_rows[-1] - block_rows[0] + 1 == len(block_rows):
+            block = entry.matrix[block_rows[0]:block_rows[-1] + 1]  # 連續列直接切片
+        else:
+            block = entry.matrix[block_rows]
+        scores = _scores(block, query)
+        if allowed is not None:
+            scores[~np.isin(entry.kinds[block_rows], list(allowed))] = -np.inf
+        for i in _top(scores, k):
+            if np.isfinite(scores[i]):
+                hits.append((float(scores[i]), entry_no, int(block_rows[i])))
+
+
+def _assign(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.concatenate([
+        np.argmax(_scores(x[b:b + SEMANTIC_BLOCK_ROWS], centroids.T), axis=1)
+        for b in range(0, len(x), SEMANTIC_BLOCK_ROWS)
+    ]) if len(x) else np.zeros(0, dtype=np.int64)
+
+
+def _build_ivf(entries: List[_Entry]) -> _IvfPartition:
+    """球面 k-means（取樣訓練）後把所有列分到最近的 centroid；nlist = sqrt(總列數)"""
+    sizes = [e.matrix.shape[0] for e in entries]
+    offsets = np.cumsum([0, *sizes])
+    total = int(offsets[-1])
+    rng = np.random.default_rng(0)
+    nlist = max(1, int(math.sqrt(total)))
+
+    train_rows = min(total, SEMANTIC_IVF_TRAIN_ROWS, SEMANTIC_IVF_TRAIN_PER_LIST * nlist)
+    sample = np.sort(rng.choice(total, size=train_rows, replace=False))
+    owner = np.searchsorted(offsets, sample, side="right") - 1
+    x = np.concatenate([
+        entries[e].matrix[sample[owner == e] - offsets[e]].astype(np.float32) for e in np.unique(owner)
+    ])
+    centroids = x[rng.choice(len(x), size=min(nlist, len(x)), replace=False)]
+    for _ in range(SEMANTIC_IVF_ITERATIONS):
+        assign = _assign(x, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=len(centroids))
+        starts = np.cumsum(counts) - counts
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(x[order], starts[~empty])
+        sums[empty] = x[rng.choice(len(x), size=int(empty.sum()))]  # 空分區重新取樣
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+    assign = np.concatenate([_assign(e.matrix, centroids) for e in entries])
+    order = np.argsort(assign, kind="stable")
+    bounds = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+    lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+    return _IvfPartition(entries, centroids, lists)
+
+
+def _search_blocking(entries: List[_Entry], query: np.ndarray, k: int, kinds: Optional[List[str]],
+                     ivf: Optional[_IvfPartition]) -> List[Tuple[float, int, int]]:
+    allowed = set(kinds) if kinds else None
+    hits: List[Tuple[float, int, int]] = []
+    entry_no = {id(e.vectors): n for n, e in enumerate(entries)}
+    if ivf is not None:
+        probes = np.argsort(-(ivf.centroids @ query))[:SEMANTIC_IVF_PROBES]
+        ids = np.sort(np.concatenate([ivf.lists[p] for p in probes]))
+        owner = np.searchsorted(ivf.offsets, ids, side="right") - 1
+        for o in np.unique(owner):
+            n = entry_no.get(id(ivf.owners[o]))
+            if n is None:
+                continue  # 會議已被清除
+            rows = ids[owner == o] - ivf.offsets[o]
+            _scan(entries[n], rows[rows < ivf.covered_rows(entries[n].vectors)], query, k, allowed, hits, n)
+    for n, entry in enumerate(entries):
+        # 沒有分區時整場掃描；有分區時只補掃分區建立後新增與覆寫的列
+        if ivf is None:
+            _scan(entry, np.arange(entry.matrix.shape[0]), query, k, allowed, hits, n)
+            continue
+        _scan(entry, np.arange(ivf.covered_rows(entry.vectors), entry.matrix.shape[0]), query, k, allowed, hits, n)
+        _scan(entry, ivf.rewritten_rows(entry.vectors), query, k, allowed, hits, n)
+    # 覆寫過的列可能在分區與補掃中各出現一次：同一列只保留新分數
+    best: Dict[Tuple[int, int], float] = {}
+    for score, n, row in hits:
+        best[(n, row)] = score
+    return heapq.nlargest(k, ((score, n, row) for (n, row), score in best.items()))
+
+
+class SemanticIndex:
+    def __init__(self, root: Path = UPLOAD_DIR):
+        self.root = root
+        self.embedder = None
+        self._doc_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-docs")
+        self._query_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-query")
+        self._meetings: Optional[Dict[str, MeetingVectors]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._ivf: Optional[_IvfPartition] = None
+        self._ivf_build: Optional[asyncio.Future] = None
+        self.documents_embedded = 0
+
+    def load(self, embedder):
+        """設定向量模型（embeddings.NomicEmbedder 或相同介面的物件）"""
+        self.embedder = embedder
+        self._meetings = None  # 換模型後舊向量不可比較，重新掃描
+
+    @property
+    def ready(self) -> bool:
+        return self.embedder is not None
+
+    # ---------- 寫入 ----------
+    def _put(self, op: Tuple[str, Any]):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._queue.put_nowait(op)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    def add(self, base_name: str, kind: str, idx: int, start: float, end: float, text: str):
+        """新增或覆寫一份文件；模型未載入或沒有文字時略過"""
+        if self.embedder is None or not (text or "").strip():
+            return
+        self._put(("upsert", {"base_name": base_name, "kind": kind, "index": idx,
+                              "start": float(start), "end": float(end), "text": text}))
+
+    def clear(self, base_name: str):
+        """會議重新開始（串流第 1 段 / 重新轉錄 / 重新上傳紀錄）：移除舊向量"""
+        if self.embedder is not None:
+            self._put(("clear", base_name))
+
+    async def drain(self):
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _run(self):
+        queue = self._queue
+        while True:
+            ops = [await queue.get()]
+            while len(ops) < SEMANTIC_INDEX_BATCH and not queue.empty():
+                ops.append(queue.get_nowait())
+            try:
+                await self._apply(ops)
+            except Exception as e:
+                print(f"❌ 語意索引寫入失敗（{len(ops)} 筆）: {e}")
+            finally:
+                for _ in ops:
+                    queue.task_done()
+            if queue.empty():
+                return
+
+    async def _apply(self, ops: List[Tuple[str, Any]]):
+        # 連續的新增合併成一次編碼；clear 依原順序執行。單一會議失敗不影響同批其他會議
+        loop = asyncio.get_running_loop()
+        docs: List[Dict[str, Any]] = []
+        for op, arg in ops:
+            if op == "clear":
+                await self._embed(docs)
+                docs = []
+                vectors = self._all().pop(arg, None) or MeetingVectors.load(self.root / arg)
+                if vectors is None:
+                    continue
+                try:
+                    await loop.run_in_executor(self._doc_executor, vectors.remove)
+                except Exception as e:
+                    print(f"❌ {arg}: 語意索引清除失敗: {e}")
+            else:
+                docs.append(arg)
+        await self._embed(docs)
+
+    async def _embed(self, docs: List[Dict[str, Any]]):
+        if not docs:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            matrix = await loop.run_in_executor(self._doc_executor, self.embedder.embed, [d["text"] for d in docs])
+        except Exception as e:
+            print(f"❌ 語意索引編碼失敗（{len(docs)} 筆）: {e}")
+            return
+        groups: Dict[str, List[int]] = {}
+        for i, doc in enumerate(docs):
+            groups.setdefault(doc["base_name"], []).append(i)
+        meetings = self._all()
+        for base_name, rows in groups.items():
+            vectors = meetings.get(base_name)
+            if vectors is None:
+                vectors = meetings[base_name] = MeetingVectors(self.root / base_name, self.embedder.dim,
+                                                                self.embedder.model_name)
+            batch = [{k: v for k, v in docs[i].items() if k != "base_name"} for i in rows]
+            try:
+                # 檔案 I/O 在文件執行緒；列寫完才更新紀錄，查詢不會讀到還沒寫入的列
+                targets = vectors.assign_rows(batch)
+                await loop.run_in_executor(self._doc_executor, vectors.write_rows, targets, matrix[rows])
+                vectors.commit(batch, targets)
+                await loop.run_in_executor(self._doc_executor, vectors.write_meta, list(vectors.docs))
+            except Exception as e:
+                print(f"❌ {base_name}: 語意索引寫入失敗（{len(rows)} 筆）: {e}")
+                continue
+            self.documents_embedded += len(rows)
+
+    def _all(self) -> Dict[str, MeetingVectors]:
+        """所有會議的向量（第一次使用時掃描 uploads；其他模型產生的向量不採用）"""
+        if self._meetings is None:
+            self._meetings = {}
+            for meta in self.root.glob(f"*/{VECTORS_META}"):
+                vectors = MeetingVectors.load(meta.parent)
+                if vectors is not None and (self.embedder is None or vectors.model == self.embedder.model_name):
+                    self._meetings[vectors.base_name] = vectors
+        return self._meetings
+
+    # ---------- 查詢 ----------
+    def _snapshot(self, base_name: Optional[str]) -> List[_Entry]:
+        meetings = self._all()
+        selected = [meetings[base_name]] if base_name in meetings else [] if base_name else meetings.values()
+        return [_Entry(v, v.matrix(), list(v.docs), v.kinds()) for v in selected if v.docs]
+
+    async def _partition(self, entries: List[_Entry], wait: bool) -> Optional[_IvfPartition]:
+        """目前的 IVF 分區；過期時在背景重建（wait=True 時等重建完成）"""
+        if self._ivf is None or self._ivf.stale_fraction(entries) > SEMANTIC_IVF_REBUILD_RATIO:
+            if self._ivf_build is None or self._ivf_build.done():
+                loop = asyncio.get_running_loop()
+                self._ivf_build = loop.run_in_executor(None, _build_ivf, entries)
+                self._ivf_build.add_done_callback(self._install_ivf)
+            if wait:
+                await asyncio.shield(self._ivf_build)
+        return self._ivf
+
+    def _install_ivf(self, future: asyncio.Future):
+        if future.cancelled() or future.exception() is not None:
+            print(f"⚠️ IVF 分區建立失敗: {future.exception() if not future.cancelled() else 'cancelled'}")
+            return
+        self._ivf = future.result()
+        print(f"✅ 語意搜尋 IVF 分區已建立（{self._ivf.total} 列，{len(self._ivf.lists)} 個分區）")
+
+    async def search(self, query: str, k: int = 10, base_name: Optional[str] = None,
+                     kinds: Optional[List[str]] = None, partition: str = PARTITION_AUTO) -> List[Dict[str, Any]]:
+        """cosine 相似度 top-k（含會議、時間與原文）"""
+        if self.embedder is None:
+            raise RuntimeError("文字向量模型尚未載入")
+        loop = asyncio.get_running_loop()
+        query_vector = await loop.run_in_executor(self._query_executor, self.embedder.embed_query, query)
+        entries = self._snapshot(base_name)
+        if not entries:
+            return []
+
+        total = sum(e.matrix.shape[0] for e in entries)
+        ivf = None
+        # 分區涵蓋全部會議；只查一場會議時直接 flat 掃描
+        if base_name is None and (partition == PARTITION_IVF or
+                                  (partition == PARTITION_AUTO and total >= SEMANTIC_IVF_MIN_ROWS)):
+            ivf = await self._partition(entries, wait=partition == PARTITION_IVF)
+
+        k = min(max(1, k), SEMANTIC_MAX_K)
+        hits = await loop.run_in_executor(None, _search_blocking, entries, query_vector.astype(np.float32),
+                                          k, kinds, ivf)
+        return [
+            {"base_name": entries[n].vectors.base_name, **entries[n].docs[row], "score": round(score, 4)}
+            for score, n, row in hits
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        meetings = self._meetings or {}
+        return {
+            "ready": self.ready,
+            "model": getattr(self.embedder, "model_name", None),
+            "meetings": len(meetings),
+            "rows": sum(len(v.docs) for v in meetings.values()),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "documents_embedded": self.documents_embedded,
+            "ivf_lists": len(self._ivf.lists) if self._ivf is not None else None,
+        }
+
+
+# 全域語意搜尋索引
+semantic_index = SemanticIndex()
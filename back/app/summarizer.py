@@ -0,0 +1,67 @@
+"""
+摘要管線：ASR 完成的段落湊滿一批後交給這裡，由每個會議各自的摘要 worker 依序處理，
+上傳/轉錄的請求不必等 LLM 呼叫結束就能回傳。
+所有會議的摘要共用一個並行上限（SUMMARY_CONCURRENCY），避免同時打爆 LLM 服務。
+"""
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Optional
+
+# ===== 摘要管線參數 =====
+SUMMARY_CONCURRENCY = int(os.environ.get("SUMMARY_CONCURRENCY", "2"))  # 同時進行的 LLM 摘要數
+
+SummaryWork = Callable[[], Awaitable[None]]
+
+
+class SummaryPipeline:
+    """每個會議一條有序的摘要佇列；佇列清空時 worker 自動結束"""
+
+    def __init__(self, concurrency: int = SUMMARY_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        self._limiter: Optional[asyncio.Semaphore] = None
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+    def submit(self, base_name: str, work: SummaryWork):
+        """加入一份摘要工作（不等待執行）"""
+        if self._limiter is None:
+            # Semaphore 需在 event loop 內建立，因此延遲到第一次 submit
+            self._limiter = asyncio.Semaphore(self.concurrency)
+        queue = self._queues.get(base_name)
+        if queue is None:
+            queue = self._queues[base_name] = asyncio.Queue()
+        queue.put_nowait(work)
+        worker = self._workers.get(base_name)
+        if worker is None or worker.done():
+            self._workers[base_name] = asyncio.create_task(self._worker(base_name, queue))
+
+    async def drain(self, base_name: str):
+        """等待會議所有已送出的摘要完成（finalize / 工作結束前呼叫）"""
+        queue = self._queues.get(base_name)
+        if queue is not None:
+            await queue.join()
+
+    def pending(self, base_name: str) -> int:
+        queue = self._queues.get(base_name)
+        return queue.qsize() if queue is not None else 0
+
+    async def _worker(self, base_name: str, queue: asyncio.Queue):
+        while True:
+            work = await queue.get()
+            try:
+                async with self._limiter:
+                    await work()
+            except Exception as e:
+                print(f"❌ {base_name}: 批次摘要失敗: {e}")
+            finally:
+                queue.task_done()
+            if queue.empty():
+                # 沒有待處理工作：移除佇列（下一次 submit 會重新建立）
+                if self._queues.get(base_name) is queue:
+                    del self._queues[base_name]
+                    del self._workers[base_name]
+                return
+
+
+# 全域摘要管線
+summary_pipeline = SummaryPipeline()
@@ -0,0 +1,108 @@
+"""
+LLM 摘要結果快取（SQLite，跨重啟保留）：
+- key = sha256(模型名稱 + 完整 prompt)；prompt 已包含模板與批次文字，任何一項改變都會重新生成
+- /regenerate_summaries 或重複 finalize 時，文字沒變的批次（與摘要樹合併）直接取用快取
+- 以 last_used 做 LRU，超過 SUMMARY_CACHE_MAX_ENTRIES 筆就淘汰最久未使用的
+只快取 LLM 成功回傳的結果；失敗不寫入，下次會重試。
+SQLite 讀寫（含 commit 的 fsync）在專用的單一執行緒進行，不阻塞 event loop。
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+# ===== 快取參數 =====
+SUMMARY_CACHE_PATH = Path(os.environ.get("SUMMARY_CACHE_PATH", "./uploads/.summary_cache.sqlite3"))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.environ.get("SUMMARY_CACHE_MAX_ENTRIES", "20000"))
+SUMMARY_CACHE_EVICT_BATCH = 256  # 超過上限時一次淘汰的筆數（避免每次寫入都刪）
+
+
+def cache_key(model: str, prompt: str) -> str:
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8"))
+    h.update(b"\0")
+    h.update(prompt.encode("utf-8"))
+    return h.hexdigest()
+
+
+class SummaryCache:
+    def __init__(self, path: Path = SUMMARY_CACHE_PATH, max_entries: int = SUMMARY_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._count = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary-cache")
+
+    def _connect(self) -> sqlite3.Connection:
+        # 延遲到第一次使用才開檔
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, summary TEXT NOT NULL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_last_used ON summaries(last_used)")
+            self._count = conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    async def get(self, model: str, prompt: str) -> Optional[str]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._get, model, prompt)
+
+    async def put(self, model: str, prompt: str, summary: str):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._put, model, prompt, summary)
+
+    def _get(self, model: str, prompt: str) -> Optional[str]:
+        key = cache_key(model, prompt)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE summaries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def _put(self, model: str, prompt: str, summary: str):
+        key = cache_key(model, prompt)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO summaries (key, model, summary, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, summary, now, now),
+            )
+            if cur.rowcount == 0:
+                conn.execute("UPDATE summaries SET summary = ?, last_used = ? WHERE key = ?", (summary, now, key))
+                return
+            self._count += 1
+            if self._count > self.max_entries:
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        excess = self._count - self.max_entries + min(SUMMARY_CACHE_EVICT_BATCH, self.max_entries // 10)
+        conn.execute(
+            "DELETE FROM summaries WHERE key IN (SELECT key FROM summaries ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._count = conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {"entries": self._count, "hits": self.hits, "misses": self.misses}
+
+
+# 全域摘要快取
+summary_cache = SummaryCache()
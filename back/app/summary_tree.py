@@ -0,0 +1,157 @@
+"""
+逐層累積的摘要樹：批次摘要完成時就往上合併，finalize 只需合併少數頂層節點。
+- 第 0 層是批次摘要；同一層任何地方湊滿 SUMMARY_TREE_FANOUT 個相鄰節點就合併成上一層的一個節點
+- 每層最多留下 FANOUT-1 個尚未合併的節點（frontier），整體摘要只讀 frontier
+  -> 整體摘要的 prompt 長度隨會議長度呈對數成長，finalize 延遲幾乎固定
+- 狀態存在 summary_tree.json，重啟後仍可接續
+同一會議的 add_leaf 由摘要管線依序呼叫，不會同時修改。
+"""
+import json
+import os
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+# ===== 摘要樹參數 =====
+SUMMARY_TREE_FANOUT = int(os.environ.get("SUMMARY_TREE_FANOUT", "4"))  # 幾個節點合併成上一層
+SUMMARY_TREE_JSON = "summary_tree.json"
+SUMMARY_TREE_CACHE_SIZE = 64
+
+
+@dataclass
+class SummaryNode:
+    level: int
+    start: int  # 涵蓋的第一段 index
+    end: int    # 涵蓋的最後一段 index
+    summary: str
+
+
+MergeFn = Callable[[List[SummaryNode]], Awaitable[str]]
+
+
+class SummaryTree:
+    def __init__(self, path: Path, fanout: int = SUMMARY_TREE_FANOUT):
+        self.path = path
+        self.fanout = max(2, fanout)
+        self.levels: List[List[SummaryNode]] = []  # 每層尚未合併的節點（依 start 排序）
+
+    @classmethod
+    def load(cls, path: Path) -> "SummaryTree":
+        tree = cls(path)
+        if path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            tree.levels = [[SummaryNode(**n) for n in level] for level in data.get("levels", [])]
+        return tree
+
+    @property
+    def empty(self) -> bool:
+        return not any(self.levels)
+
+    def frontier(self) -> List[SummaryNode]:
+        """所有尚未合併的節點，依時間順序；合起來涵蓋整場會議"""
+        return sorted((n for level in self.levels for n in level), key=lambda n: n.start)
+
+    def reset(self):
+        self.levels = []
+        self.save()
+
+    async def add_leaf(self, start: int, end: int, summary: str, merge: MergeFn):
+        """加入一個批次摘要，必要時逐層向上合併"""
+        self._insert(SummaryNode(0, start, end, summary))
+        level = 0
+        while level < len(self.levels):
+            nodes = self.levels[level]
+            i = self._contiguous_run(nodes)
+            if i is None:
+                # 沒有可合併的節點：卡在高層節點之間的節點升到上一層，之後跟上一層一起合併
+                if self._promote_stranded(level):
+                    continue
+                level += 1
+                continue
+            group = nodes[i:i + self.fanout]
+            merged = SummaryNode(level + 1, group[0].start, group[-1].end, await merge(group))
+            self.levels[level] = nodes[:i] + nodes[i + self.fanout:]
+            self._insert(merged)
+        self.save()
+
+    def _insert(self, node: SummaryNode):
+        while len(self.levels) <= node.level:
+            self.levels.append([])
+        nodes = self.levels[node.level]
+        # 同一範圍重新產生時覆寫舊節點
+        nodes[:] = [n for n in nodes if n.start != node.start]
+        nodes.append(node)
+        nodes.sort(key=lambda n: n.start)
+
+    def _contiguous_run(self, nodes: List[SummaryNode]) -> Optional[int]:
+        """
+        同層第一組 fanout 個相鄰節點的起點；沒有時回傳 None。
+        亂序完成時缺口前後的節點各自湊滿就合併，不必等最前面的缺口補上。
+        """
+        run = 1
+        for i in range(1, len(nodes)):
+            run = run + 1 if nodes[i - 1].end + 1 == nodes[i].start else 1
+            if run == self.fanout:
+                return i - self.fanout + 1
+        return None
+
+    def _promote_stranded(self, level: int) -> bool:
+        """
+        亂序完成時，晚到的批次可能夾在已合併的高層節點之間（或在會議開頭），同層永遠湊不滿 fanout 個；
+        這種兩側都被封住的同層區塊直接升一層（不呼叫 LLM），之後跟上一層的鄰居一起合併，
+        避免 frontier 中累積零散的低層節點。回傳是否有節點升層。
+        """
+        frontier = self.frontier()
+
+        def closed(node: SummaryNode, neighbor: Optional[SummaryNode], before: bool) -> bool:
+            if neighbor is None:
+                # 會議開頭之前沒有東西了；最後面則可能還有批次要來
+                return before and node.start <= 1
+            adjacent = neighbor.end + 1 == node.start if before else node.end + 1 == neighbor.start
+            return adjacent and neighbor.level > level
+
+        stranded: List[SummaryNode] = []
+        i = 0
+        while i < len(frontier):
+            if frontier[i].level != level:
+                i += 1
+                continue
+            j = i  # 同層、彼此相鄰的一段 frontier[i..j]
+            while (j + 1 < len(frontier) and frontier[j + 1].level == level
+                   and frontier[j].end + 1 == frontier[j + 1].start):
+                j += 1
+            before = frontier[i - 1] if i > 0 else None
+            after = frontier[j + 1] if j + 1 < len(frontier) else None
+            if closed(frontier[i], before, True) and closed(frontier[j], after, False):
+                stranded.extend(frontier[i:j + 1])
+            i = j + 1
+        for node in stranded:
+            self.levels[level].remove(node)
+            node.level = level + 1
+            self._insert(node)
+        return bool(stranded)
+
+    def save(self):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        data = {"fanout": self.fanout, "levels": [[asdict(n) for n in level] for level in self.levels]}
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+
+# ===============================
+# 全域快取（base_name -> tree）
+# ===============================
+_trees: "OrderedDict[str, SummaryTree]" = OrderedDict()
+
+
+def get_summary_tree(folder: Path) -> SummaryTree:
+    key = folder.name
+    tree = _trees.get(key)
+    if tree is None:
+        tree = _trees[key] = SummaryTree.load(folder / SUMMARY_TREE_JSON)
+        while len(_trees) > SUMMARY_TREE_CACHE_SIZE:
+            _trees.popitem(last=False)
+    else:
+        _trees.move_to_end(key)
+    return tree
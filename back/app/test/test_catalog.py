@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from app.catalog import Catalog, RecordIdConflict
+
+
+def _meeting(record_id: str, base_name: str, title: str = "週會"):
+    return {
+        "id": record_id,
+        "base_name": base_name,
+        "title": title,
+        "date": "2026-10-01T10:00:00",
+        "duration": 60.0,
+        "file_path": f"/uploads/{base_name}/base.wav",
+        "summary": "",
+        "is_transcribed": False,
+    }
+
+
+def test_upsert_record_rejects_id_of_another_meeting(tmp_path):
+    async def run():
+        catalog = Catalog(f"sqlite+aiosqlite:///{tmp_path / 'speech.db'}")
+        try:
+            await catalog.upsert_record(_meeting("r1", "meet_a"), [])
+            with pytest.raises(RecordIdConflict) as e:
+                await catalog.upsert_record(_meeting("r1", "meet_b"), [])
+            assert e.value.base_name == "meet_a"
+
+            # 同一場會議重送同一個 id：照常覆寫
+            await catalog.upsert_record(_meeting("r1", "meet_a", title="週會（更新）"), [])
+            db = await catalog.connection()
+            async with db.execute("SELECT id, base_name, title FROM meetings ORDER BY base_name") as cur:
+                rows = [tuple(row) for row in await cur.fetchall()]
+            assert rows == [("r1", "meet_a", "週會（更新）")]
+        finally:
+            await catalog.close()
+
+    asyncio.run(run())
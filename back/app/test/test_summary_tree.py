@@ -0,0 +1,51 @@
+import asyncio
+import random
+
+from app.summary_tree import SummaryTree
+
+BATCH = 3
+
+
+async def _merge(group):
+    return "+".join(n.summary for n in group)
+
+
+def _build(tmp_path, order):
+    tree = SummaryTree(tmp_path / "summary_tree.json", fanout=4)
+
+    async def run():
+        for b in order:
+            await tree.add_leaf(b * BATCH + 1, b * BATCH + BATCH, str(b), _merge)
+
+    asyncio.run(run())
+    return tree
+
+
+def _check_coverage(tree, batches):
+    frontier = tree.frontier()
+    assert all(a.end < b.start for a, b in zip(frontier, frontier[1:]))
+    covered = sorted(int(b) for n in frontier for b in n.summary.split("+"))
+    assert covered == sorted(batches)
+
+
+def test_runs_after_a_gap_are_merged(tmp_path):
+    # 第 5 批一直沒完成：缺口後面的批次仍要各自往上合併
+    batches = [b for b in range(200) if b != 5]
+    tree = _build(tmp_path, batches)
+    _check_coverage(tree, batches)
+    assert all(len(level) < 2 * tree.fanout for level in tree.levels)
+    assert len(tree.frontier()) <= 10
+
+
+def test_random_order_keeps_frontier_small(tmp_path):
+    rng = random.Random(0)
+    for n in (64, 200, 1000):
+        order = rng.sample(range(n), n)
+        tree = _build(tmp_path, order)
+        _check_coverage(tree, order)
+        assert len(tree.frontier()) <= 3 * len(tree.levels), n
+
+
+def test_in_order_is_unchanged(tmp_path):
+    tree = _build(tmp_path, range(64))
+    assert [n.level for n in tree.frontier()] == [3]
@@ -0,0 +1,43 @@
+import numpy as np
+
+from app.vad import detect_speech
+
+SR = 16000
+
+
+def _to_pcm(x: np.ndarray, level_db: float) -> np.ndarray:
+    x = x * 10 ** (level_db / 20) / np.sqrt(np.mean(x * x))
+    return (x * 32768).astype(np.int16)
+
+
+def _continuous_speech(level_db: float, seconds: float = 20.0) -> np.ndarray:
+    """沒有停頓的講話：諧波 + 每秒 4 個音節的淺包絡（音節間能量只降約 4 dB）"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(SR * seconds)) / SR
+    voice = sum(np.sin(2 * np.pi * f * t) / (k + 1) for k, f in enumerate((140, 280, 420, 560, 700)))
+    envelope = 0.8 + 0.2 * np.sin(2 * np.pi * 4 * t)
+    return _to_pcm(voice * envelope + 0.05 * rng.standard_normal(len(t)), level_db)
+
+
+def test_quiet_continuous_speech_is_kept():
+    for level_db in (-30, -36, -42):
+        result = detect_speech(_continuous_speech(level_db), SR)
+        assert result.has_speech, level_db
+        assert result.speech_ratio > 0.9
+
+
+def test_steady_noise_is_skipped():
+    rng = np.random.default_rng(1)
+    for level_db in (-50, -40, -30):
+        result = detect_speech(_to_pcm(rng.standard_normal(SR * 20), level_db), SR)
+        assert not result.has_speech, level_db
+
+
+def test_short_click_is_skipped():
+    rng = np.random.default_rng(2)
+    pcm = _to_pcm(rng.standard_normal(SR * 10), -70)
+    pcm[SR * 5:SR * 5 + SR // 10] = _to_pcm(rng.standard_normal(SR // 10), -15)  # 100 ms
+    result = detect_speech(pcm, SR)
+    assert not result.has_speech
+    assert result.speech_seconds < 0.2
+    assert result.regions  # 仍標出區間（含前後邊界），只是不足以送進 ASR
@@ -1,22 +1,35 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query
-from fastapi.responses import JSONResponse
-from typing import List, Dict, Any, Tuple
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import os
-import math
+import asyncio
+import functools
 import json
-import wave
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from io import BytesIO
-
-# 音訊處理（需 ffmpeg 或 avlib）：pip install pydub
-from pydub import AudioSegment
 
 # AI 模型相關 imports
 from kuwa.client import KuwaClient
 from qai_hub_models.models.whisper_large_v3_turbo.model import WhisperLargeV3Turbo
 from qai_hub_models.models._shared.hf_whisper.app import HfWhisperApp
 
+from .audio import PcmWindower, WavStitcher, decode_to_pcm16, pcm16_to_float32, stitch_wav_files, write_wav
+from .catalog import catalog
+from .events import EVENT_BATCH_SUMMARY, EVENT_FINALIZED, EVENT_OVERALL_SUMMARY, SSE_HEARTBEAT_SECONDS, event_bus
+from .inference import inference_executor
+from .jobs import Job, job_queue
+from .llm import LLM_PRIORITY_BACKGROUND, LLM_PRIORITY_LIVE, llm_pool
+from .schemas import BatchRecord, BatchStatus, SegmentRecord, SegmentStatus
+from .search import DOC_OVERALL, DOC_SEGMENT, DOC_SUMMARY, search_indexer
+from .semantic import semantic_index
+from .summarizer import summary_pipeline
+from .summary_cache import summary_cache
+from .summary_tree import SummaryNode, get_summary_tree
+from .transcript_archive import TRANSCRIPT_ARCHIVE, TranscriptArchive, write_archive
+from .transcript_store import TranscriptStore, cached_transcript_store, get_transcript_store
+from .vad import VadResult, detect_speech
+
 router = APIRouter()
 
 UPLOAD_DIR = Path("./uploads").resolve()
@@ -30,8 +43,10 @@ TARGET_CH = 1               # 單聲道
 TARGET_BITS = 16            # 16-bit PCM
 
 # ===== AI 模型參數 =====
-VOLUME_THRESHOLD = 3        # 音量閾值
 SUMMARY_BATCH_SIZE = 3      # 每3段做一次摘要
+WHISPER_MAX_REPEATS = 4     # 同一詞組連續重複幾次視為幻覺迴圈並提前停止解碼
+SUMMARY_BACKEND = os.environ.get("SUMMARY_BACKEND", "kuwa")  # 摘要 LLM：kuwa（HTTP 服務）或 local（行程內 TAIDE）
+KUWA_MODEL = ".bot/TAIDE LX 8B"  # Kuwa 上的摘要模型
 
 # ===== 檔名/資料夾 =====
 TRANSCRIPT_JSON = "transcript.json"  # 逐段清單（含 start/end/text）
@@ -40,30 +55,58 @@ FULL_WAV       = "base.wav"          # 伺服端規一化後的完整 WAV
 CHUNK_DIRNAME  = "chunks"            # 片段資料夾（001.wav, 002.wav, ...）
 STREAM_CHUNKS  = "stream_chunks"     # 串流上傳暫存的 20s 分段（001.wav, 002.wav, ...）
 
+# 定稿後的儲存格式：json（transcript.json + summary.json）或 archive（壓縮封存，JSON 於讀取時才轉出）
+TRANSCRIPT_FORMAT = os.environ.get("TRANSCRIPT_FORMAT", "json")
+
 # ===== 狀態標記 =====
 PROCESSING_TEXT = "處理中..."
 PROCESSING_SUMMARY = "處理中..."
 
 # ===== 全域 AI 模型實例 =====
 whisper_app = None
-kuwa_client = None
+llm_client = None       # KuwaClient 或 LocalTaideClient（介面相同）
+llm_model_name = KUWA_MODEL  # 摘要快取 key 的一部分：換模型就不會取到舊結果
 
 def init_ai_models():
     """初始化 AI 模型"""
-    global whisper_app, kuwa_client
+    global whisper_app, llm_client, llm_model_name
     try:
         print("正在載入 Whisper 模型...")
-        model = WhisperLargeV3Turbo.from_pretrained()
-        whisper_app = HfWhisperApp(model)
-        print("✅ Whisper 模型載入完成")
+        # 解碼長度依段落秒數與實測 token 速率調整（上限仍為模型的 200 tokens）
+        inference_executor.load(lambda: HfWhisperApp(
+            WhisperLargeV3Turbo.from_pretrained(),
+            adaptive_decode_len=True,
+            max_repeats=WHISPER_MAX_REPEATS,
+        ))
+        whisper_app = inference_executor.primary
+        print(f"✅ Whisper 模型載入完成（{inference_executor.num_replicas} 個副本）")
         
-        # 初始化 KuwaClient
-        kuwa_client = KuwaClient(
-            base_url="http://127.0.0.1",
-            model=".bot/TAIDE LX 8B",
-            auth_token=os.environ.get("KUWA_API_KEY")
-        )
-        print("✅ KuwaClient 初始化完成")
+        if SUMMARY_BACKEND == "local":
+            # 行程內的 Llama3 TAIDE：不需要 Kuwa 服務；單一模型一次只能跑一個請求
+            from .local_llm import LocalTaideClient
+            print("正在載入本機 TAIDE 摘要模型...")
+            llm_client = LocalTaideClient()
+            llm_model_name = llm_client.model_name
+            llm_pool.set_client(llm_client, concurrency=1)
+            print("✅ 本機 TAIDE 摘要模型載入完成")
+        else:
+            llm_client = KuwaClient(
+                base_url="http://127.0.0.1",
+                model=KUWA_MODEL,
+                auth_token=os.environ.get("KUWA_API_KEY")
+            )
+            llm_model_name = KUWA_MODEL
+            llm_pool.set_client(llm_client)
+            print(f"✅ KuwaClient 初始化完成（LLM 並行上限 {llm_pool.concurrency}）")
+        
+        # 語意搜尋的文字向量模型（選用：載入失敗只停用 /semantic_search）
+        try:
+            from .embeddings import NomicEmbedder
+            print("正在載入 nomic 文字向量模型...")
+            semantic_index.load(NomicEmbedder())
+            print("✅ 文字向量模型載入完成")
+        except Exception as e:
+            print(f"⚠️ 文字向量模型載入失敗，停用語意搜尋: {e}")
         
     except Exception as e:
         print(f"❌ AI 模型初始化失敗: {e}")
@@ -75,22 +118,23 @@ try:
 except Exception as e:
     print(f"警告：AI 模型初始化失敗，將使用模擬模式: {e}")
     whisper_app = None
-    kuwa_client = None
+    llm_client = None
+    llm_pool.set_client(None)
 
 
 # ===============================
 # 工具/輔助
 # ===============================
-def _canonicalize_bytes_to_wav16k_mono(contents: bytes, out_wav: Path, src_ext: str) -> Path:
-    """
-    將上傳 bytes（依副檔名推格式）直接轉成 16k/mono/16bit WAV，輸出到 out_wav。
-    不在磁碟上留下原始檔。
-    """
-    ext = (src_ext or "").lstrip(".").lower() or None
-    audio = AudioSegment.from_file(BytesIO(contents), format=ext)
-    audio = audio.set_frame_rate(TARGET_SR).set_channels(TARGET_CH).set_sample_width(TARGET_BITS // 8)
-    audio.export(out_wav.as_posix(), format="wav")
-    return out_wav
+def _decode_upload(contents: bytes, src_ext: str) -> np.ndarray:
+    """將上傳 bytes 解碼成 16k/mono/16bit 的 int16 陣列（只解碼一次）"""
+    return decode_to_pcm16(contents, src_ext, TARGET_SR, TARGET_CH)
+
+
+def _decode_upload_to_wav(contents: bytes, src_ext: str, out_wav: Path) -> np.ndarray:
+    """解碼上傳 bytes，同時把規一化結果寫成 out_wav，回傳 int16 陣列"""
+    pcm = _decode_upload(contents, src_ext)
+    write_wav(out_wav, pcm, TARGET_SR, TARGET_CH)
+    return pcm
 
 
 def _ensure_folder(base_name: str) -> Path:
@@ -107,78 +151,128 @@ def _index_to_times(i: int) -> Tuple[float, float]:
     return float(start), float(end)
 
 
-def _time_to_index(t: float, total_seconds: float) -> int:
-    """時間 t（秒）對應到第幾段（1-based）。"""
-    if t < 0: t = 0.0
-    step = CHUNK_SECONDS - OVERLAP_SECONDS
-    idx = int(t // step) + 1
-    # 上限保護（以最後一段 end 略估總長）
-    max_idx = max(1, math.ceil((max(0.0, total_seconds) - OVERLAP_SECONDS) / step))
-    return min(idx, max_idx)
+def _batch_id(i: int) -> int:
+    """第 i 段所屬的批次編號（1-based，每 SUMMARY_BATCH_SIZE 段一批）"""
+    return (i - 1) // SUMMARY_BATCH_SIZE + 1
 
 
-def check_audio_volume(wav_path: Path) -> float:
-    """檢查音量強度"""
-    try:
-        with wave.open(str(wav_path), 'rb') as wf:
-            frames = wf.readframes(wf.getnframes())
-            audio_data = np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32767.0
-            volume = np.linalg.norm(audio_data)
-            return float(volume)  # 明確轉換為 Python 原生 float
-    except Exception as e:
-        print(f"❌ 無法讀取音訊檔案 {wav_path}: {e}")
-        return 0.0
+def _batch_range(i: int, last_index: Optional[int] = None) -> Tuple[int, int]:
+    """第 i 段所屬批次的 [第一段, 最後一段]；已知總段數時最後一批會截短"""
+    first = (_batch_id(i) - 1) * SUMMARY_BATCH_SIZE + 1
+    last = first + SUMMARY_BATCH_SIZE - 1
+    if last_index is not None:
+        last = min(last, last_index)
+    return first, last
 
 
-def _init_json_files(folder: Path, total_estimated_segments: int = 0) -> Tuple[Path, Path]:
-    """初始化 JSON 檔案，預先創建帶有處理中狀態的結構"""
-    tr_path = folder / TRANSCRIPT_JSON
-    sm_path = folder / SUMMARY_JSON
-    
-    # 初始化 transcript.json
-    if not tr_path.exists():
-        tr_data = {
-            "base_name": folder.name,
-            "chunk_seconds": CHUNK_SECONDS,
-            "overlap_seconds": OVERLAP_SECONDS,
-            "segments": []
-        }
-        
+def _make_segment(idx: int, text: str, summary: str, status: SegmentStatus, volume: float = 0.0,
+                  speech_ratio: Optional[float] = None, last_index: Optional[int] = None) -> Dict[str, Any]:
+    start, end = _index_to_times(idx)
+    return SegmentRecord(
+        index=idx, start=start, end=end, text=text, summary=summary,
+        volume=volume, speech_ratio=speech_ratio, status=status,
+        batch_id=_batch_id(idx), batch_range=_batch_range(idx, last_index),
+    ).model_dump(mode="json")
+
+
+def _segment_status(seg: Dict[str, Any]) -> str:
+    """段落狀態；沒有 status 欄位的舊資料才由文字推斷"""
+    status = seg.get("status")
+    if status:
+        return status
+    text, summary = seg.get("text", ""), seg.get("summary", "")
+    if not text or text == PROCESSING_TEXT:
+        return SegmentStatus.PENDING.value
+    if text.startswith("轉錄失敗"):
+        return SegmentStatus.FAILED.value
+    if "處理中" in summary:
+        return SegmentStatus.TRANSCRIBED.value
+    return SegmentStatus.SUMMARIZED.value
+
+
+def _index_document(base_name: str, kind: str, idx: int, start: float, end: float, text: str):
+    """送進全文搜尋與語意搜尋索引（兩者都在背景寫入）"""
+    search_indexer.add(base_name, kind, idx, start, end, text)
+    semantic_index.add(base_name, kind, idx, start, end, text)
+
+
+def _index_segment(base_name: str, seg: Dict[str, Any]):
+    """轉錄成功的段落送進搜尋索引（處理中 / 無語音 / 失敗的段落不索引）"""
+    if _segment_status(seg) in (SegmentStatus.TRANSCRIBED.value, SegmentStatus.SUMMARIZED.value):
+        _index_document(base_name, DOC_SEGMENT, seg["index"], seg["start"], seg["end"], seg.get("text", ""))
+
+
+def _index_batch_summary(base_name: str, batch_segments: List[Dict[str, Any]], summary: str, status: BatchStatus):
+    """完成的批次摘要送進搜尋索引（時間範圍為整批段落）"""
+    if status == BatchStatus.DONE:
+        _index_document(base_name, DOC_SUMMARY, _batch_id(batch_segments[0]["index"]),
+                        batch_segments[0]["start"], batch_segments[-1]["end"], summary)
+
+
+def check_audio_volume(audio: np.ndarray) -> float:
+    """檢查音量強度（audio 為 [-1, 1) 的 float32 陣列）"""
+    volume = np.linalg.norm(audio)
+    return float(volume)  # 明確轉換為 Python 原生 float
+
+
+def _analyze_chunk(pcm: np.ndarray) -> Tuple[np.ndarray, float, VadResult]:
+    """VAD + 音量（在 CPU 執行緒池執行）：回傳只含語音區間的 float32 音訊、整段音量與 VAD 結果"""
+    audio = pcm16_to_float32(pcm)
+    vad = detect_speech(pcm, TARGET_SR)
+    return vad.trim(audio), check_audio_volume(audio), vad
+
+
+def _transcript_header(folder: Path) -> Dict[str, Any]:
+    return {
+        "base_name": folder.name,
+        "chunk_seconds": CHUNK_SECONDS,
+        "overlap_seconds": OVERLAP_SECONDS,
+    }
+
+
+async def _get_transcript_store(folder: Path, create: bool = True) -> TranscriptStore:
+    """取得會議的記憶體 transcript store（create=False 時不存在回傳 None）"""
+    return await get_transcript_store(folder, TRANSCRIPT_JSON, _transcript_header(folder), create=create)
+
+
+async def _init_transcript_store(folder: Path, total_estimated_segments: int = 0) -> TranscriptStore:
+    """初始化 transcript store，預先創建帶有處理中狀態的結構"""
+    store = await _get_transcript_store(folder)
+    # 重新轉錄：舊的搜尋文件與向量作廢
+    search_indexer.clear(folder.name)
+    semantic_index.clear(folder.name)
+
+    if not store.exists:
+        placeholders = []
         # 如果知道預估段數，可以預先創建佔位符
-        if total_estimated_segments > 0:
-            for i in range(1, total_estimated_segments + 1):
-                start, end = _index_to_times(i)
-                tr_data["segments"].append({
-                    "index": i,
-                    "start": start,
-                    "end": end,
-                    "text": PROCESSING_TEXT,
-                    "summary": PROCESSING_SUMMARY,  # transcript 中暫時保留 summary 欄位
-                    "volume": 0.0
-                })
-        
-        _write_json(tr_path, tr_data)
-    
+        for i in range(1, total_estimated_segments + 1):
+            placeholders.append(_make_segment(
+                i, PROCESSING_TEXT, PROCESSING_SUMMARY,  # transcript 中暫時保留 summary 欄位
+                SegmentStatus.PENDING, last_index=total_estimated_segments,
+            ))
+        store.init_segments(placeholders)
+
     # summary.json 將在 overall 摘要完成後才創建
-    return tr_path, sm_path
+    return store
 
 
-async def transcribe_with_whisper(chunk_path: Path, idx: int) -> Dict[str, Any]:
-    """使用真實的 Whisper 模型進行轉錄"""
+async def transcribe_with_whisper(pcm: np.ndarray, idx: int, last_index: Optional[int] = None) -> Dict[str, Any]:
+    """使用真實的 Whisper 模型進行轉錄（pcm 為 16k int16 陣列或其切片 view）"""
     start, end = _index_to_times(idx)
+    status = SegmentStatus.TRANSCRIBED
     
-    # 檢查音量
-    volume = check_audio_volume(chunk_path)
-    print(f"📶 第 {idx:03d} 段音量: {volume:.4f}")
+    # VAD + 音量（在 CPU 執行緒池中執行），靜音區間不送進 ASR 佇列
+    audio, volume, vad = await inference_executor.run_cpu(_analyze_chunk, pcm)
+    print(f"📶 第 {idx:03d} 段音量: {volume:.4f}，語音比例: {vad.speech_ratio:.0%}")
     
-    if volume < VOLUME_THRESHOLD:
-        print(f"🔇 第 {idx:03d} 段音量過低（<{VOLUME_THRESHOLD}），跳過轉錄")
+    if not vad.has_speech:
+        print(f"🔇 第 {idx:03d} 段幾乎沒有語音（{vad.speech_seconds:.1f}s），跳過轉錄")
         text = ""
     else:
         try:
             if whisper_app:
-                print(f"🎧 開始轉錄第 {idx:03d} 段: {chunk_path.name}")
-                text = whisper_app.transcribe(str(chunk_path))
+                print(f"🎧 開始轉錄第 {idx:03d} 段（語音 {len(audio) / TARGET_SR:.1f}s / {len(pcm) / TARGET_SR:.1f}s）")
+                text = await inference_executor.transcribe(audio, TARGET_SR)
                 print(f"第 {idx:03d} 段轉錄結果: {text}")
             else:
                 # 模擬模式
@@ -187,92 +281,113 @@ async def transcribe_with_whisper(chunk_path: Path, idx: int) -> Dict[str, Any]:
         except Exception as e:
             print(f"❌ 轉錄第 {idx:03d} 段失敗: {e}")
             text = f"轉錄失敗: {str(e)}"
+            status = SegmentStatus.FAILED
     
-    return {
-        "index": idx,
-        "start": start,
-        "end": end,
-        "text": text,
-        "summary": PROCESSING_SUMMARY,  # 摘要稍後生成
-        "volume": float(volume)
-    }
-
-
-async def generate_batch_summary(segments: List[Dict[str, Any]], batch_start_idx: int) -> str:
-    """為一個批次（3段或剩餘段落）生成摘要"""
-    if not kuwa_client:
-        return f"（模擬）第 {batch_start_idx} ~ {batch_start_idx + len(segments) - 1} 段摘要"
+    return _make_segment(
+        idx, text, PROCESSING_SUMMARY, status,  # 摘要稍後生成
+        volume=float(volume), speech_ratio=round(vad.speech_ratio, 4), last_index=last_index,
+    )
+
+
+async def _summarize(prompt: str, priority: int = LLM_PRIORITY_LIVE) -> str:
+    """經由 LLM 請求池生成摘要；相同模型 + prompt 的結果直接取用快取（失敗時拋出例外，不寫入快取）"""
+    cached = await summary_cache.get(llm_model_name, prompt)
+    if cached is not None:
+        return cached
+
+    message = [{"role": "user", "content": prompt}]
+    result = (await llm_pool.complete(message, priority=priority)).strip()
+    await summary_cache.put(llm_model_name, prompt, result)
+    return result
+
+
+async def generate_batch_summary(segments: List[Dict[str, Any]], batch_start_idx: int,
+                                 priority: int = LLM_PRIORITY_LIVE) -> Tuple[str, BatchStatus]:
+    """為一個批次（3段或剩餘段落）生成摘要，回傳 (摘要文字, 批次狀態)"""
+    batch_end_idx = batch_start_idx + len(segments) - 1
+    if not llm_client:
+        return f"（模擬）第 {batch_start_idx} ~ {batch_end_idx} 段摘要", BatchStatus.DONE
     
-    # 收集批次內的有效文字
+    # 收集批次內的有效文字（失敗或尚未轉錄的段落不列入）
     batch_texts = []
     for seg in segments:
         text = seg.get("text", "").strip()
-        if text and text != PROCESSING_TEXT and not text.startswith("轉錄失敗") and not text.startswith("（模擬）"):
+        if (text and not text.startswith("（模擬）") and
+                _segment_status(seg) in (SegmentStatus.TRANSCRIBED.value, SegmentStatus.SUMMARIZED.value)):
             batch_texts.append(text)
     
     if not batch_texts:
-        return f"第 {batch_start_idx} ~ {batch_start_idx + len(segments) - 1} 段摘要（無有效內容）"
+        return f"第 {batch_start_idx} ~ {batch_end_idx} 段摘要（無有效內容）", BatchStatus.DONE
     
     try:
         combined_text = "\n".join(batch_texts)
-        prompt = f"""請簡短摘要以下第 {batch_start_idx}-{batch_start_idx + len(segments) - 1} 段的內容（2-3句）：\n{combined_text}"""
-        
-        message = [{"role": "user", "content": prompt}]
+        prompt = f"""請簡短摘要以下第 {batch_start_idx}-{batch_end_idx} 段的內容（2-3句）：\n{combined_text}"""
         
-        summary_result = ""
-        print(f"📝 生成第 {batch_start_idx}-{batch_start_idx + len(segments) - 1} 段的批次摘要...")
-        async for chunk in kuwa_client.chat_complete(messages=message, streaming=True):
-            summary_result += chunk
+        print(f"📝 生成第 {batch_start_idx}-{batch_end_idx} 段的批次摘要...")
+        summary_result = await _summarize(prompt, priority)
             
-        return f"第 {batch_start_idx} ~ {batch_start_idx + len(segments) - 1} 段摘要: {summary_result.strip()}"
+        return f"第 {batch_start_idx} ~ {batch_end_idx} 段摘要: {summary_result}", BatchStatus.DONE
         
     except Exception as e:
         print(f"❌ 批次摘要生成失敗: {e}")
-        return f"第 {batch_start_idx} ~ {batch_start_idx + len(segments) - 1} 段摘要（生成失敗）"
+        return f"第 {batch_start_idx} ~ {batch_end_idx} 段摘要（生成失敗）", BatchStatus.FAILED
+
+
+def _batch_record(batch_segments: List[Dict[str, Any]], summary: str, status: BatchStatus) -> Dict[str, Any]:
+    return BatchRecord(
+        batch_id=_batch_id(batch_segments[0]["index"]),
+        start_index=batch_segments[0]["index"],
+        end_index=batch_segments[-1]["index"],
+        status=status,
+        summary=summary,
+    ).model_dump(mode="json")
 
 
-async def generate_overall_summary(all_segments: List[Dict[str, Any]], base_name: str) -> str:
-    """基於批次摘要代表段落生成整體摘要"""
-    if not kuwa_client:
+async def merge_summaries(nodes: List[SummaryNode], priority: int = LLM_PRIORITY_LIVE) -> str:
+    """摘要樹的合併：把相鄰的數個摘要整合成涵蓋整個範圍的一段摘要"""
+    start_idx, end_idx = nodes[0].start, nodes[-1].end
+    if not llm_client:
+        return f"（模擬）第 {start_idx} ~ {end_idx} 段合併摘要"
+
+    try:
+        combined_text = "\n".join(node.summary for node in nodes)
+        prompt = f"""請將以下第 {start_idx}-{end_idx} 段的分段摘要整合成一段精簡摘要（3-5句），保留關鍵決議與數字：\n{combined_text}"""
+
+        print(f"🌲 合併第 {start_idx}-{end_idx} 段的摘要（{len(nodes)} 個節點）...")
+        merged = await _summarize(prompt, priority)
+
+        return f"第 {start_idx} ~ {end_idx} 段摘要: {merged}"
+
+    except Exception as e:
+        print(f"❌ 摘要合併失敗: {e}")
+        # 合併失敗時保留原本的分段摘要，整體摘要仍可使用
+        return "\n".join(node.summary for node in nodes)
+
+
+async def generate_overall_summary(all_segments: List[Dict[str, Any]], base_name: str,
+                                   priority: int = LLM_PRIORITY_LIVE) -> str:
+    """基於摘要樹的頂層節點生成整體摘要（沒有摘要樹的舊資料則用批次摘要代表段落）"""
+    if not llm_client:
         return "（模擬）這是基於批次摘要生成的整體摘要。"
     
-    # 找出每個批次的最後一段（包含完整批次摘要的段落）
-    batch_summaries = []
-    processed_indices = set()
+    # 摘要樹已在批次完成時逐層合併：只需合併少數頂層節點
+    tree = get_summary_tree(_ensure_folder(base_name))
+    batch_summaries = [node.summary for node in tree.frontier()]
     
-    for seg in all_segments:
-        idx = seg.get("index")
-        summary = seg.get("summary", "")
-        
-        if (idx not in processed_indices and 
-            summary and 
-            summary != PROCESSING_SUMMARY and 
-            summary.startswith("index ") and 
-            "的摘要" in summary):
-            
-            # 解析摘要中的範圍，例如 "index 1 ~ 3 的摘要: ..."
-            try:
-                range_part = summary.split("的摘要")[0]  # "index 1 ~ 3"
-                if "~" in range_part:
-                    start_str, end_str = range_part.replace("index ", "").split(" ~ ")
-                    start_idx = int(start_str.strip())
-                    end_idx = int(end_str.strip())
-                    
-                    # 確保這是批次的最後一段
-                    if idx == end_idx:
-                        batch_summaries.append(summary)
-                        # 標記這個範圍的所有index為已處理
-                        for i in range(start_idx, end_idx + 1):
-                            processed_indices.add(i)
-            except:
-                continue
+    # 沒有摘要樹（舊資料）：改用批次表中已完成的批次摘要
+    if not batch_summaries:
+        store = await _get_transcript_store(_ensure_folder(base_name), create=False)
+        batch_summaries = [
+            b["summary"] for b in (store.batches() if store is not None else [])
+            if b.get("status") == BatchStatus.DONE.value and b.get("summary")
+        ]
     
     if not batch_summaries:
         # 回退方案：使用所有有效的轉錄文字
         all_text = []
         for seg in all_segments:
             text = seg.get("text", "").strip()
-            if text and text != PROCESSING_TEXT and not text.startswith("轉錄失敗"):
+            if text and _segment_status(seg) in (SegmentStatus.TRANSCRIBED.value, SegmentStatus.SUMMARIZED.value):
                 all_text.append(text)
         
         if not all_text:
@@ -297,14 +412,8 @@ async def generate_overall_summary(all_segments: List[Dict[str, Any]], base_name
 請根據以下內容生成整體摘要：
         """
         
-        message = [{"role": "user", "content": f"{prompt}\n{combined_text}"}]
-        
-        overall_summary = ""
-        print(f"📋 生成 {base_name} 的整體摘要（基於 {len(batch_summaries)} 個批次摘要）...")
-        async for chunk in kuwa_client.chat_complete(messages=message, streaming=True):
-            overall_summary += chunk
-            
-        return overall_summary.strip()
+        print(f"📋 生成 {base_name} 的整體摘要（基於 {len(batch_summaries)} 個摘要節點）...")
+        return await _summarize(f"{prompt}\n{combined_text}", priority)
         
     except Exception as e:
         print(f"❌ 整體摘要生成失敗: {e}")
@@ -319,51 +428,8 @@ def _read_json(path: Path) -> Any:
     return json.loads(path.read_text(encoding="utf-8"))
 
 
-def _update_segment_in_json(tr_path: Path, segment: Dict[str, Any]):
-    """更新單個段落到 transcript.json"""
-    if tr_path.exists():
-        tr_data = _read_json(tr_path)
-    else:
-        return
-    
-    segments = tr_data.get("segments", [])
-    idx = segment["index"]
-    
-    # 找到對應的段落並更新
-    for i, seg in enumerate(segments):
-        if seg.get("index") == idx:
-            segments[i] = segment
-            break
-    else:
-        # 如果沒找到，添加新段落
-        segments.append(segment)
-        segments.sort(key=lambda x: x.get("index", 0))
-    
-    tr_data["segments"] = segments
-    _write_json(tr_path, tr_data)
-
-
-def _update_batch_summary_in_json(tr_path: Path, batch_segments: List[Dict[str, Any]], batch_summary: str):
-    """更新整個批次的摘要到 transcript.json"""
-    if tr_path.exists():
-        tr_data = _read_json(tr_path)
-    else:
-        return
-    
-    segments = tr_data.get("segments", [])
-    
-    # 更新批次中所有段落的摘要
-    for batch_seg in batch_segments:
-        idx = batch_seg["index"]
-        for i, seg in enumerate(segments):
-            if seg.get("index") == idx:
-                segments[i]["summary"] = batch_summary  # 直接套用批次摘要
-    
-    tr_data["segments"] = segments
-    _write_json(tr_path, tr_data)
-
-
-def _create_summary_json(folder: Path, all_segments: List[Dict[str, Any]], overall_summary: str):
+def _create_summary_json(folder: Path, all_segments: List[Dict[str, Any]], overall_summary: str,
+                         batches: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
     """創建新格式的 summary.json，在 overall 摘要完成後執行"""
     sm_path = folder / SUMMARY_JSON
     
@@ -373,56 +439,83 @@ def _create_summary_json(folder: Path, all_segments: List[Dict[str, Any]], overa
         "chunk_seconds": CHUNK_SECONDS,
         "overlap_seconds": OVERLAP_SECONDS,
         "per_segment": [],
+        "batches": batches or [],
         "overall_summary": overall_summary
     }
     
-    # 為每個段落建立獨立的摘要記錄
+    # 每個段落的摘要即所屬批次的摘要（summary_ref 指向 batches）
     for seg in all_segments:
-        idx = seg.get("index")
-        summary = seg.get("summary", "")
-        
-        # 根據批次位置決定摘要內容
-        if "處理中" in summary:
-            # 如果還在處理中，保持處理中狀態
-            segment_summary = summary
-        elif summary.startswith("index ") and "的摘要" in summary:
-            # 如果是批次摘要，分析這個段落在批次中的位置
-            try:
-                range_part = summary.split("的摘要")[0]  # "index 1 ~ 3"
-                if "~" in range_part:
-                    start_str, end_str = range_part.replace("index ", "").split(" ~ ")
-                    start_idx = int(start_str.strip())
-                    end_idx = int(end_str.strip())
-                    
-                    if start_idx <= idx <= end_idx:
-                        segment_summary = summary
-                        # if idx == end_idx:
-                        #     # 批次的最後一段，顯示完整摘要
-                        #     segment_summary = summary
-                        # else:
-                        #     # 批次中的其他段落，顯示處理中狀態
-                        #     position = idx - start_idx + 1
-                        #     total_in_batch = end_idx - start_idx + 1
-                        #     segment_summary = f"處理中({position}/{total_in_batch})"
-                    else:
-                        segment_summary = summary
-                else:
-                    segment_summary = summary
-            except:
-                segment_summary = summary
-        else:
-            segment_summary = summary
-        
         sm_data["per_segment"].append({
-            "index": idx,
-            "summary": segment_summary
+            "index": seg.get("index"),
+            "batch_id": seg.get("batch_id"),
+            "summary_ref": seg.get("summary_ref"),
+            "summary": seg.get("summary", "")
         })
     
     # 按 index 排序
     sm_data["per_segment"].sort(key=lambda x: x.get("index", 0))
     
     _write_json(sm_path, sm_data)
+    event_bus.publish(folder.name, EVENT_OVERALL_SUMMARY, {"overall_summary": overall_summary})
     print(f"✅ 新格式 summary.json 已建立，包含 {len(sm_data['per_segment'])} 個段落摘要")
+    return sm_data
+
+
+def _read_summary(folder: Path) -> Optional[Dict[str, Any]]:
+    """summary.json 的內容；已封存的會議由封存檔轉出"""
+    sm_path = folder / SUMMARY_JSON
+    if sm_path.exists():
+        return _read_json(sm_path)
+    archive = TranscriptArchive.open(folder)
+    if archive is None:
+        return None
+    with archive:
+        return archive.to_summary_dict()
+
+
+def _summary_exists(folder: Path) -> bool:
+    return (folder / SUMMARY_JSON).exists() or (folder / TRANSCRIPT_ARCHIVE).exists()
+
+
+async def _archive_transcript(folder: Path, store: TranscriptStore, summary: Dict[str, Any]):
+    """
+    TRANSCRIPT_FORMAT=archive 時，在 transcript 落盤後寫入壓縮封存檔並移除兩份 JSON。
+    封存期間若又有修改（store 尚未落盤、summary.json 被改寫），保留較新的 JSON（讀取時 JSON 優先）。
+    """
+    if TRANSCRIPT_FORMAT != "archive":
+        return
+    sm_path = folder / SUMMARY_JSON
+    sm_mtime = sm_path.stat().st_mtime_ns if sm_path.exists() else None
+    # 在 event loop 取淺複本（段落的欄位只會被整個替換），壓縮與寫檔交給執行緒
+    segments = [dict(seg) for seg in store.segments()]
+    try:
+        await inference_executor.run_cpu(write_archive, folder / TRANSCRIPT_ARCHIVE, dict(store.header),
+                                         segments, store.batches(), summary)
+    except Exception as e:
+        print(f"⚠️ {folder.name}: 寫入封存檔失敗（保留 JSON）: {e}")
+        return
+    if store.flushed:
+        store.path.unlink(missing_ok=True)
+    if sm_mtime is not None and sm_path.exists() and sm_path.stat().st_mtime_ns == sm_mtime:
+        sm_path.unlink()
+    print(f"🗜️ {folder.name}: 已封存 {len(segments)} 段（{(folder / TRANSCRIPT_ARCHIVE).stat().st_size} bytes）")
+
+
+async def _catalog_meeting(folder: Path, store: TranscriptStore, overall_summary: str):
+    """把完成的轉錄結果寫入會議目錄（/records）與搜尋索引；目錄失敗不影響轉錄結果"""
+    base_name = folder.name
+    segments = store.segments()
+    _index_document(base_name, DOC_OVERALL, 0, 0.0,
+                    max((float(s.get("end", 0.0)) for s in segments), default=0.0), overall_summary)
+    try:
+        await catalog.index_meeting(
+            base_name, segments, store.batches(), overall_summary,
+            file_path=f"/uploads/{base_name}/{FULL_WAV}",
+            summary_url=f"/uploads/{base_name}/{SUMMARY_JSON}",
+            transcript_url=f"/uploads/{base_name}/{TRANSCRIPT_JSON}",
+        )
+    except Exception as e:
+        print(f"⚠️ {base_name}: 寫入會議目錄失敗: {e}")
 
 
 # ===== 串流模式輔助 =====
@@ -435,149 +528,189 @@ def _ensure_stream_dir(base_name: str) -> Path:
 
 def _stitch_stream_chunks_to_base(base_name: str) -> Path:
     """
-    將 /uploads/<base>/stream_chunks/ 內的 001.wav,002.wav... 依序串接成 base.wav，
-    並規一化為 16k/mono/16bit，最後輸出為 base.wav。
+    完成串流的 base.wav（已去除 2 秒重疊）。
+    串流期間每段都已追加到 base.wav 並更新標頭，這裡只需收尾；
+    服務重啟過則依進度檔接續，從 stream_chunks/ 補上尚未寫入的分段；都沒有時才逐檔重建。
     """
     folder = _ensure_folder(base_name)
+    state = stream_states.get(base_name)
+    stitcher = state["stitcher"] if state is not None else None
+    if state is not None:
+        state["stitcher"] = None
+    if stitcher is None:
+        stitcher = WavStitcher.resume(folder / FULL_WAV)
+
     chunk_dir = folder / STREAM_CHUNKS
-    if not chunk_dir.exists():
+    files = sorted((int(p.stem), p) for p in chunk_dir.glob("*.wav") if p.stem.isdigit()) if chunk_dir.exists() else []
+    if not files:
+        if stitcher is not None:
+            return stitcher.close()
         raise HTTPException(status_code=400, detail="No chunks uploaded")
+    # 已寫入的分段會被略過，只讀取尚未追加的檔案
 
-    files = sorted(chunk_dir.glob("*.wav"))
-    if not files:
-        raise HTTPException(status_code=400, detail="No chunk files found")
+    return stitch_wav_files(files, folder / FULL_WAV, TARGET_SR, _step_samples(), OVERLAP_SECONDS * TARGET_SR,
+                            stitcher=stitcher)
 
-    merged = AudioSegment.silent(duration=0)
-    for p in files:
-        merged += AudioSegment.from_wav(p.as_posix())
 
-    # 規一化輸出 base.wav
+def _step_samples() -> int:
+    return (CHUNK_SECONDS - OVERLAP_SECONDS) * TARGET_SR
+
+
+def _append_stream_audio(folder: Path, state: Dict[str, Any], index: int, pcm: np.ndarray):
+    """
+    把分段的非重疊部分追加到 base.wav，錄音中即可播放。
+    在 _stream_audio_executor（單一執行緒）執行：同一場會議的分段依到達順序寫入。
+    """
     full_wav = folder / FULL_WAV
-    merged = merged.set_frame_rate(TARGET_SR).set_channels(TARGET_CH).set_sample_width(TARGET_BITS // 8)
-    merged.export(full_wav.as_posix(), format="wav")
-    return full_wav
+    if state["stitcher"] is None:
+        if index == 1:
+            # 新的錄音
+            state["stitcher"] = WavStitcher(full_wav, TARGET_SR, _step_samples(), OVERLAP_SECONDS * TARGET_SR)
+        else:
+            # 服務重啟後的第一段：依進度檔接續
+            state["stitcher"] = WavStitcher.resume(full_wav)
+    if state["stitcher"] is not None:
+        # 重送的分段（包括第 1 段）已寫入過，append 會略過
+        state["stitcher"].append(index, pcm)
 
 
 # ===============================
 # 串流模式的全域狀態管理
 # ===============================
-stream_states = {}  # base_name -> {"pending_segments": [], "processed_count": 0}
+stream_states = {}  # base_name -> {"pending_segments": [], "processed_count": 0, "stitcher": ..., "live": ...}
+# base.wav 的追加與收尾（單一執行緒：寫入順序與分段到達順序一致，不阻塞 event loop）
+_stream_audio_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-audio")
 
 def _get_stream_state(base_name: str) -> Dict[str, Any]:
     if base_name not in stream_states:
         stream_states[base_name] = {
             "pending_segments": [],
-            "processed_count": 0
+            "processed_count": 0,
+            "stitcher": None,  # 逐段追加到 base.wav 的 WavStitcher
+            "live": False,     # 已收到分段（之後的第 1 段視為重送，不重新開始）
+            "ingested": set(),  # 已轉錄過的段落編號（重送時只更新轉錄，不再排進批次）
         }
     return stream_states[base_name]
 
 
-@router.post("/transcribe")
-async def transcribe(file: UploadFile = File(...)):
-    contents = await file.read()
-    if not contents:
-        raise HTTPException(status_code=400, detail="Empty file uploaded")
-
-    orig_name = file.filename
-    base_name = os.path.splitext(orig_name)[0]
+async def _run_transcribe_job(job: Job, contents: bytes, orig_name: str) -> Dict[str, Any]:
+    """背景工作：完整檔案的切片、轉錄、批次摘要與整體摘要"""
+    base_name = job.base_name
     folder = _ensure_folder(base_name)
 
-    # 1) 直接由 bytes 生成規一化完整 WAV（不存原始檔）
+    # 1) 直接由 bytes 解碼成單一 int16 緩衝區並寫出 base.wav（不存原始檔），阻塞步驟丟到 executor
+    job.stage = "decoding"
     full_wav = folder / FULL_WAV
-    _canonicalize_bytes_to_wav16k_mono(contents, full_wav, os.path.splitext(orig_name)[1])
+    pcm = await inference_executor.run_cpu(
+        _decode_upload_to_wav, contents, os.path.splitext(orig_name)[1], full_wav
+    )
+    del contents
+    total_samples = len(pcm)
+
+    # 2) 計算段數（與下方切片規則一致）並初始化 transcript store
+    step_samples = (CHUNK_SECONDS - OVERLAP_SECONDS) * TARGET_SR
+    chunk_samples = CHUNK_SECONDS * TARGET_SR
+    starts = []
+    for start_sample in range(0, max(total_samples, 1), step_samples):
+        if start_sample >= total_samples:
+            break
+        starts.append(start_sample)
+        if start_sample + chunk_samples >= total_samples:
+            break
+    total_windows = len(starts)
+    job.total_segments = total_windows
 
-    # 2) 計算預估段數並初始化 JSON 檔案（只初始化 transcript.json）
-    audio = AudioSegment.from_wav(full_wav.as_posix())
-    total_ms = len(audio)
-    step_ms = (CHUNK_SECONDS - OVERLAP_SECONDS) * 1000
-    estimated_segments = max(1, math.ceil(total_ms / step_ms))
-    
-    tr_path, sm_path = _init_json_files(folder, estimated_segments)
+    store = await _init_transcript_store(folder, total_windows)
+    get_summary_tree(folder).reset()
 
-    # 3) 創建臨時切片資料夾進行轉錄
-    temp_chunks_dir = folder / "temp_chunks"
-    temp_chunks_dir.mkdir(exist_ok=True)
-    
-    # 清空舊的臨時檔案
-    for p in temp_chunks_dir.glob("*.wav"):
-        try:
-            p.unlink()
-        except:
-            pass
+    # 3) 以切片 view 轉錄（不輸出臨時 WAV），每3段送出一次批次摘要
+    job.stage = "transcribing"
 
-    # 4) 實際切片並轉錄，每3段做一次摘要
-    chunk_ms = CHUNK_SECONDS * 1000
-    segments = []
+    def _start_group(first_index: int) -> asyncio.Future:
+        # 一次送出一組段落，讓推論 executor 能湊成同一批跑 encoder
+        group = starts[first_index - 1:first_index - 1 + group_size]
+        return asyncio.ensure_future(asyncio.gather(*(
+            transcribe_with_whisper(pcm[s0:s0 + chunk_samples], first_index + k, last_index=total_windows)
+            for k, s0 in enumerate(group)
+        )))
+
+    group_size = inference_executor.max_batch
     pending_for_summary = []
-    index = 1
-    
-    for start_ms in range(0, max(total_ms, 1), step_ms):
-        if start_ms >= total_ms:
-            break
-            
-        end_ms = start_ms + chunk_ms
-        chunk = audio[start_ms:end_ms]
-        chunk_path = temp_chunks_dir / f"{index:03d}.wav"
-        chunk.export(chunk_path.as_posix(), format="wav")
+    next_group = _start_group(1)
 
-        # 轉錄當前段落
-        seg = await transcribe_with_whisper(chunk_path, index)
+    for group_first in range(1, total_windows + 1, group_size):
+        group_segments = await next_group
+        # 寫入本組結果的同時，下一組已在背景轉錄
+        if group_first + group_size <= total_windows:
+            next_group = _start_group(group_first + group_size)
 
-        # 設定明確的「處理中(位置/批次大小)」狀態，避免被通用 PROCESSING_SUMMARY 覆寫
-        position_in_batch = ((index - 1) % SUMMARY_BATCH_SIZE) + 1
-        seg["summary"] = f"處理中({position_in_batch}/{SUMMARY_BATCH_SIZE})"
+        for seg in group_segments:
+            index = seg["index"]
 
-        segments.append(seg)
-        pending_for_summary.append(seg)
+            # 設定明確的「處理中(位置/批次大小)」狀態，避免被通用 PROCESSING_SUMMARY 覆寫
+            position_in_batch = ((index - 1) % SUMMARY_BATCH_SIZE) + 1
+            seg["summary"] = f"處理中({position_in_batch}/{SUMMARY_BATCH_SIZE})"
 
-        # 立即更新到 transcript.json
-        _update_segment_in_json(tr_path, seg)
-        print(f"✅ 第 {index:03d} 段轉錄完成並已寫入（summary: {seg['summary']}）")
-        
-        # 每3段或最後一批，生成批次摘要
-        if len(pending_for_summary) >= SUMMARY_BATCH_SIZE or (start_ms + chunk_ms >= total_ms):
-            batch_start_idx = pending_for_summary[0]["index"]
-            batch_end_idx = pending_for_summary[-1]["index"]
-            
-            # 生成批次摘要
-            batch_summary_text = await generate_batch_summary(pending_for_summary, batch_start_idx)
-            
-            # 更新批次中所有段落的摘要
-            _update_batch_summary_in_json(tr_path, pending_for_summary, batch_summary_text)
-            print(f"✅ 第 {batch_start_idx}-{batch_end_idx} 段批次摘要完成並已寫入")
-            
-            # 清空待摘要列表
-            pending_for_summary = []
-        
-        index += 1
-        
-        if start_ms + chunk_ms >= total_ms:
-            break
+            pending_for_summary.append(seg)
+
+            # 立即更新到 transcript store（背景落盤）
+            store.upsert(seg)
+            _index_segment(base_name, seg)
+            job.completed_transcripts += 1
+            print(f"✅ 第 {index:03d} 段轉錄完成並已寫入（summary: {seg['summary']}）")
+
+            # 每3段或最後一批，送進摘要管線（轉錄不等待 LLM）
+            if len(pending_for_summary) >= SUMMARY_BATCH_SIZE or index == total_windows:
+                _submit_batch_summary(base_name, store, pending_for_summary, job)
+                pending_for_summary = []
+
+    # 等待所有批次摘要完成
+    await summary_pipeline.drain(base_name)
     
-    # 5) 生成整體摘要
-    # ⚠️ 重點：重新讀取 transcript.json 取得最新的段落資料（含批次摘要）
-    tr_data = _read_json(tr_path)
-    segments = tr_data.get("segments", [])
+    # 4) 生成整體摘要
+    # ⚠️ 重點：由 store 取得最新的段落資料（含批次摘要）
+    job.stage = "summarizing"
+    segments = store.segments()
+    job.total_segments = len(segments)
 
     overall_summary = await generate_overall_summary(segments, base_name)
 
-    # 6) 建立新格式的 summary.json（在 overall 摘要完成後）
-    _create_summary_json(folder, segments, overall_summary)
+    # 5) 建立新格式的 summary.json（在 overall 摘要完成後），並確保 transcript 落盤
+    sm_data = _create_summary_json(folder, segments, overall_summary, store.batches())
+    await store.flush()
+    await _archive_transcript(folder, store, sm_data)
+    await _catalog_meeting(folder, store, overall_summary)
+
+    print(f"🎉 完整轉錄完成，共處理 {len(segments)} 個片段")
+    return {"total_segments": len(segments)}
+
+
+@router.post("/transcribe", status_code=202)
+async def transcribe(file: UploadFile = File(...)):
+    """上傳完整音檔：立即回傳 job id（202），轉錄與摘要在背景工作中進行。"""
+    contents = await file.read()
+    if not contents:
+        raise HTTPException(status_code=400, detail="Empty file uploaded")
+
+    orig_name = file.filename
+    base_name = os.path.splitext(orig_name)[0]
+
+    async def runner(job: Job) -> Dict[str, Any]:
+        return await _run_transcribe_job(job, contents, orig_name)
 
-    # 7) 清理臨時檔案
     try:
-        import shutil
-        shutil.rmtree(temp_chunks_dir, ignore_errors=True)
-    except Exception:
-        pass
+        job = job_queue.submit(base_name, runner)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Transcription queue is full, please retry later")
 
-    print(f"🎉 完整轉錄完成，共處理 {len(segments)} 個片段")
+    print(f"📥 已排入轉錄工作 {job.job_id}（{base_name}），佇列中 {job_queue.pending_count()} 個")
 
-    return JSONResponse({
+    return JSONResponse(status_code=202, content={
         "filename": f"{base_name}.wav",
         "base_name": base_name,
-        "status": "ok",
-        "total_segments": len(segments),
+        "status": job.status,
+        "job_id": job.job_id,
+        "job_url": f"/jobs/{job.job_id}",
         "paths": {
             "audio_url":      f"/uploads/{base_name}/{FULL_WAV}",
             "transcript_url": f"/uploads/{base_name}/{TRANSCRIPT_JSON}",
@@ -586,64 +719,99 @@ async def transcribe(file: UploadFile = File(...)):
     })
 
 
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """查詢背景轉錄工作的狀態與進度"""
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
 # ===============================
 # 串流式：每段立即轉錄，每3段做一次摘要
 # ===============================
 @router.post("/ingest_chunk")
 async def ingest_chunk(base_name: str = Query(...), index: int = Query(...), file: UploadFile = File(...)):
-    folder = _ensure_folder(base_name)
     sdir = _ensure_stream_dir(base_name)
     contents = await file.read()
     out_wav = sdir / f"{index:03d}.wav"
-    _canonicalize_bytes_to_wav16k_mono(contents, out_wav, os.path.splitext(file.filename)[1])
+    # 解碼一次：同時保存規一化分段（供 finalize 串接）並取得 int16 陣列
+    pcm = await inference_executor.run_cpu(
+        _decode_upload_to_wav, contents, os.path.splitext(file.filename)[1], out_wav
+    )
+    return await _ingest_segment(base_name, index, pcm)
 
-    # 初始化 JSON 檔案（如果是第一次，只初始化 transcript.json）
-    if index == 1:
-        _init_json_files(folder)
 
-    # 取得串流狀態
+async def _ingest_segment(base_name: str, index: int, pcm: np.ndarray) -> Dict[str, Any]:
+    """
+    串流的單段處理（HTTP 與 WebSocket 共用）：轉錄 -> 寫入 store -> 滿一批時送進摘要管線。
+    只等待 ASR；批次摘要在背景完成後寫回 store（並經 event bus 推送）。
+    """
+    folder = _ensure_folder(base_name)
+
+    # 取得串流狀態，並在背景執行緒把音訊接到 base.wav（在任何 await 之前送出，保持到達順序）
     state = _get_stream_state(base_name)
+    restart = index == 1 and not state["live"]
+    state["live"] = True
+    audio_written = asyncio.get_running_loop().run_in_executor(
+        _stream_audio_executor, _append_stream_audio, folder, state, index, pcm)
+
+    # 初始化 transcript store 與摘要樹（新的錄音才做；進行中的錄音重送第 1 段視為重試）
+    if restart:
+        store = await _init_transcript_store(folder)
+        get_summary_tree(folder).reset()
+    else:
+        store = await _get_transcript_store(folder)
+    await audio_written
 
     # 轉錄當前段落
-    seg = await transcribe_with_whisper(out_wav, index)
+    seg = await transcribe_with_whisper(pcm, index)
 
     # 設定「處理中(位置/批次大小)」標記（避免被通用字串覆蓋）
     position_in_batch = ((index - 1) % SUMMARY_BATCH_SIZE) + 1
     seg["summary"] = f"處理中({position_in_batch}/{SUMMARY_BATCH_SIZE})"
 
-    state["pending_segments"].append(seg)
-    state["processed_count"] += 1
+    if index not in state["ingested"]:
+        state["ingested"].add(index)
+        state["pending_segments"].append(seg)
+        state["processed_count"] += 1
 
-    # 檢查是否為批次的最後一段（每3段或最後一批）
-    tr_path = folder / TRANSCRIPT_JSON
-    
+    # 立即寫入轉錄結果（摘要保持處理中狀態）
+    store.upsert(seg)
+    _index_segment(base_name, seg)
+    print(f"✅ 串流第 {index:03d} 段轉錄完成並已寫入（等待批次摘要）")
+
+    # 批次滿了：交給摘要管線，不在這個請求中等待 LLM
     if len(state["pending_segments"]) >= SUMMARY_BATCH_SIZE:
-        # 批次滿了，處理摘要
         batch_segments = state["pending_segments"][:SUMMARY_BATCH_SIZE]
         state["pending_segments"] = state["pending_segments"][SUMMARY_BATCH_SIZE:]
+        _submit_batch_summary(base_name, store, batch_segments)
 
-        batch_start_idx = batch_segments[0]["index"]
-        batch_end_idx = batch_segments[-1]["index"]
-
-        # 生成批次摘要
-        batch_summary_text = await generate_batch_summary(batch_segments, batch_start_idx)
+    return seg
 
-        # 更新批次摘要到所有段落
-        for batch_seg in batch_segments:
-            batch_seg["summary"] = batch_summary_text
 
-        # ***重點修正：批次完成後，才將轉錄和摘要一起寫入 JSON***
-        for batch_seg in batch_segments:
-            _update_segment_in_json(tr_path, batch_seg)
-        
-        print(f"✅ 串流第 {batch_start_idx}-{batch_end_idx} 段批次完成（轉錄+摘要一起寫入）")
-    
-    else:
-        # ***批次未滿，僅寫入轉錄結果（摘要保持處理中狀態）***
-        _update_segment_in_json(tr_path, seg)
-        print(f"✅ 串流第 {index:03d} 段轉錄完成並已寫入（等待批次摘要）")
+def _submit_batch_summary(base_name: str, store: TranscriptStore, batch_segments: List[Dict[str, Any]],
+                          job: Optional[Job] = None):
+    """把一批段落送進會議的摘要佇列；完成後更新 store（與工作進度）"""
+    batch_segments = [dict(seg) for seg in batch_segments]
+    batch_start_idx = batch_segments[0]["index"]
+    batch_end_idx = batch_segments[-1]["index"]
+
+    async def work():
+        batch_summary_text, batch_status = await generate_batch_summary(batch_segments, batch_start_idx)
+        store.update_summary([seg["index"] for seg in batch_segments], batch_summary_text,
+                             _batch_record(batch_segments, batch_summary_text, batch_status))
+        _index_batch_summary(base_name, batch_segments, batch_summary_text, batch_status)
+        if job is not None:
+            job.completed_summaries += len(batch_segments)
+        print(f"✅ 第 {batch_start_idx}-{batch_end_idx} 段批次摘要完成並已寫入")
+        # 往摘要樹加入葉節點，湊滿時向上合併（finalize 時只剩少數頂層節點）
+        await get_summary_tree(store.folder).add_leaf(
+            batch_start_idx, batch_end_idx, batch_summary_text, merge_summaries
+        )
 
-    return seg
+    summary_pipeline.submit(base_name, work)
 
 
 # ===============================
@@ -657,50 +825,44 @@ async def finalize_stream(base_name: str):
     2. 串接音訊檔案
     3. 生成最終整體摘要
     """
+    return JSONResponse(await _finalize_stream(base_name))
+
+
+async def _finalize_stream(base_name: str) -> Dict[str, Any]:
+    """finalize 的實作（HTTP 與 WebSocket 共用）"""
     folder = _ensure_folder(base_name)
     state = _get_stream_state(base_name)
+    store = await _get_transcript_store(folder, create=False)
 
-    # 1) 處理剩餘的未滿3段的內容
+    # 1) 剩餘未滿3段的內容也送進摘要管線，並等待所有批次摘要完成
     if state["pending_segments"]:
-        batch_start_idx = state["pending_segments"][0]["index"]
-        batch_end_idx = state["pending_segments"][-1]["index"]
-        
-        # 生成最後一批的摘要
-        batch_summary_text = await generate_batch_summary(state["pending_segments"], batch_start_idx)
-        
-        # ***重點修正：更新摘要到段落物件中，然後一起寫入 JSON***
-        for pending_seg in state["pending_segments"]:
-            pending_seg["summary"] = batch_summary_text
-        
-        # 將轉錄和摘要一起寫入 JSON
-        tr_path = folder / TRANSCRIPT_JSON
-        for pending_seg in state["pending_segments"]:
-            _update_segment_in_json(tr_path, pending_seg)
-            
-        print(f"✅ 最終批次第 {batch_start_idx}-{batch_end_idx} 段完成（轉錄+摘要一起寫入，共 {len(state['pending_segments'])} 段）")
-        
-        # 清空待處理列表
+        if store is None:
+            store = await _init_transcript_store(folder)
+        print(f"⏳ 最終批次第 {state['pending_segments'][0]['index']}-{state['pending_segments'][-1]['index']} 段送出摘要")
+        _submit_batch_summary(base_name, store, state["pending_segments"])
         state["pending_segments"] = []
+    await summary_pipeline.drain(base_name)
 
     # 2) 串接音訊檔案
     try:
-        full_wav = _stitch_stream_chunks_to_base(base_name)
+        full_wav = await asyncio.get_running_loop().run_in_executor(
+            _stream_audio_executor, _stitch_stream_chunks_to_base, base_name)
         print(f"✅ 已完成音訊串接：{full_wav}")
     except Exception as e:
         print(f"⚠️ 音訊串接失敗: {e}")
 
     # 3) 讀取所有轉錄結果，生成最終整體摘要
-    tr_path = folder / TRANSCRIPT_JSON
-    
-    if tr_path.exists():
-        tr_data = _read_json(tr_path)
-        segments = tr_data.get("segments", [])
+    if store is not None:
+        segments = store.segments()
         
         # 生成最終整體摘要
         overall_summary = await generate_overall_summary(segments, base_name)
         
         # 4) 建立新格式的 summary.json（在 overall 摘要完成後）
-        _create_summary_json(folder, segments, overall_summary)
+        sm_data = _create_summary_json(folder, segments, overall_summary, store.batches())
+        await store.flush()
+        await _archive_transcript(folder, store, sm_data)
+        await _catalog_meeting(folder, store, overall_summary)
         
         print(f"✅ 最終整體摘要已生成並寫入新格式 summary.json")
 
@@ -718,7 +880,7 @@ async def finalize_stream(base_name: str):
 
     print(f"🎉 串流轉錄完成，共處理 {state['processed_count']} 個片段")
 
-    return JSONResponse({
+    result = {
         "filename": f"{base_name}.wav",
         "base_name": base_name,
         "status": "finalized",
@@ -728,29 +890,164 @@ async def finalize_stream(base_name: str):
             "transcript_url": f"/uploads/{base_name}/{TRANSCRIPT_JSON}",
             "summary_url":    f"/uploads/{base_name}/{SUMMARY_JSON}",
         }
-    })
+    }
+    event_bus.publish(base_name, EVENT_FINALIZED, result)
+    return result
+
+
+# ===============================
+# 串流式（WebSocket）：直接接收 16k/mono/int16 PCM，由伺服端切 20s/2s 重疊窗
+# ===============================
+@router.websocket("/ws/ingest")
+async def ingest_stream(websocket: WebSocket, base_name: str = Query(...), sample_rate: int = Query(TARGET_SR)):
+    """
+    即時串流上傳，不需在用戶端組 WAV、也不經過 multipart 與 ffmpeg 解碼。
+
+    用戶端 -> 伺服端：
+    - binary：little-endian int16 PCM（16kHz 單聲道），大小不限、可任意切
+    - text：{"type": "end"} 表示錄音結束，伺服端處理完剩餘音訊後執行 finalize
+
+    伺服端 -> 用戶端（JSON）：
+    - {"type": "ready", ...}
+    - {"type": "segment", "segment": {...}}：每段轉錄完成
+    - {"type": "batch_summary", "indices", "summary"}：批次摘要完成（背景產生，可能晚於後續段落）
+    - {"type": "finalized", ...}：與 /finalize_stream 的回應相同
+    - {"type": "error", "detail": ...}
+    """
+    await websocket.accept()
+    if sample_rate != TARGET_SR:
+        await websocket.send_json({"type": "error", "detail": f"sample_rate must be {TARGET_SR}"})
+        await websocket.close(code=1003)
+        return
+
+    sdir = _ensure_stream_dir(base_name)
+    windower = PcmWindower(CHUNK_SECONDS * TARGET_SR, (CHUNK_SECONDS - OVERLAP_SECONDS) * TARGET_SR)
+    windows: asyncio.Queue = asyncio.Queue()
+    connected = True
+
+    async def send(message: Dict[str, Any]):
+        nonlocal connected
+        if not connected:
+            return
+        try:
+            await websocket.send_json(message)
+        except Exception:
+            connected = False
+
+    async def process_windows():
+        # 依序處理（段落順序與批次摘要都依 index 進行），不阻塞接收迴圈
+        while True:
+            item = await windows.get()
+            if item is None:
+                return
+            index, pcm = item
+            try:
+                await inference_executor.run_cpu(write_wav, sdir / f"{index:03d}.wav", pcm, TARGET_SR)
+                seg = await _ingest_segment(base_name, index, pcm)
+                await send({"type": "segment", "segment": seg})
+            except Exception as e:
+                print(f"❌ WebSocket 串流第 {index:03d} 段處理失敗: {e}")
+                await send({"type": "error", "index": index, "detail": str(e)})
+
+    def enqueue(items: List[Tuple[int, np.ndarray]]):
+        for item in items:
+            windows.put_nowait(item)
+
+    # 批次摘要由摘要管線在背景完成，透過 event bus 轉送到這條連線
+    events, _ = event_bus.subscribe(base_name)
+
+    async def forward_summaries():
+        while True:
+            event = await events.get()
+            if event is None:
+                return
+            if event.type == EVENT_BATCH_SUMMARY:
+                await send({"type": EVENT_BATCH_SUMMARY, **json.loads(event.payload)})
+
+    processor = asyncio.create_task(process_windows())
+    forwarder = asyncio.create_task(forward_summaries())
+    await send({"type": "ready", "base_name": base_name, "sample_rate": TARGET_SR,
+                "audio_url": f"/uploads/{base_name}/{FULL_WAV}",  # 錄音中即隨每段成長，可邊錄邊播
+                "chunk_seconds": CHUNK_SECONDS, "overlap_seconds": OVERLAP_SECONDS})
+
+    ended = False
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                enqueue(windower.feed(message["bytes"]))
+            elif message.get("text") is not None:
+                try:
+                    command = json.loads(message["text"]).get("type")
+                except (ValueError, AttributeError):
+                    command = None
+                if command == "end":
+                    ended = True
+                    break
+                await send({"type": "error", "detail": "unknown message"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # 斷線時也把剩餘音訊轉錄完，避免遺失（之後可再呼叫 /finalize_stream）
+        enqueue(windower.flush())
+        windows.put_nowait(None)
+        await processor
+
+    try:
+        if ended:
+            try:
+                result = await _finalize_stream(base_name)
+            except HTTPException as e:
+                await send({"type": "error", "detail": e.detail})
+            else:
+                # 先讓 forwarder 送完最後的批次摘要，再送 finalized
+                event_bus.unsubscribe(base_name, events)
+                try:
+                    events.put_nowait(None)
+                    await forwarder
+                except asyncio.QueueFull:
+                    pass
+                await send({"type": "finalized", **result})
+    finally:
+        event_bus.unsubscribe(base_name, events)
+        forwarder.cancel()
+    if ended and connected:
+        await websocket.close()
 
 
 # ===============================
 # 查詢介面
 # ===============================
+async def _query_segments(folder: Path, query: str, *args: float) -> Any:
+    """
+    時間查詢：記憶體中的 store 直接用區間索引；不在記憶體且只有封存檔時只解壓相關區塊，不載入整場會議。
+    都沒有資料時回 404。
+    """
+    store = cached_transcript_store(folder)
+    if store is None and not (folder / TRANSCRIPT_JSON).exists():
+        archive = TranscriptArchive.open(folder)
+        if archive is not None:
+            with archive:
+                return getattr(archive, query)(*args)
+    if store is None:
+        store = await _get_transcript_store(folder, create=False)
+    if store is None:
+        raise HTTPException(status_code=404, detail="Transcript not found. Please transcribe first.")
+    return getattr(store, query)(*args)
+
+
 @router.get("/segment_at")
 async def segment_at(base_name: str = Query(...), t: float = Query(..., ge=0.0)):
     """依時間點 t（秒）回傳該段的轉錄與摘要。"""
     folder = _ensure_folder(base_name)
-    tr_path = folder / TRANSCRIPT_JSON
-    if not tr_path.exists():
-        raise HTTPException(status_code=404, detail="Transcript not found. Please transcribe first.")
-
-    tr = _read_json(tr_path)
-    segs: List[Dict[str, Any]] = tr.get("segments", [])
-    total_seconds = segs[-1]["end"] if segs else 0.0
-    idx = _time_to_index(t, total_seconds)
 
-    if 1 <= idx <= len(segs):
-        return segs[idx - 1]
-    else:
+    # 區間索引：不依賴 index 與時間的換算（段落可能被跳過或亂序）
+    seg = await _query_segments(folder, "segment_at", t)
+    if seg is None:
         raise HTTPException(status_code=404, detail="Time out of transcript range")
+    return seg
 
 
 @router.get("/segments_in_range")
@@ -764,18 +1061,7 @@ async def segments_in_range(
         raise HTTPException(status_code=400, detail="end must be greater than start")
 
     folder = _ensure_folder(base_name)
-    tr_path = folder / TRANSCRIPT_JSON
-    if not tr_path.exists():
-        raise HTTPException(status_code=404, detail="Transcript not found. Please transcribe first.")
-
-    tr = _read_json(tr_path)
-    segs: List[Dict[str, Any]] = tr.get("segments", [])
-
-    hit: List[Dict[str, Any]] = []
-    for s in segs:
-        s0, s1 = float(s["start"]), float(s["end"])
-        if not (s1 <= start or s0 >= end):
-            hit.append(s)
+    hit: List[Dict[str, Any]] = await _query_segments(folder, "segments_in_range", start, end)
 
     return {"base_name": base_name, "range": [start, end], "segments": hit}
 
@@ -783,33 +1069,99 @@ async def segments_in_range(
 @router.get("/summary")
 async def get_summary(base_name: str = Query(...)):
     """取回整體摘要（以及可選的逐段摘要）。"""
-    folder = _ensure_folder(base_name)
-    sp = folder / SUMMARY_JSON
-    if not sp.exists():
+    summary = _read_summary(_ensure_folder(base_name))
+    if summary is None:
         raise HTTPException(status_code=404, detail="Summary not found. Please transcribe first.")
-    return _read_json(sp)
+    return summary
+
+
+@router.get("/events")
+async def events(request: Request, base_name: str = Query(...)):
+    """
+    SSE：推送會議的即時更新，取代輪詢 /status、/segment_at、/summary。
+    事件：snapshot（連線時的完整狀態）、segment、batch_summary、overall_summary、
+    job、finalized、resync（事件漏接，請以 snapshot 重新同步：重新連線即可）。
+    斷線重連時瀏覽器會帶 Last-Event-ID，伺服端補送期間的事件。
+    """
+    try:
+        last_event_id = int(request.headers["last-event-id"])
+    except (KeyError, ValueError):
+        last_event_id = None
+
+    # store 先在執行緒載入；之後訂閱與取快照之間沒有 await，不會漏掉事件
+    folder = UPLOAD_DIR / base_name
+    if folder.exists():
+        await _get_transcript_store(folder, create=False)
+    queue, replayed = event_bus.subscribe(base_name, last_event_id)
+    snapshot = None if replayed else event_bus.snapshot(_events_snapshot(base_name))
+
+    async def stream():
+        try:
+            if snapshot is not None:
+                yield snapshot.to_sse()
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield event.to_sse()
+        finally:
+            event_bus.unsubscribe(base_name, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+def _events_snapshot(base_name: str) -> Dict[str, Any]:
+    folder = UPLOAD_DIR / base_name
+    store = cached_transcript_store(folder) if folder.exists() else None
+    job = job_queue.latest_for(base_name)
+    return {
+        "base_name": base_name,
+        "transcript": store.to_dict() if store is not None else None,
+        "summary": _read_summary(folder) if folder.exists() else None,
+        "job": job.to_dict() if job else None,
+    }
 
 
 @router.get("/status")
 async def get_status(base_name: str = Query(...)):
     """取得轉錄和摘要的進度狀態"""
     folder = _ensure_folder(base_name)
-    tr_path = folder / TRANSCRIPT_JSON
-    sm_path = folder / SUMMARY_JSON
-    
+    summary_exists = _summary_exists(folder)
+    store = await _get_transcript_store(folder, create=False)
+
+    # 背景工作進行中：直接由工作表回報進度，不重新解析 transcript.json
+    job = job_queue.latest_for(base_name)
+    if job and not job.finished:
+        return {
+            "base_name": base_name,
+            "transcript_exists": store is not None,
+            "summary_exists": summary_exists,
+            "total_segments": job.total_segments,
+            "completed_transcripts": job.completed_transcripts,
+            "processing_summaries": job.completed_transcripts - job.completed_summaries,
+            "completed_summaries": job.completed_summaries,
+            "job": job.to_dict()
+        }
+
     status_info = {
         "base_name": base_name,
-        "transcript_exists": tr_path.exists(),
-        "summary_exists": sm_path.exists(),
+        "transcript_exists": store is not None,
+        "summary_exists": summary_exists,
         "total_segments": 0,
         "completed_transcripts": 0,
         "processing_summaries": 0,
         "completed_summaries": 0
     }
     
-    if tr_path.exists():
-        tr_data = _read_json(tr_path)
-        segments = tr_data.get("segments", [])
+    if store is not None:
+        segments = store.segments()
         status_info["total_segments"] = len(segments)
         
         # 計算完成的轉錄和摘要數量
@@ -818,22 +1170,22 @@ async def get_status(base_name: str = Query(...)):
         completed_summaries = 0
         
         for seg in segments:
-            text = seg.get("text", "")
-            summary = seg.get("summary", "")
-            
-            # 計算轉錄完成數
-            if text and text != PROCESSING_TEXT:
-                completed_transcripts += 1
-            
-            # 計算摘要狀態
-            if "處理中" in summary:
+            status = _segment_status(seg)
+            if status == SegmentStatus.PENDING.value:
+                continue
+            # 轉錄失敗也算處理過（與工作進度一致）
+            completed_transcripts += 1
+            if status == SegmentStatus.TRANSCRIBED.value:
                 processing_summaries += 1
-            elif "index " in summary and "的摘要" in summary:
+            elif status == SegmentStatus.SUMMARIZED.value:
                 completed_summaries += 1
         
         status_info["completed_transcripts"] = completed_transcripts
         status_info["processing_summaries"] = processing_summaries
         status_info["completed_summaries"] = completed_summaries
+
+    if job:
+        status_info["job"] = job.to_dict()
     
     return status_info
 
@@ -843,8 +1195,15 @@ async def model_status():
     """檢查 AI 模型狀態"""
     return {
         "whisper_loaded": whisper_app is not None,
-        "kuwa_client_ready": kuwa_client is not None,
-        "status": "ready" if (whisper_app and kuwa_client) else "partial" if (whisper_app or kuwa_client) else "simulation_mode",
+        "whisper_replicas": inference_executor.num_replicas,
+        "whisper_tokens_per_second": round(whisper_app.decode_tokens_per_second, 2) if whisper_app else None,
+        "kuwa_client_ready": llm_client is not None,
+        "summary_backend": SUMMARY_BACKEND,
+        "summary_model": llm_model_name,
+        "summary_cache": summary_cache.stats(),
+        "llm": llm_pool.stats(),
+        "semantic_search": semantic_index.stats(),
+        "status": "ready" if (whisper_app and llm_client) else "partial" if (whisper_app or llm_client) else "simulation_mode",
         "summary_batch_size": SUMMARY_BATCH_SIZE,
         "chunk_seconds": CHUNK_SECONDS,
         "overlap_seconds": OVERLAP_SECONDS
@@ -858,37 +1217,45 @@ async def model_status():
 async def regenerate_summaries(base_name: str = Query(...)):
     """重新生成所有摘要（基於現有的轉錄結果）"""
     folder = _ensure_folder(base_name)
-    tr_path = folder / TRANSCRIPT_JSON
+    store = await _get_transcript_store(folder, create=False)
     
-    if not tr_path.exists():
+    if store is None:
         raise HTTPException(status_code=404, detail="No transcript found")
     
-    tr_data = _read_json(tr_path)
-    segments = tr_data.get("segments", [])
+    segments = store.segments()
     
     if not segments:
         raise HTTPException(status_code=400, detail="No segments found")
     
-    # 重新生成批次摘要
+    # 重新生成批次摘要，並重建摘要樹（背景優先序：不與進行中的會議搶 LLM）
+    priority = LLM_PRIORITY_BACKGROUND
+    merge = functools.partial(merge_summaries, priority=priority)
+    tree = get_summary_tree(folder)
+    tree.reset()
     for i in range(0, len(segments), SUMMARY_BATCH_SIZE):
         batch_segments = segments[i:i + SUMMARY_BATCH_SIZE]
         batch_start_idx = batch_segments[0]["index"]
         
         # 生成批次摘要
-        batch_summary_text = await generate_batch_summary(batch_segments, batch_start_idx)
+        batch_summary_text, batch_status = await generate_batch_summary(batch_segments, batch_start_idx, priority)
         
-        # 更新批次中所有段落的摘要
-        _update_batch_summary_in_json(tr_path, batch_segments, batch_summary_text)
+        # 更新批次中所有段落的摘要與批次表
+        store.update_summary([s["index"] for s in batch_segments], batch_summary_text,
+                             _batch_record(batch_segments, batch_summary_text, batch_status))
+        _index_batch_summary(base_name, batch_segments, batch_summary_text, batch_status)
+        await tree.add_leaf(batch_start_idx, batch_segments[-1]["index"], batch_summary_text, merge)
     
-    # 重新讀取更新後的資料
-    tr_data = _read_json(tr_path)
-    updated_segments = tr_data.get("segments", [])
+    # store 內容已是最新的資料
+    updated_segments = store.segments()
     
     # 生成整體摘要
-    overall_summary = await generate_overall_summary(updated_segments, base_name)
+    overall_summary = await generate_overall_summary(updated_segments, base_name, priority)
     
     # 建立新格式的 summary.json
-    _create_summary_json(folder, updated_segments, overall_summary)
+    sm_data = _create_summary_json(folder, updated_segments, overall_summary, store.batches())
+    await store.flush()
+    await _archive_transcript(folder, store, sm_data)
+    await _catalog_meeting(folder, store, overall_summary)
     
     return JSONResponse({
         "base_name": base_name,
@@ -0,0 +1,186 @@
+"""
+定稿會議的精簡封存格式（取代縮排 JSON 的 transcript.json / summary.json）：
+- 段落依 index 排序，每 ARCHIVE_BLOCK_SEGMENTS 段一個區塊，區塊內容是 zlib 壓縮的 JSONL（一行一段）
+- 檔尾有壓縮過的索引（header、批次表、summary 的其餘欄位、每個區塊的位置與 index / 時間範圍），
+  開檔只讀檔尾與索引；時間或 index 範圍查詢只解壓有交集的區塊
+- 需要原本的 JSON 時（/uploads/<base>/transcript.json、summary.json、載入 store）才逐區塊轉出，
+  輸出與原檔相同結構（不縮排）
+檔案結構：MAGIC | block 0 | block 1 | ... | index | <footer offset:u64, footer length:u32> MAGIC
+標準函式庫沒有 zstd / msgpack，這裡用 zlib + JSON；寫入為暫存檔 + os.replace。
+"""
+import json
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+TRANSCRIPT_ARCHIVE = "transcript.archive"
+ARCHIVE_BLOCK_SEGMENTS = int(os.environ.get("ARCHIVE_BLOCK_SEGMENTS", "64"))  # 每個壓縮區塊的段落數
+ARCHIVE_COMPRESS_LEVEL = 6
+
+_MAGIC = b"TRARCH1\n"
+_TRAILER = struct.Struct("<QI8s")
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _time_key(seg: Dict[str, Any]):
+    return float(seg["start"]), float(seg["end"])
+
+
+def _latest(segments: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """依 (start, end) 排序的最後一段；相同時取 index 較大者（與 IntervalIndex 的穩定排序一致）"""
+    latest = None
+    for seg in segments:
+        if latest is None or _time_key(seg) >= _time_key(latest):
+            latest = seg
+    return latest
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_archive(path: Path, header: Dict[str, Any], segments: List[Dict[str, Any]],
+                  batches: List[Dict[str, Any]], summary: Optional[Dict[str, Any]] = None):
+    """寫入封存檔；summary 為 summary.json 的內容（per_segment 由段落推得，不另外存）"""
+    segments = sorted(segments, key=lambda s: s.get("index", 0))
+    tmp_path = path.with_name(path.name + ".tmp")
+    blocks = []
+    with open(tmp_path, "wb") as fp:
+        fp.write(_MAGIC)
+        for b in range(0, len(segments), ARCHIVE_BLOCK_SEGMENTS):
+            chunk = segments[b:b + ARCHIVE_BLOCK_SEGMENTS]
+            payload = zlib.compress("\n".join(_dumps(s) for s in chunk).encode("utf-8"), ARCHIVE_COMPRESS_LEVEL)
+            # [offset, length, 第一段 index, 最後一段 index, 最早 start, 最晚 end, 段數]
+            blocks.append([fp.tell(), len(payload), chunk[0].get("index", 0), chunk[-1].get("index", 0),
+                           min(float(s["start"]) for s in chunk), max(float(s["end"]) for s in chunk), len(chunk)])
+            fp.write(payload)
+        index = {
+            "header": header,
+            "batches": batches,
+            "summary": {k: v for k, v in summary.items() if k != "per_segment"} if summary is not None else None,
+            "blocks": blocks,
+            # 依時間排序的最後一段（超過結尾的 segment_at 用）；index 順序不一定等於時間順序
+            "last_index": _latest(segments)["index"] if segments else None,
+        }
+        footer = zlib.compress(_dumps(index).encode("utf-8"), ARCHIVE_COMPRESS_LEVEL)
+        footer_offset = fp.tell()
+        fp.write(footer)
+        fp.write(_TRAILER.pack(footer_offset, len(footer), _MAGIC))
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, path)
+
+
+class TranscriptArchive:
+    """
+    唯讀的封存檔；開檔時只讀索引。整個生命週期使用同一個檔案描述子，
+    讀取途中檔案被新版本取代（os.replace）也不會讀到不一致的內容。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fp = open(path, "rb")
+        try:
+            self._fp.seek(-_TRAILER.size, os.SEEK_END)
+            footer_offset, footer_length, magic = _TRAILER.unpack(self._fp.read(_TRAILER.size))
+            if magic != _MAGIC:
+                raise ArchiveError(f"不是 transcript 封存檔：{path}")
+            self._fp.seek(footer_offset)
+            index = json.loads(zlib.decompress(self._fp.read(footer_length)))
+        except Exception:
+            self._fp.close()
+            raise
+        self.header: Dict[str, Any] = index["header"]
+        self.batches: List[Dict[str, Any]] = index["batches"]
+        self.summary: Optional[Dict[str, Any]] = index["summary"]
+        self._blocks: List[List[Any]] = index["blocks"]
+        self._last_index: Optional[int] = index.get("last_index")
+
+    @classmethod
+    def open(cls, folder: Path) -> Optional["TranscriptArchive"]:
+        path = folder / TRANSCRIPT_ARCHIVE
+        return cls(path) if path.exists() else None
+
+    def close(self):
+        self._fp.close()
+
+    def __enter__(self) -> "TranscriptArchive":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def segment_count(self) -> int:
+        return sum(block[6] for block in self._blocks)
+
+    def _read_block(self, block: List[Any]) -> List[Dict[str, Any]]:
+        self._fp.seek(block[0])
+        return [json.loads(line) for line in zlib.decompress(self._fp.read(block[1])).decode("utf-8").split("\n")]
+
+    def iter_segments(self) -> Iterator[Dict[str, Any]]:
+        for block in self._blocks:
+            yield from self._read_block(block)
+
+    def segments(self) -> List[Dict[str, Any]]:
+        return list(self.iter_segments())
+
+    # ---------- 部分讀取 ----------
+    def segments_by_index(self, first: int, last: int) -> List[Dict[str, Any]]:
+        """index 在 [first, last] 的段落"""
+        return [s for block in self._blocks if block[2] <= last and block[3] >= first
+                for s in self._read_block(block) if first <= s.get("index", 0) <= last]
+
+    def segments_in_range(self, start: float, end: float) -> List[Dict[str, Any]]:
+        """與 [start, end) 有交集的段落，依 (start, end) 排序（與 IntervalIndex.overlapping 相同）"""
+        hits = [s for block in self._blocks if block[4] < end and block[5] > start
+                for s in self._read_block(block) if float(s["start"]) < end and float(s["end"]) > start]
+        return sorted(hits, key=_time_key)
+
+    def segment_at(self, t: float) -> Optional[Dict[str, Any]]:
+        """包含時間 t 的段落（重疊時取較晚開始者）；超過所有段落的結尾時回傳時間上最後一段"""
+        candidates = [s for block in self._blocks if block[4] <= t < block[5]
+                      for s in self._read_block(block) if float(s["start"]) <= t < float(s["end"])]
+        if candidates:
+            return _latest(candidates)
+        if self._blocks and t >= max(block[5] for block in self._blocks):
+            if self._last_index is not None:
+                return self.segments_by_index(self._last_index, self._last_index)[0]
+            return _latest(self.segments())
+        return None
+
+    # ---------- 原本的 JSON 結構 ----------
+    def to_transcript_dict(self) -> Dict[str, Any]:
+        return {**self.header, "segments": self.segments(), "batches": self.batches}
+
+    def _per_segment(self, seg: Dict[str, Any]) -> Dict[str, Any]:
+        return {"index": seg.get("index"), "batch_id": seg.get("batch_id"),
+                "summary_ref": seg.get("summary_ref"), "summary": seg.get("summary", "")}
+
+    def to_summary_dict(self) -> Optional[Dict[str, Any]]:
+        if self.summary is None:
+            return None
+        return {**self.summary, "per_segment": [self._per_segment(s) for s in self.iter_segments()]}
+
+    def _iter_object(self, fields: Dict[str, Any], list_key: str, items: Iterator[Dict[str, Any]],
+                     tail: Dict[str, Any]) -> Iterator[str]:
+        """逐段輸出 {fields..., list_key: [items...], tail...}，不在記憶體中組出整份 JSON"""
+        yield "{" + "".join(f"{_dumps(k)}:{_dumps(v)}," for k, v in fields.items()) + f"{_dumps(list_key)}:["
+        for n, item in enumerate(items):
+            yield ("," if n else "") + _dumps(item)
+        yield "]" + "".join(f",{_dumps(k)}:{_dumps(v)}" for k, v in tail.items()) + "}"
+
+    def iter_transcript_json(self) -> Iterator[str]:
+        return self._iter_object(self.header, "segments", self.iter_segments(), {"batches": self.batches})
+
+    def iter_summary_json(self) -> Iterator[str]:
+        if self.summary is None:
+            raise ArchiveError("封存檔沒有 summary")
+        fields = {k: v for k, v in self.summary.items() if k not in ("batches", "overall_summary")}
+        tail = {k: self.summary[k] for k in ("batches", "overall_summary") if k in self.summary}
+        return self._iter_object(fields, "per_segment", (self._per_segment(s) for s in self.iter_segments()), tail)
@@ -0,0 +1,428 @@
+"""
+逐會議的 transcript 記憶體儲存（取代每段都重寫 transcript.json）：
+- segments 依 index 排序保存，另有 index -> 位置 的對照表，更新為 O(1)
+- 每次修改先追加到 append-only 的 segment log（崩潰時可重播）；fsync 交給執行緒，連續的修改合併成一次
+- 以 debounce 的 write-behind 工作落盤：寫入暫存檔後 os.replace（atomic rename）
+- 段落寫入與批次摘要會同時發佈到 event bus（SSE 推送）
+- 另有批次表（batch_id -> BatchRecord），段落以 summary_ref 指向所屬批次
+- 時間查詢（/segment_at、/segments_in_range）用快取的區間索引，段落有寫入才重建
+- 已封存（transcript_archive.py）而沒有 transcript.json 的會議由封存檔載入；之後的修改照常寫回 transcript.json
+"""
+import asyncio
+import bisect
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .events import EVENT_BATCH_SUMMARY, EVENT_SEGMENT, event_bus
+from .schemas import SegmentStatus
+from .transcript_archive import TranscriptArchive
+
+# ===== 落盤參數 =====
+FLUSH_DELAY = float(os.environ.get("TRANSCRIPT_FLUSH_DELAY", "1.0"))  # debounce 秒數
+STORE_CACHE_SIZE = int(os.environ.get("TRANSCRIPT_STORE_CACHE", "32"))  # 記憶體中保留的會議數
+
+SEGMENT_LOG = "transcript.log.jsonl"           # append-only 修改紀錄
+SEGMENT_LOG_FLUSHING = "transcript.log.jsonl.1"  # 落盤中的上一份紀錄
+
+
+class IntervalIndex:
+    """
+    段落 [start, end) 的區間索引：依 start 排序，另存 end 的前綴最大值。
+    不假設段落連續或等長（跳過、重送、亂序都可），點查詢與範圍查詢皆為 O(log n + 命中數)。
+    """
+
+    def __init__(self, segments: List[Dict[str, Any]]):
+        items: List[Tuple[float, float, Dict[str, Any]]] = sorted(
+            ((float(s["start"]), float(s["end"]), s) for s in segments), key=lambda x: (x[0], x[1])
+        )
+        self._starts = [start for start, _, _ in items]
+        self._ends = [end for _, end, _ in items]
+        self._segments = [seg for _, _, seg in items]
+        self._max_ends: List[float] = []  # _max_ends[i] = max(_ends[:i+1])，單調遞增可 bisect
+        running = float("-inf")
+        for end in self._ends:
+            running = max(running, end)
+            self._max_ends.append(running)
+
+    def at(self, t: float) -> Optional[Dict[str, Any]]:
+        """包含時間 t 的段落；重疊區間內取較晚開始的段落（與 index 推算一致）"""
+        i = bisect.bisect_right(self._starts, t) - 1
+        while i >= 0 and self._max_ends[i] > t:
+            if self._ends[i] > t:
+                return self._segments[i]
+            i -= 1
+        # 超過最後一段的結尾（例如播放到檔尾）：回傳最後一段
+        if self._segments and t >= self._max_ends[-1]:
+            return self._segments[-1]
+        return None
+
+    def overlapping(self, start: float, end: float) -> List[Dict[str, Any]]:
+        """與 [start, end) 有交集的段落（依 start 排序）"""
+        hi = bisect.bisect_left(self._starts, end)
+        lo = bisect.bisect_right(self._max_ends, start)  # 之前的段落全部在 start 前結束
+        return [self._segments[i] for i in range(lo, hi) if self._ends[i] > start]
+
+
+class TranscriptStore:
+    """單一會議的 transcript（header + segments），所有修改都在 event loop 執行緒進行"""
+
+    def __init__(self, folder: Path, json_name: str, header: Dict[str, Any]):
+        self.folder = folder
+        self.path = folder / json_name
+        self.log_path = folder / SEGMENT_LOG
+        self.flushing_log_path = folder / SEGMENT_LOG_FLUSHING
+        self.header = dict(header)
+        self._segments: List[Dict[str, Any]] = []
+        self._indices: List[int] = []          # 與 _segments 對齊的 index（供 bisect 插入）
+        self._pos: Dict[int, int] = {}         # index -> 在 _segments 中的位置
+        self._batches: Dict[int, Dict[str, Any]] = {}  # batch_id -> BatchRecord
+        self._interval_index: Optional[IntervalIndex] = None  # 段落有新增/覆寫時作廢
+        self._log_fp = None
+        self._log_sync_task: Optional[asyncio.Task] = None
+        self._log_sync_again = False  # fsync 進行中又有新紀錄
+        self._dirty = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()  # 同一時間只有一個落盤動作
+
+    # ---------- 載入 ----------
+    @classmethod
+    def load(cls, folder: Path, json_name: str, header: Dict[str, Any]) -> "TranscriptStore":
+        """
+        讀取既有的 transcript.json（沒有時讀封存檔），並重播尚未落盤的 segment log。
+        同步讀檔與解析：由 get_transcript_store 放到執行緒執行。
+        """
+        store = cls(folder, json_name, header)
+        data = None
+        if store.path.exists():
+            data = json.loads(store.path.read_text(encoding="utf-8"))
+        else:
+            archive = TranscriptArchive.open(folder)
+            if archive is not None:
+                with archive:
+                    data = archive.to_transcript_dict()
+        if data is not None:
+            store.header.update({k: v for k, v in data.items() if k not in ("segments", "batches")})
+            store._replace_all(data.get("segments", []))
+            store._batches = {b["batch_id"]: b for b in data.get("batches", [])}
+
+        replayed = 0
+        for log_path in (store.flushing_log_path, store.log_path):
+            if not log_path.exists():
+                continue
+            with open(log_path, "r", encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # 最後一行可能寫到一半
+                    store._apply(record)
+                    replayed += 1
+        if replayed:
+            print(f"♻️ {folder.name}: 重播 {replayed} 筆 segment log")
+            store._dirty = True
+            store.flush_now()
+        return store
+
+    @property
+    def exists(self) -> bool:
+        return bool(self._segments) or self.path.exists()
+
+    # ---------- 查詢 ----------
+    def get(self, index: int) -> Optional[Dict[str, Any]]:
+        pos = self._pos.get(index)
+        return self._segments[pos] if pos is not None else None
+
+    def segments(self) -> List[Dict[str, Any]]:
+        return self._segments
+
+    def _intervals(self) -> IntervalIndex:
+        if self._interval_index is None:
+            self._interval_index = IntervalIndex(self._segments)
+        return self._interval_index
+
+    def segment_at(self, t: float) -> Optional[Dict[str, Any]]:
+        return self._intervals().at(t)
+
+    def segments_in_range(self, start: float, end: float) -> List[Dict[str, Any]]:
+        return self._intervals().overlapping(start, end)
+
+    def batches(self) -> List[Dict[str, Any]]:
+        return [self._batches[k] for k in sorted(self._batches)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self.header, "segments": self._segments, "batches": self.batches()}
+
+    # ---------- 修改 ----------
+    def init_segments(self, segments: List[Dict[str, Any]]):
+        """建立初始段落（例如預估段數的佔位符），僅在尚無資料時生效"""
+        if self._segments:
+            return
+        self._record({"op": "init", "header": self.header, "segments": segments})
+
+    def upsert(self, segment: Dict[str, Any]):
+        """新增或覆寫單一段落"""
+        self._record({"op": "upsert", "segment": segment})
+
+    def update_summary(self, indices: List[int], summary: str, batch: Optional[Dict[str, Any]] = None):
+        """將同一份（批次）摘要套用到多個段落；提供 batch（BatchRecord）時一併寫入批次表"""
+        record = {"op": "summary", "indices": indices, "summary": summary}
+        if batch is not None:
+            record["batch"] = batch
+        self._record(record)
+
+    def _record(self, record: Dict[str, Any]):
+        self._append_log(record)
+        self._apply(record)
+        self._dirty = True
+        self._schedule_flush()
+        self._publish(record)
+
+    def _publish(self, record: Dict[str, Any]):
+        op = record.get("op")
+        if op == "upsert":
+            event_bus.publish(self.folder.name, EVENT_SEGMENT, record["segment"])
+        elif op == "summary":
+            event_bus.publish(self.folder.name, EVENT_BATCH_SUMMARY,
+                              {"indices": record["indices"], "summary": record["summary"],
+                               "batch": record.get("batch")})
+
+    def _apply(self, record: Dict[str, Any]):
+        op = record.get("op")
+        if op in ("init", "upsert"):
+            self._interval_index = None  # 摘要只改段落內容（同一物件），不影響時間區間
+        if op == "init":
+            self.header.update(record.get("header", {}))
+            self._replace_all(record.get("segments", []))
+            self._batches = {}
+        elif op == "upsert":
+            self._upsert(dict(record["segment"]))  # 複製一份，避免呼叫端之後改到 store 內容
+        elif op == "summary":
+            batch = record.get("batch")
+            if batch is not None:
+                self._batches[batch["batch_id"]] = batch
+            for idx in record["indices"]:
+                pos = self._pos.get(idx)
+                if pos is None:
+                    continue
+                seg = self._segments[pos]
+                seg["summary"] = record["summary"]
+                if batch is not None:
+                    seg["batch_id"] = batch["batch_id"]
+                    seg["batch_range"] = [batch["start_index"], batch["end_index"]]
+                    seg["summary_ref"] = batch["batch_id"]
+                    if seg.get("status") != SegmentStatus.FAILED.value:
+                        seg["status"] = SegmentStatus.SUMMARIZED.value
+
+    def _replace_all(self, segments: List[Dict[str, Any]]):
+        self._segments = sorted(segments, key=lambda x: x.get("index", 0))
+        self._interval_index = None
+        self._reindex()
+
+    def _reindex(self):
+        self._indices = [s.get("index", 0) for s in self._segments]
+        self._pos = {idx: i for i, idx in enumerate(self._indices)}
+
+    def _upsert(self, segment: Dict[str, Any]):
+        idx = segment["index"]
+        pos = self._pos.get(idx)
+        if pos is not None:
+            self._segments[pos] = segment
+        elif not self._indices or idx > self._indices[-1]:
+            # 常見情況：依序追加
+            self._pos[idx] = len(self._segments)
+            self._segments.append(segment)
+            self._indices.append(idx)
+        else:
+            # 亂序到達：插入後重建位置表
+            pos = bisect.bisect_left(self._indices, idx)
+            self._segments.insert(pos, segment)
+            self._indices.insert(pos, idx)
+            self._pos = {i: p for p, i in enumerate(self._indices)}
+
+    # ---------- 持久化 ----------
+    def _append_log(self, record: Dict[str, Any]):
+        if self._log_fp is None:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            self._log_fp = open(self.log_path, "a", encoding="utf-8")
+        self._log_fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._log_fp.flush()
+        self._sync_log()
+
+    def _sync_log(self):
+        """log 的 fsync 不在 event loop 上做：同一時間只有一個 fsync，期間的新紀錄由下一次一起落盤"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            os.fsync(self._log_fp.fileno())
+            return
+        if self._log_sync_task is None or self._log_sync_task.done():
+            self._log_sync_task = loop.create_task(self._sync_log_async())
+        else:
+            self._log_sync_again = True
+
+    async def _sync_log_async(self):
+        loop = asyncio.get_running_loop()
+        while self._log_fp is not None:
+            self._log_sync_again = False
+            # 複製檔案描述子：log 在 fsync 期間被輪替或關閉也不影響
+            fd = os.dup(self._log_fp.fileno())
+            try:
+                await loop.run_in_executor(None, _fsync_and_close, fd)
+            except OSError as e:
+                print(f"❌ {self.folder.name}: segment log fsync 失敗: {e}")
+                return
+            if not self._log_sync_again:
+                return
+
+    def _rotate_log(self) -> bool:
+        """把目前的 log 換成「落盤中」，之後的修改寫到新的 log"""
+        if self._log_fp is not None:
+            self._log_fp.close()
+            self._log_fp = None
+        if not self.log_path.exists():
+            return False
+        if self.flushing_log_path.exists():
+            # 上一次落盤失敗留下的紀錄：合併到前面，避免遺失
+            with open(self.flushing_log_path, "a", encoding="utf-8") as dst, \
+                 open(self.log_path, "r", encoding="utf-8") as src:
+                dst.write(src.read())
+            self.log_path.unlink()
+        else:
+            os.replace(self.log_path, self.flushing_log_path)
+        return True
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """目前內容的淺複製（event loop 執行緒）；段落 dict 也複製，之後的摘要更新不會改到快照"""
+        self._dirty = False
+        self._rotate_log()
+        return {**self.header, "segments": [dict(s) for s in self._segments], "batches": self.batches()}
+
+    def _write_snapshot(self, snapshot: Dict[str, Any]):
+        """序列化並寫入 transcript.json（在執行緒執行，長會議不會卡住 event loop）"""
+        payload = json.dumps(snapshot, ensure_ascii=False)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            fp.write(payload)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, self.path)
+        # 快照已完整落盤，舊 log 不再需要
+        try:
+            self.flushing_log_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def flush_now(self):
+        """同步落盤（無 event loop 時或載入重播後使用）"""
+        if self._dirty:
+            self._write_snapshot(self._snapshot())
+
+    def _schedule_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_now()
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(FLUSH_DELAY)
+        await self._flush_async()
+
+    async def _flush_async(self):
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            snapshot = self._snapshot()  # 在 event loop 執行緒取快照，序列化與檔案 I/O 交給執行緒
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write_snapshot, snapshot)
+            except Exception as e:
+                self._dirty = True
+                print(f"❌ {self.folder.name}: transcript 落盤失敗（log 保留）: {e}")
+
+    async def flush(self):
+        """立即落盤（finalize 或工作結束時呼叫）；排程中的 debounce 工作醒來時會發現已無變更"""
+        await self._flush_async()
+
+    @property
+    def flushed(self) -> bool:
+        """目前內容都已寫入 transcript.json"""
+        return not self._dirty
+
+    @property
+    def idle(self) -> bool:
+        return not self._dirty and (self._flush_task is None or self._flush_task.done())
+
+    def close(self):
+        if self._log_fp is not None:
+            self._log_fp.close()
+            self._log_fp = None
+
+
+def _fsync_and_close(fd: int):
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# ===============================
+# 全域 store 快取（base_name -> store）
+# ===============================
+_stores: "OrderedDict[str, TranscriptStore]" = OrderedDict()
+_loading: Dict[str, "asyncio.Future[TranscriptStore]"] = {}  # 載入中的會議（同時的請求共用同一次載入）
+
+
+async def get_transcript_store(folder: Path, json_name: str, header: Dict[str, Any],
+                               create: bool = True) -> Optional[TranscriptStore]:
+    """
+    取得會議的 transcript store；不在記憶體時在執行緒由磁碟載入。
+    create=False 且磁碟上也沒有資料時回傳 None。
+    """
+    key = folder.name
+    store = _stores.get(key)
+    if store is not None:
+        _stores.move_to_end(key)
+        return store
+
+    loading = _loading.get(key)
+    if loading is None:
+        loading = _loading[key] = asyncio.get_running_loop().run_in_executor(
+            None, TranscriptStore.load, folder, json_name, header)
+        try:
+            loaded = await loading
+        finally:
+            del _loading[key]
+    else:
+        loaded = await asyncio.shield(loading)
+
+    # 等待期間可能已有其他請求放進記憶體：以記憶體中的為準
+    store = _stores.get(key)
+    if store is not None:
+        _stores.move_to_end(key)
+        return store
+    if not create and not loaded.exists:
+        return None
+    _stores[key] = loaded
+    _evict_idle_stores()
+    return loaded
+
+
+def cached_transcript_store(folder: Path) -> Optional[TranscriptStore]:
+    """記憶體中的 store（不從磁碟載入）"""
+    return _stores.get(folder.name)
+
+
+def _evict_idle_stores():
+    # 只淘汰已落盤、沒有排程中寫入的 store
+    for key in list(_stores.keys()):
+        if len(_stores) <= STORE_CACHE_SIZE:
+            break
+        store = _stores[key]
+        if store.idle:
+            store.close()
+            del _stores[key]
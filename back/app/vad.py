@@ -0,0 +1,127 @@
+"""
+以能量為主的語音活動偵測（VAD）：在送進 ASR 佇列前找出段落內的語音區間。
+- 逐音框（frame）計算短時能量（dBFS）與過零率，全部以 numpy 向量化完成
+- 雙門檻遲滯（hysteresis）：高於 on 門檻進入語音，低於 off 門檻才離開
+- on 門檻依段落底噪調整，並以段落峰值能量往下限制（連續講話的段落不會整段被跳過）
+- 語音區間前後補一點邊界，避免切掉字頭字尾
+整段幾乎沒有語音就直接跳過；有語音則只把語音區間接起來交給 Whisper。
+"""
+import os
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+# ===== VAD 參數 =====
+VAD_FRAME_MS = int(os.environ.get("VAD_FRAME_MS", "30"))                # 音框長度
+VAD_ENERGY_DB = float(os.environ.get("VAD_ENERGY_DB", "-45"))           # 語音能量下限（dBFS）
+VAD_NOISE_MARGIN_DB = float(os.environ.get("VAD_NOISE_MARGIN_DB", "10"))  # 高於估計底噪多少 dB 視為語音
+VAD_MAX_THRESHOLD_DB = float(os.environ.get("VAD_MAX_THRESHOLD_DB", "-25"))  # 門檻上限（避免連續講話時底噪估太高）
+VAD_PEAK_MARGIN_DB = float(os.environ.get("VAD_PEAK_MARGIN_DB", "12"))   # 門檻不高於段落峰值能量減此值
+VAD_MIN_NOISE_MARGIN_DB = float(os.environ.get("VAD_MIN_NOISE_MARGIN_DB", "3"))  # 但至少高於底噪此值（穩定雜訊不算語音）
+VAD_HYSTERESIS_DB = float(os.environ.get("VAD_HYSTERESIS_DB", "6"))     # off 門檻 = on 門檻 - 此值
+VAD_MAX_ZCR = float(os.environ.get("VAD_MAX_ZCR", "0.35"))              # 過零率高且能量不足 -> 視為雜訊
+VAD_PAD_MS = int(os.environ.get("VAD_PAD_MS", "300"))                   # 語音區間前後保留
+VAD_MIN_SPEECH_SECONDS = float(os.environ.get("VAD_MIN_SPEECH_SECONDS", "0.6"))  # 語音總長低於此值整段跳過
+
+
+@dataclass
+class VadResult:
+    sample_rate: int
+    total_samples: int
+    regions: List[Tuple[int, int]]  # 語音區間 [start, end)（sample，已含前後邊界）
+    speech_samples: int              # 判定為語音的音框總長（不含邊界）
+
+    @property
+    def speech_seconds(self) -> float:
+        return self.speech_samples / self.sample_rate
+
+    @property
+    def speech_ratio(self) -> float:
+        return self.speech_samples / self.total_samples if self.total_samples else 0.0
+
+    @property
+    def has_speech(self) -> bool:
+        return self.speech_seconds >= VAD_MIN_SPEECH_SECONDS
+
+    def trim(self, audio: np.ndarray) -> np.ndarray:
+        """只保留語音區間（整段都是語音時直接回傳原陣列，不複製）"""
+        if len(self.regions) == 1 and self.regions[0] == (0, len(audio)):
+            return audio
+        if not self.regions:
+            return audio[:0]
+        return np.concatenate([audio[start:end] for start, end in self.regions])
+
+
+def _frame_features(pcm: np.ndarray, frame: int) -> Tuple[np.ndarray, np.ndarray]:
+    """回傳每個音框的能量（dBFS）與過零率"""
+    n_frames = len(pcm) // frame
+    frames = pcm[:n_frames * frame].reshape(n_frames, frame).astype(np.float32)
+    if pcm.dtype == np.int16:
+        frames /= 32768.0
+    energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame - 1)
+    return energy_db, zcr
+
+
+def _hysteresis(energy_db: np.ndarray, on_db: float, off_db: float) -> np.ndarray:
+    """雙門檻遲滯：每個音框沿用最近一次越過 on/off 門檻時的狀態（向量化的 forward fill）"""
+    marks = np.zeros(len(energy_db), dtype=np.int8)
+    marks[energy_db >= on_db] = 1
+    marks[energy_db < off_db] = -1
+    last = np.where(marks != 0, np.arange(len(marks)), -1)
+    np.maximum.accumulate(last, out=last)
+    return (last >= 0) & (marks[np.maximum(last, 0)] > 0)
+
+
+def _dilate(mask: np.ndarray, pad: int) -> np.ndarray:
+    """每個 True 往前後各擴張 pad 個音框（以累加和計算視窗內是否有語音，不受 pad 大小影響）"""
+    counts = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+    idx = np.arange(len(mask))
+    return counts[np.minimum(idx + pad + 1, len(mask))] > counts[np.maximum(idx - pad, 0)]
+
+
+def _mask_to_regions(mask: np.ndarray) -> List[Tuple[int, int]]:
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def detect_speech(pcm: np.ndarray, sample_rate: int, hysteresis: bool = True) -> VadResult:
+    """
+    偵測 pcm（int16 或 [-1, 1) float32）中的語音區間。
+    門檻依段落本身的底噪自動調整，並限制在 VAD_ENERGY_DB ~ VAD_MAX_THRESHOLD_DB 之間。
+    """
+    frame = max(2, sample_rate * VAD_FRAME_MS // 1000)
+    total = len(pcm)
+    if total < frame:
+        return VadResult(sample_rate, total, [], 0)
+
+    energy_db, zcr = _frame_features(pcm, frame)
+    noise_db, peak_db = (float(v) for v in np.percentile(energy_db, [10, 95]))
+    # 整段連續講話時第 10 百分位其實是語音的低點，底噪 + margin 可能高過大部分語音：
+    # 門檻再以峰值往下限制；穩定雜訊的峰值與底噪相近，仍至少高於底噪 VAD_MIN_NOISE_MARGIN_DB
+    adaptive_db = min(noise_db + VAD_NOISE_MARGIN_DB,
+                      max(peak_db - VAD_PEAK_MARGIN_DB, noise_db + VAD_MIN_NOISE_MARGIN_DB))
+    on_db = min(max(VAD_ENERGY_DB, adaptive_db), VAD_MAX_THRESHOLD_DB)
+    off_db = on_db - VAD_HYSTERESIS_DB if hysteresis else on_db
+
+    speech = _hysteresis(energy_db, on_db, off_db)
+    # 過零率很高但能量只略高於門檻的音框多半是嘶聲/風切雜訊
+    speech &= ~((zcr > VAD_MAX_ZCR) & (energy_db < on_db + VAD_HYSTERESIS_DB))
+
+    # 語音長度以補邊界前的音框計算，短促的咳嗽、關門聲不會因為補邊界而超過 VAD_MIN_SPEECH_SECONDS
+    speech_samples = int(np.count_nonzero(speech)) * frame
+
+    # 前後補邊界（膨脹），也順便把很短的停頓併進同一區間；只用來決定裁切範圍
+    pad = VAD_PAD_MS // VAD_FRAME_MS
+    if pad > 0 and speech.any():
+        speech = _dilate(speech, pad)
+
+    regions = [
+        (start * frame, min(total, end * frame) if end < len(speech) else total)
+        for start, end in _mask_to_regions(speech)
+    ]
+    return VadResult(sample_rate, total, regions, speech_samples)
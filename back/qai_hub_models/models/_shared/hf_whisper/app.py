@@ -4,6 +4,8 @@
 # ---------------------------------------------------------------------
 from __future__ import annotations
 
+import math
+
 import numpy as np
 import samplerate
 import torch
@@ -17,6 +19,51 @@ from qai_hub_models.models._shared.hf_whisper.model import (
     get_tokenizer,
 )
 
+# Adaptive decode budget: initial length is seconds * tokens/s * margin plus a
+# floor, never more than max_decode_len scaled by the chunk's share of a full
+# 30 second window, and grows (doubling, up to max_decode_len) if a row runs
+# out of room.
+DECODE_LEN_MARGIN = 1.25
+MIN_DECODE_LEN = 32
+DECODE_RATE_EMA = 0.1
+# A repeated n-gram only counts as a decoding loop once it spans at least this
+# many tokens, so short legitimate repeats ("對對對對", digit strings, "ha ha ha
+# ha") survive while long loops are still cut.
+MIN_REPEAT_SPAN = 16
+
+
+def initial_decode_len(
+    chunk_seconds: float,
+    tokens_per_second: float,
+    cap: int,
+    max_audio_seconds: float = CHUNK_LENGTH,
+) -> int:
+    """
+    Decode budget (self attention cache length) to start a chunk of
+    chunk_seconds with.
+    """
+    expected = int(chunk_seconds * tokens_per_second * DECODE_LEN_MARGIN) + MIN_DECODE_LEN
+    by_duration = math.ceil(cap * min(1.0, chunk_seconds / max_audio_seconds))
+    return max(2, min(cap, expected, max(by_duration, MIN_DECODE_LEN)))
+
+
+def repeat_length(tokens: np.ndarray, max_repeats: int, max_ngram: int) -> int:
+    """
+    If tokens end with an n-gram (n <= max_ngram) repeated in a row at least
+    max_repeats times and over at least MIN_REPEAT_SPAN tokens, return the
+    length that keeps a single copy of it; otherwise return 0.
+    The first token (start of transcript) is never part of a repeat.
+    """
+    length = len(tokens)
+    for n in range(1, max_ngram + 1):
+        repeats = max(max_repeats, math.ceil(MIN_REPEAT_SPAN / n))
+        if n * repeats > length - 1:
+            continue
+        tail = tokens[length - n * repeats :].reshape(repeats, n)
+        if (tail == tail[0]).all():
+            return length - n * (repeats - 1)
+    return 0
+
 
 class HfWhisperApp:
     """
@@ -30,16 +77,37 @@ class HfWhisperApp:
         hf_whisper: HfWhisper,
         sample_rate: int = SAMPLE_RATE,
         max_audio_seconds: int = CHUNK_LENGTH,
+        max_batch_size: int = 4,
+        batched_decode: bool = True,
+        max_decode_len: int = MEAN_DECODE_LEN,
+        adaptive_decode_len: bool = False,
+        decode_tokens_per_second: float = 6.0,
+        max_repeats: int | None = None,
+        max_repeat_ngram: int = 8,
     ):
         self.decoder = hf_whisper.decoder.to("cpu").eval()
         self.encoder = hf_whisper.encoder.to("cpu").eval()
         self.config = hf_whisper.config
 
-        self.mean_decode_len = MEAN_DECODE_LEN
+        # Hard cap on decoded tokens per chunk (and self attention cache length).
+        self.mean_decode_len = max_decode_len
+        # Size the cache from the chunk duration and the observed token rate
+        # instead of always decoding with max_decode_len. Only valid for
+        # decoders that accept any cache length (e.g. the torch model).
+        self.adaptive_decode_len = adaptive_decode_len
+        self.decode_tokens_per_second = decode_tokens_per_second
+        # Stop a row once its last n-gram (n <= max_repeat_ngram) has repeated
+        # max_repeats times in a row (and over MIN_REPEAT_SPAN tokens), keeping
+        # a single copy.
+        self.max_repeats = max_repeats
+        self.max_repeat_ngram = max_repeat_ngram
 
         self.sample_rate = sample_rate
         self.max_audio_seconds = max_audio_seconds
         self.max_audio_samples = self.max_audio_seconds * self.sample_rate
+        self.max_batch_size = max_batch_size
+        self.batched_decode = batched_decode
+        self._decode_state: WhisperDecodeState | None = None
 
         self.feature_extractor = get_feature_extractor(hf_whisper.hf_source)
         self.tokenizer = get_tokenizer(hf_whisper.hf_source)
@@ -85,87 +153,218 @@ class HfWhisperApp:
 
         return trans
 
-    def _transcribe_single_chunk(self, audio: np.ndarray) -> str:
+    def transcribe_batch(
+        self, audios: list[np.ndarray], audio_sample_rate: int
+    ) -> list[str]:
         """
-        Transcribe an audio chunk to text.
+        Transcribe several independent audio clips. Model-sized chunks from all
+        clips are grouped into batches of up to self.max_batch_size, so the
+        feature extractor and encoder run once per batch instead of once per
+        chunk. If self.batched_decode is set, the chunks of a batch are also
+        greedy-decoded together in lockstep.
+
+        Parameters
+        ----------
+        audios: list[numpy array]
+            Raw audio arrays, each of shape (# of samples).
+
+        audio_sample_rate: int
+            The sample rate shared by all provided audio arrays.
+
+        Returns
+        -------
+        One transcription per input audio array, in the same order.
+        """
+        chunks: list[np.ndarray] = []
+        owners: list[int] = []
+        for i, audio in enumerate(audios):
+            for chunk in chunk_and_resample_audio(audio, audio_sample_rate):
+                chunks.append(chunk)
+                owners.append(i)
+
+        texts: list[list[str]] = [[] for _ in audios]
+        with torch.no_grad():
+            for start in range(0, len(chunks), self.max_batch_size):
+                batch = chunks[start : start + self.max_batch_size]
+                seconds = [len(chunk) / self.sample_rate for chunk in batch]
+                kv_cache_cross = self._encode_batch(batch)
+                if self.batched_decode:
+                    batch_texts = self._decode_batch(kv_cache_cross, seconds)
+                else:
+                    batch_texts = [
+                        self._decode_batch(kv, [sec])[0]
+                        for kv, sec in zip(
+                            self._split_kv_cache_cross(kv_cache_cross), seconds
+                        )
+                    ]
+                for owner, text in zip(owners[start : start + len(batch)], batch_texts):
+                    texts[owner].append(text)
+
+        return [" ".join(t) for t in texts]
+
+    def _encode_batch(self, audios: list[np.ndarray]) -> tuple:
+        """
+        Run the feature extractor and encoder once for a batch of chunks.
 
         Parameters:
 
-        audio: numpy array
-            A numpy array of audio of shape (number of samples).
-            The sample rate of this audio must be self.sample_rate.
-            The maximum length of this audio must be self.max_audio_samples.
+        audios: list of numpy arrays
+            Each of shape (number of samples), at self.sample_rate and no
+            longer than self.max_audio_samples.
 
         Returns:
 
-        - transcribed texts
+        - kv_cache_cross: tuple of (k_cache_cross, v_cache_cross) per decoder
+          block, shaped [num_heads, batch, ...]. With a batch of one this is
+          exactly the batch-size-1 encoder output.
         """
-        # feature
         input_features = self.feature_extractor(
-            audio, sampling_rate=self.sample_rate, return_tensors="pt"
+            audios if len(audios) > 1 else audios[0],
+            sampling_rate=self.sample_rate,
+            return_tensors="pt",
         )["input_features"]
 
-        # encoder
         kv_cache_cross = self.encoder(input_features)
         if not isinstance(kv_cache_cross, tuple):
             kv_cache_cross = (kv_cache_cross,)
 
-        sot = self.config.decoder_start_token_id
-        num_decoder_blocks = self.config.decoder_layers
-        attention_dim = self.config.d_model
-        num_decoder_heads = self.config.decoder_attention_heads
-        mask_neg = self.config.mask_neg
-        eot = self.config.eos_token_id
+        batch_size = len(audios)
+        if batch_size == 1:
+            return kv_cache_cross
+
+        # The encoder concatenates per-head caches along dim 0, so the batched
+        # cache is laid out as [num_heads * batch, 1, ...] with index
+        # head * batch + b. Viewing it as [num_heads, batch, ...] matches the
+        # row layout the decoder expects.
+        num_heads = self.config.decoder_attention_heads
+        return tuple(
+            tuple(t.view(num_heads, batch_size, *t.shape[2:]) for t in block)
+            for block in kv_cache_cross
+        )
 
-        # decoder
-        output_ids = torch.tensor([[sot]])  # Start of transcript
-        output_logits = []
-        output_length = output_ids.shape[1]
+    @staticmethod
+    def _split_kv_cache_cross(kv_cache_cross: tuple) -> list[tuple]:
+        """
+        Split a batched cross attention kv-cache into per-chunk views.
+        """
+        batch_size = kv_cache_cross[0][0].shape[1]
+        return [
+            tuple(tuple(t[:, b : b + 1] for t in block) for block in kv_cache_cross)
+            for b in range(batch_size)
+        ]
 
-        position_ids = torch.tensor([0], dtype=torch.int32)
-        attention_mask = torch.full(
-            (1, 1, 1, self.mean_decode_len),
-            mask_neg,
-            dtype=torch.float32,
-        )
+    def _transcribe_single_chunk(self, audio: np.ndarray) -> str:
+        """
+        Transcribe an audio chunk to text.
 
-        # init kv_cache_self
-        k_cache_self = torch.zeros(
-            (
-                num_decoder_heads,
-                1,
-                attention_dim // num_decoder_heads,
-                self.mean_decode_len - 1,
-            ),
-            dtype=torch.float32,
-        )
-        v_cache_self = torch.zeros(
-            (
-                num_decoder_heads,
-                1,
-                self.mean_decode_len - 1,
-                attention_dim // num_decoder_heads,
-            ),
-            dtype=torch.float32,
+        Parameters:
+
+        audio: numpy array
+            A numpy array of audio of shape (number of samples).
+            The sample rate of this audio must be self.sample_rate.
+            The maximum length of this audio must be self.max_audio_samples.
+
+        Returns:
+
+        - transcribed texts
+        """
+        return self._decode_batch(
+            self._encode_batch([audio]), [len(audio) / self.sample_rate]
+        )[0]
+
+    def _get_decode_state(self, batch_size: int) -> WhisperDecodeState:
+        """
+        Return the decode buffers of this app, (re)allocating them only when a
+        larger batch than any seen before is requested.
+        """
+        state = self._decode_state
+        if state is None or state.max_batch_size < batch_size:
+            state = WhisperDecodeState(
+                self.config,
+                max(batch_size, self.max_batch_size),
+                self.mean_decode_len,
+            )
+            self._decode_state = state
+        return state
+
+    def _initial_decode_len(self, chunk_seconds: list[float] | None) -> int:
+        """
+        Decode budget (self attention cache length) to start a batch with.
+        """
+        cap = self.mean_decode_len
+        if not self.adaptive_decode_len or not chunk_seconds:
+            return cap
+        return initial_decode_len(
+            max(chunk_seconds),
+            self.decode_tokens_per_second,
+            cap,
+            self.max_audio_seconds,
         )
-        kv_cache_self = tuple(
-            (k_cache_self, v_cache_self) for _ in range(num_decoder_blocks)
+
+    def _update_decode_rate(self, num_tokens: int, seconds: float) -> None:
+        """
+        Fold the token rate of a chunk that ended with end-of-transcript into
+        the running tokens-per-second estimate.
+        """
+        if not self.adaptive_decode_len or seconds < 1.0:
+            return
+        self.decode_tokens_per_second += DECODE_RATE_EMA * (
+            num_tokens / seconds - self.decode_tokens_per_second
         )
 
-        for n in range(self.mean_decode_len - 1):
-            # get current token
-            input_ids = output_ids[:, n : n + 1].to(torch.int32)
+    def _repeat_length(self, tokens: np.ndarray) -> int:
+        """
+        See repeat_length.
+        """
+        return repeat_length(tokens, self.max_repeats, self.max_repeat_ngram)
 
-            # update attention_mask
-            attention_mask[:, :, :, self.mean_decode_len - n - 1] = 0.0
+    def _decode_batch(
+        self, kv_cache_cross: tuple, chunk_seconds: list[float] | None = None
+    ) -> list[str]:
+        """
+        Greedy-decode one or more chunks in lockstep.
 
-            # flattened kv caches input
-            flattened_kv_cache_self = tuple(
-                item for sublist in kv_cache_self for item in sublist
-            )
-            flattened_kv_cache_cross = tuple(
-                item for sublist in kv_cache_cross for item in sublist
-            )
+        All rows share the step counter, position id and attention mask, and
+        are stacked along dim 1 of the decoder inputs. A row stops when it
+        emits end-of-transcript (or loops, see max_repeats); finished rows
+        are compacted out of the batch so later steps only pay for rows that
+        are still decoding.
+
+        Parameters:
+
+        kv_cache_cross: tuple
+            Encoder output shaped [num_heads, batch, ...] (see _encode_batch).
+
+        chunk_seconds: list[float] | None
+            Duration of each row's audio, used to size the decode budget.
+
+        Returns:
+
+        - transcribed texts, one per row
+        """
+        batch_size = kv_cache_cross[0][0].shape[1]
+        state = self._get_decode_state(batch_size)
+        cap = state.decode_len
+        decode_len = self._initial_decode_len(chunk_seconds)
+        eot = self.config.eos_token_id
+
+        input_ids, attention_mask, position_ids, flattened_kv_cache_self = (
+            state.reset(batch_size, decode_len)
+        )
+        # flattened once per chunk; only rebuilt when finished rows are dropped
+        flattened_kv_cache_cross = tuple(
+            item for sublist in kv_cache_cross for item in sublist
+        )
+        # original row of each sequence that is still decoding
+        active_rows = torch.arange(batch_size)
+        ended = [False] * batch_size
+        tokens = state.tokens.numpy()
+        lengths = state.lengths.numpy()
+
+        n = 0
+        while True:
+            # update attention_mask
+            attention_mask[:, :, :, decode_len - n - 1] = 0.0
 
             # decode and update kv_cache_self
             decoder_input = (
@@ -178,29 +377,165 @@ class HfWhisperApp:
             decoder_output = self.decoder(*decoder_input)
             if isinstance(decoder_output, tuple):
                 logits, kv_cache_self = decoder_output
+                flattened_kv_cache_self = tuple(
+                    item for sublist in kv_cache_self for item in sublist
+                )
             else:
                 logits = decoder_output[0]
-                kv_cache_self = tuple(
-                    decoder_output[i : i + 2] for i in range(1, len(decoder_output), 2)
-                )
+                flattened_kv_cache_self = tuple(decoder_output[1:])
 
-            # update output_logits
-            output_logits.append(logits.detach().clone())
+            # logits: [1, vocab, rows, 1] -> next token per row
+            next_ids = torch.argmax(logits[0, :, :, 0], 0)
+            state.tokens[active_rows, n + 1] = next_ids
+            state.lengths[active_rows] = n + 2
 
-            # update output_ids
-            output_id = torch.argmax(logits, 1).squeeze(0)
             # end of transcript
-            if len(output_logits) == (self.mean_decode_len - 1) or output_id == eot:
-                output_ids = torch.cat((output_ids, output_id), -1)
+            running = (next_ids != eot).tolist()
+            for i, row in enumerate(active_rows.tolist()):
+                if not running[i]:
+                    ended[row] = True
+                elif self.max_repeats:
+                    repeat_length = self._repeat_length(tokens[row, : n + 2])
+                    if repeat_length:
+                        lengths[row] = repeat_length
+                        running[i] = False
+
+            keep = torch.tensor([i for i, r in enumerate(running) if r], dtype=torch.int64)
+            if len(keep) == 0:
                 break
-            if n >= output_length - 1:
-                output_ids = torch.cat((output_ids, output_id), -1)
+            if n == decode_len - 2:
+                if decode_len == cap:
+                    break
+                # out of budget: widen the mask and left-pad the caches
+                decode_len = min(cap, decode_len * 2)
+                attention_mask, flattened_kv_cache_self = state.grow(
+                    flattened_kv_cache_self, decode_len
+                )
+
+            if len(keep) < len(active_rows):
+                # compact finished rows out of the batch
+                active_rows = active_rows[keep]
+                next_ids = next_ids[keep]
+                flattened_kv_cache_self = tuple(
+                    t.index_select(1, keep) for t in flattened_kv_cache_self
+                )
+                flattened_kv_cache_cross = tuple(
+                    t.index_select(1, keep) for t in flattened_kv_cache_cross
+                )
+                input_ids = input_ids[: len(keep)]
+
+            input_ids[:, 0] = next_ids
 
             # update position_ids
             position_ids += 1
+            n += 1
+
+        if chunk_seconds:
+            for row, seconds in enumerate(chunk_seconds):
+                if ended[row]:
+                    self._update_decode_rate(int(lengths[row]) - 2, seconds)
 
         # Exclude start / end tokens
-        return self.tokenizer.decode(output_ids[0], skip_special_tokens=True)
+        return [
+            self.tokenizer.decode(
+                tokens[b, : lengths[b]].tolist(), skip_special_tokens=True
+            )
+            for b in range(batch_size)
+        ]
+
+
+class WhisperDecodeState:
+    """
+    Buffers for greedy decoding with HfWhisperDecoder, allocated once per app
+    and reused for every chunk: the attention mask, position ids, decoder
+    input ids, the generated token ids and the all-zero self attention
+    kv-cache that starts each decode. They are sized for max_batch_size rows
+    and decode_len tokens; smaller calls use views of the buffers (leading
+    rows, trailing mask positions).
+
+    The decoder returns fresh self attention caches each step (the exported
+    graph has no in-place outputs), so only the initial cache is shared.
+    """
+
+    def __init__(self, config, max_batch_size: int, decode_len: int):
+        num_heads = config.decoder_attention_heads
+        head_dim = config.d_model // num_heads
+        self.max_batch_size = max_batch_size
+        self.decode_len = decode_len
+        self.num_blocks = config.decoder_layers
+        self.sot = config.decoder_start_token_id
+        self.mask_neg = config.mask_neg
+
+        self.attention_mask = torch.empty((1, 1, 1, decode_len), dtype=torch.float32)
+        self.position_ids = torch.zeros((1,), dtype=torch.int32)
+        self.input_ids = torch.empty((max_batch_size, 1), dtype=torch.int32)
+        self.tokens = torch.empty((max_batch_size, decode_len), dtype=torch.int64)
+        self.lengths = torch.empty((max_batch_size,), dtype=torch.int64)
+        # read-only: the decoder never writes to its cache inputs
+        self.k_cache_self = torch.zeros(
+            (num_heads, max_batch_size, head_dim, decode_len - 1), dtype=torch.float32
+        )
+        self.v_cache_self = torch.zeros(
+            (num_heads, max_batch_size, decode_len - 1, head_dim), dtype=torch.float32
+        )
+
+    def _mask(self, decode_len: int) -> torch.Tensor:
+        # The newest token always sits at the end of the mask and the cache,
+        # so a shorter budget is the trailing part of the full-size mask.
+        return self.attention_mask[:, :, :, self.decode_len - decode_len :]
+
+    def reset(
+        self, batch_size: int, decode_len: int | None = None
+    ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, tuple[torch.Tensor, ...]]:
+        """
+        Prepare the buffers for decoding batch_size rows from the start token,
+        with a self attention cache of decode_len - 1 (default: the full size).
+
+        Returns:
+
+        - input_ids, attention_mask, position_ids and the flattened initial
+          self attention kv-cache, ready to be passed to the decoder.
+        """
+        decode_len = decode_len or self.decode_len
+        assert batch_size <= self.max_batch_size
+        assert 2 <= decode_len <= self.decode_len
+        self.attention_mask.fill_(self.mask_neg)
+        self.position_ids.zero_()
+        self.input_ids[:batch_size] = self.sot
+        self.tokens[:batch_size, 0] = self.sot
+        self.lengths[:batch_size] = 1
+        k_cache_self = self.k_cache_self[:, :batch_size, :, : decode_len - 1]
+        v_cache_self = self.v_cache_self[:, :batch_size, : decode_len - 1]
+        return (
+            self.input_ids[:batch_size],
+            self._mask(decode_len),
+            self.position_ids,
+            (k_cache_self, v_cache_self) * self.num_blocks,
+        )
+
+    def grow(
+        self, flattened_kv_cache_self: tuple[torch.Tensor, ...], decode_len: int
+    ) -> tuple[torch.Tensor, tuple[torch.Tensor, ...]]:
+        """
+        Extend a running decode to decode_len by left-padding the self
+        attention caches with zeros (masked out, like the start of a decode).
+
+        Returns:
+
+        - the attention mask view and flattened self attention kv-cache for
+          the new length.
+        """
+        assert decode_len <= self.decode_len
+        grown = []
+        for i, cache in enumerate(flattened_kv_cache_self):
+            rows = cache.shape[1]
+            if i % 2 == 0:
+                pad = decode_len - 1 - cache.shape[3]
+                grown.append(torch.cat([self.k_cache_self[:, :rows, :, :pad], cache], 3))
+            else:
+                pad = decode_len - 1 - cache.shape[2]
+                grown.append(torch.cat([self.v_cache_self[:, :rows, :pad], cache], 2))
+        return self._mask(decode_len), tuple(grown)
 
 
 def chunk_and_resample_audio(
@@ -137,7 +137,9 @@ class SHAAttention(nn.Module):
         """
         is_cross_attention = self.is_decoder and past_key_value is not None
         past_key_value_rt = None
-        bsz, _, tgt_len, _ = hidden_states.size()
+        # The decoder stacks independent sequences along dim 1 (num_rows); it
+        # is 1 for the encoder and for single-sequence decoding.
+        bsz, num_rows, tgt_len, _ = hidden_states.size()
         # Rearrange dimensions for Conv2D
         hidden_states = hidden_states.permute(0, 3, 1, 2)
 
@@ -183,10 +185,10 @@ class SHAAttention(nn.Module):
         if self.is_decoder and self.is_causal is True:
             past_key_value_rt = (
                 torch.cat(key_states, dim=0)[:, :, :, 1:].reshape(
-                    self.num_heads, bsz, self.head_dim, -1
+                    self.num_heads, bsz * num_rows, self.head_dim, -1
                 ),
                 torch.cat(value_states, dim=0)[:, :, 1:, :].reshape(
-                    self.num_heads, bsz, -1, self.head_dim
+                    self.num_heads, bsz * num_rows, -1, self.head_dim
                 ),
             )
 
@@ -198,12 +200,13 @@ class SHAAttention(nn.Module):
 
         if attention_mask is not None:
             attn_weights = [
-                attn_weight.view(bsz, 1, tgt_len, src_len) + attention_mask
+                attn_weight.view(bsz, num_rows, tgt_len, src_len) + attention_mask
                 for attn_weight in attn_weights
             ]
 
         attn_weights = [
-            attn_weight.view(bsz, 1, tgt_len, src_len) for attn_weight in attn_weights
+            attn_weight.view(bsz, num_rows, tgt_len, src_len)
+            for attn_weight in attn_weights
         ]
 
         attn_weights = [
@@ -0,0 +1,54 @@
+# ---------------------------------------------------------------------
+# Copyright (c) 2024 Qualcomm Innovation Center, Inc. All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# ---------------------------------------------------------------------
+import numpy as np
+
+from qai_hub_models.models._shared.hf_whisper.app import (
+    MIN_DECODE_LEN,
+    initial_decode_len,
+    repeat_length,
+)
+from qai_hub_models.models._shared.hf_whisper.model import MEAN_DECODE_LEN
+
+SOT = 50258
+
+
+def test_repeated_token_survives():
+    # "對對對對", "1111", "ha ha ha ha": a single token repeated a few times
+    for count in (4, 6, 8):
+        tokens = np.array([SOT, 11, 22] + [33] * count)
+        assert repeat_length(tokens, max_repeats=4, max_ngram=8) == 0
+
+
+def test_repeated_bigram_survives():
+    tokens = np.array([SOT] + [44, 55] * 4)
+    assert repeat_length(tokens, max_repeats=4, max_ngram=8) == 0
+
+
+def test_token_loop_is_cut():
+    tokens = np.array([SOT, 11, 22] + [33] * 16)
+    # keeps a single copy of the looping token
+    assert repeat_length(tokens, max_repeats=4, max_ngram=8) == 4
+
+
+def test_long_ngram_loop_is_cut():
+    phrase = [60, 61, 62, 63, 64]
+    tokens = np.array([SOT, 11] + phrase * 4)
+    assert repeat_length(tokens, max_repeats=4, max_ngram=8) == 2 + len(phrase)
+
+
+def test_short_chunk_starts_below_cap():
+    # 20 s chunk at the default seed rate: 2/3 of a full 30 s window
+    decode_len = initial_decode_len(20.0, 6.0, MEAN_DECODE_LEN)
+    assert decode_len < MEAN_DECODE_LEN
+    assert decode_len == 134
+    # dense speech does not push a 20 s chunk back to the cap
+    assert initial_decode_len(20.0, 12.0, MEAN_DECODE_LEN) == 134
+    # sparse speech sizes from the token rate
+    assert initial_decode_len(10.0, 2.0, MEAN_DECODE_LEN) == 57
+    assert initial_decode_len(0.5, 6.0, MEAN_DECODE_LEN) == MIN_DECODE_LEN
+
+
+def test_full_chunk_keeps_cap():
+    assert initial_decode_len(30.0, 6.0, MEAN_DECODE_LEN) == MEAN_DECODE_LEN
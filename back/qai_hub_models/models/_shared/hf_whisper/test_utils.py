@@ -147,3 +147,18 @@ def run_test_transcribe(
     # Perform transcription
     transcription = app.transcribe(audio, sample_rate)
     assert transcription == text_orig
+
+
+def run_test_transcribe_batch(
+    model_cls: type[HfWhisper],
+) -> None:
+    """
+    Test that batched transcription (shared encoder pass) matches
+    transcribing each clip on its own.
+    """
+    app = HfWhisperApp(model_cls.from_pretrained())
+    audio, sample_rate = load_demo_audio()
+    audios = [audio, audio[: len(audio) // 2]]
+
+    expected = [app.transcribe(a, sample_rate) for a in audios]
+    assert app.transcribe_batch(audios, sample_rate) == expected
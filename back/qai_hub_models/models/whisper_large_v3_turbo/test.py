@@ -4,6 +4,7 @@
 # ---------------------------------------------------------------------
 from qai_hub_models.models._shared.hf_whisper.test_utils import (
     run_test_transcribe,
+    run_test_transcribe_batch,
     run_test_wrapper_numerics,
 )
 from qai_hub_models.models.whisper_large_v3_turbo.demo import main as demo_main
@@ -18,5 +19,9 @@ def test_transcribe():
     run_test_transcribe(WhisperLargeV3Turbo)
 
 
+def test_transcribe_batch():
+    run_test_transcribe_batch(WhisperLargeV3Turbo)
+
+
 def test_demo():
     demo_main(is_test=True)